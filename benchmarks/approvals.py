@@ -0,0 +1,57 @@
+"""Cost of building approval calldata for many users at once.
+
+Compares eth_abi encoding with the selector hashed per call (the previous
+encode_erc20_approve) with the batch encoders in src/encoders.
+
+    python -m benchmarks.approvals
+"""
+
+import os
+import timeit
+
+from eth_abi import encode
+from web3 import Web3
+
+from src.encoders import encode_erc20_approve_batch, encode_erc1155_set_approval_for_all_batch
+
+
+USERS = 20000
+SPENDERS = [Web3.to_checksum_address("0x" + os.urandom(20).hex()) for _ in range(USERS)]
+APPROVALS = [(spender, 2**256 - 1) for spender in SPENDERS]
+OPERATOR_APPROVALS = [(operator, True) for operator in SPENDERS]
+
+
+def per_call_erc20():
+    return [
+        Web3.keccak(text="approve(address,uint256)")[:4] +
+        encode(['address', 'uint256'], [Web3.to_checksum_address(spender), amount])
+        for spender, amount in APPROVALS
+    ]
+
+
+def per_call_erc1155():
+    return [
+        Web3.keccak(text="setApprovalForAll(address,bool)")[:4] +
+        encode(['address', 'bool'], [Web3.to_checksum_address(operator), approved])
+        for operator, approved in OPERATOR_APPROVALS
+    ]
+
+
+def bench(fn, number: int) -> float:
+    """Best-of-3 milliseconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e3
+
+
+def main():
+    rows = [
+        ("approve", bench(per_call_erc20, 1), bench(lambda: encode_erc20_approve_batch(APPROVALS), 5)),
+        ("setApprovalForAll", bench(per_call_erc1155, 1),
+         bench(lambda: encode_erc1155_set_approval_for_all_batch(OPERATOR_APPROVALS), 5)),
+    ]
+    print(f"{f'{USERS} calls':24}{'before (ms)':>12}{'after (ms)':>12}{'speedup':>10}")
+    for name, before, after in rows:
+        print(f"{name:24}{before:12.1f}{after:12.1f}{before / after:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Cost of encoding ProxyWalletFactory.proxy calldata.
+
+Compares building a web3 contract and calling encode_abi on every request
+with ProxyCallEncoder, both on a cache miss and on a cache hit, for the
+Polymarket approval bundle.
+
+    python -m benchmarks.proxy_encoding
+"""
+
+import timeit
+
+from web3 import Web3
+
+from src.encoders import (
+    ProxyCallEncoder, encode_erc20_approve, encode_erc1155_set_approval_for_all
+)
+from src.abis import PROXY_WALLET_FACTORY_ABI
+
+
+PROXY_WALLET_FACTORY_ADDRESS = "0xaB45c5A4B0c941a2F231C04C3f49182e1A254052"
+USDC_ADDRESS = "0x2791Bca1f2de4661ED88A30C99A7a9449Aa84174"
+CONDITIONAL_TOKENS_ADDRESS = "0x4D97DCd97eC945f40cF65F87097ACe5EA0476045"
+USDC_SPENDERS = [
+    "0x4D97DCd97eC945f40cF65F87097ACe5EA0476045",
+    "0x4bFb41d5B3570DeFd03C39a9A4D8dE6Bd8B8982E",
+    "0xd91E80cF2E7be2e162c6513ceD06f1dD0dA35296",
+    "0xC5d563A36AE78145C45a50134d48A1215220f80a",
+]
+OUTCOME_TOKEN_SPENDERS = USDC_SPENDERS[1:]
+
+# As the /relay/proxy-wallet endpoint receives them
+APPROVAL_BUNDLE = [
+    {'typeCode': 2, 'to': USDC_ADDRESS, 'value': 0,
+     'data': bytes.fromhex(encode_erc20_approve(spender, 2**256 - 1))}
+    for spender in USDC_SPENDERS
+] + [
+    {'typeCode': 2, 'to': CONDITIONAL_TOKENS_ADDRESS, 'value': 0,
+     'data': bytes.fromhex(encode_erc1155_set_approval_for_all(spender, True))}
+    for spender in OUTCOME_TOKEN_SPENDERS
+]
+
+w3 = Web3()
+
+
+def contract_encode_abi():
+    contract = w3.eth.contract(address=PROXY_WALLET_FACTORY_ADDRESS, abi=PROXY_WALLET_FACTORY_ABI)
+    return contract.encode_abi('proxy', args=[APPROVAL_BUNDLE])
+
+
+def bench(fn, number: int) -> float:
+    """Best-of-5 microseconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    uncached = ProxyCallEncoder(max_entries=0)
+    cached = ProxyCallEncoder()
+    rows = [
+        ("contract + encode_abi", bench(contract_encode_abi, 200)),
+        ("ProxyCallEncoder (miss)", bench(lambda: uncached.encode(APPROVAL_BUNDLE), 20000)),
+        ("ProxyCallEncoder (hit)", bench(lambda: cached.encode(APPROVAL_BUNDLE), 20000)),
+    ]
+    baseline = rows[0][1]
+    print(f"{'':28}{'us/call':>12}{'speedup':>10}")
+    for name, us in rows:
+        print(f"{name:28}{us:12.2f}{baseline / us:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+"""Relay API under scripted RPC faults.
+
+Runs the real app (in process, over ASGI) against a fake JSON-RPC node
+that injects faults, with an open-loop stream of signed relay requests.
+Each scenario runs in its own process and reports throughput, latency,
+peak in-flight requests, peak memory and nonce integrity as seen by the
+node (relayer nonces replaced or left with gaps, user nonces mined out of
+order).
+
+    python -m benchmarks.rpc_faults                      # every scenario
+    python -m benchmarks.rpc_faults --scenario rate_limit --seconds 20 --rate 80
+
+Scenarios:
+    baseline       no faults
+    latency        every RPC call takes 150 +/- 50 ms
+    drops          10% of connections are closed, half of them after the
+                   node has processed the request
+    rate_limit     20% of calls get HTTP 429
+    slow_receipts  transactions take 8 s to be mined instead of 1 s
+    reorg          20% of mined transactions are reorged out for two blocks
+                   and then mined again in a later block
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import rlp
+from eth_abi import encode
+from eth_account import Account
+from hexbytes import HexBytes
+from web3 import Web3
+
+from src.abis import RELAY_HUB_ABI, RELAY_RECIPIENT_ABI
+
+
+@dataclass
+class Faults:
+    latency_ms: float = 0
+    jitter_ms: float = 0
+    drop_rate: float = 0
+    rate_limit_rate: float = 0
+    mine_delay_s: float = 1.0
+    reorg_rate: float = 0
+
+
+SCENARIOS = {
+    "baseline": Faults(),
+    "latency": Faults(latency_ms=150, jitter_ms=50),
+    "drops": Faults(drop_rate=0.1),
+    "rate_limit": Faults(rate_limit_rate=0.2),
+    "slow_receipts": Faults(mine_delay_s=8.0),
+    "reorg": Faults(reorg_rate=0.2),
+}
+
+BLOCK_TIME = 0.5
+CHAIN_ID = 137
+GAS_PRICE = 30 * 10**9
+RECIPIENT = "0x" + "22" * 20
+
+
+class FakeChain:
+    """Just enough of a node and a RelayHub to relay through"""
+
+    def __init__(self, faults: Faults):
+        self.faults = faults
+        self.start = time.monotonic()
+        self.hub = Web3().eth.contract(abi=RELAY_HUB_ABI)
+        self.selectors = {
+            HexBytes(Web3.keccak(text=f"{f['name']}({','.join(i['type'] for i in f['inputs'])})")[:4]).hex(): f
+            for f in RELAY_HUB_ABI + RELAY_RECIPIENT_ABI if f.get('type') == 'function'
+        }
+        self.relay_call_selector = bytes(HexBytes(self.hub.encode_abi('relayCall', args=[
+            RECIPIENT, RECIPIENT, b"", 0, 0, 0, 0, b"", b""
+        ]))[:4])
+        self.lock = threading.Lock()
+        self.account_nonces: Dict[str, int] = {}          # mined nonce per sender
+        self.mempool: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.receipts: Dict[str, Dict[str, Any]] = {}
+        self.hidden: Dict[str, float] = {}                # reorged out until
+        self.user_nonces: Dict[str, int] = {}
+        # What the recipient's acceptRelayedCall returns
+        self.accept_status = 0
+        self.stats = Counter()
+
+    def block_number(self) -> int:
+        return 1000 + int((time.monotonic() - self.start) / BLOCK_TIME)
+
+    def pending_nonce(self, sender: str) -> int:
+        nonce = self.account_nonces.get(sender, 0)
+        pending = self.mempool.get(sender, {})
+        while nonce in pending:
+            nonce += 1
+        return nonce
+
+    def mine(self):
+        """Include every sender's next-nonce transactions that have waited long enough"""
+        now = time.monotonic()
+        block = self.block_number()
+        for sender, pending in self.mempool.items():
+            nonce = self.account_nonces.get(sender, 0)
+            while nonce in pending and pending[nonce]['arrived'] + self.faults.mine_delay_s <= now:
+                tx = pending.pop(nonce)
+                self._execute(tx)
+                self.receipts[tx['hash']] = self._receipt(tx, block)
+                if random.random() < self.faults.reorg_rate:
+                    # Receipt visible for a block, gone for two, then back in a later block
+                    self.hidden[tx['hash']] = now + BLOCK_TIME
+                    self.stats['reorged'] += 1
+                nonce += 1
+                self.stats['mined'] += 1
+            self.account_nonces[sender] = nonce
+
+    def _execute(self, tx: Dict[str, Any]):
+        data = tx['data']
+        if data[:4] != self.relay_call_selector:
+            return
+        _, args = self.hub.decode_function_input(data)
+        user = args['from'].lower()
+        if args['nonce'] != self.user_nonces.get(user, 0):
+            self.stats['user_nonce_conflicts'] += 1
+            return
+        self.user_nonces[user] = args['nonce'] + 1
+
+    def _receipt(self, tx: Dict[str, Any], block: int) -> Dict[str, Any]:
+        return {
+            "blockHash": "0x" + os.urandom(32).hex(), "blockNumber": hex(block), "contractAddress": None,
+            "cumulativeGasUsed": hex(300000), "effectiveGasPrice": hex(GAS_PRICE), "from": tx['from'],
+            "gasUsed": hex(300000), "logs": [], "logsBloom": "0x" + "00" * 256, "status": "0x1",
+            "to": tx['to'], "transactionHash": tx['hash'], "transactionIndex": "0x0", "type": "0x0",
+        }
+
+    def get_receipt(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        until = self.hidden.get(tx_hash)
+        if until is not None:
+            now = time.monotonic()
+            if now < until:
+                return self.receipts.get(tx_hash)
+            if now < until + 2 * BLOCK_TIME:
+                return None
+            del self.hidden[tx_hash]
+            self.receipts[tx_hash] = {**self.receipts[tx_hash], "blockNumber": hex(self.block_number()),
+                                      "blockHash": "0x" + os.urandom(32).hex()}
+        return self.receipts.get(tx_hash)
+
+    def get_transaction(self, tx_hash: str) -> Optional[Dict[str, Any]]:
+        """A pending or mined transaction (the fields the relayer reads)"""
+        receipt = self.get_receipt(tx_hash)
+        for pending in self.mempool.values():
+            for nonce, tx in pending.items():
+                if tx['hash'] == tx_hash:
+                    return {"hash": tx_hash, "from": tx['from'], "to": tx['to'], "nonce": hex(nonce),
+                            "blockNumber": None, "blockHash": None, "transactionIndex": None}
+        if receipt is not None:
+            return {"hash": tx_hash, "from": receipt['from'], "to": receipt['to'],
+                    "blockNumber": receipt['blockNumber'], "blockHash": receipt['blockHash'],
+                    "transactionIndex": receipt['transactionIndex']}
+        return None
+
+    def send_raw_transaction(self, raw: str) -> Dict[str, Any]:
+        raw_bytes = HexBytes(raw)
+        nonce, gas_price, gas, to, value, data, *_ = rlp.decode(bytes(raw_bytes))
+        nonce = int.from_bytes(nonce, 'big')
+        sender = Account.recover_transaction(raw_bytes).lower()
+        tx_hash = Web3.keccak(raw_bytes).hex()
+        tx_hash = tx_hash if tx_hash.startswith("0x") else "0x" + tx_hash
+        self.stats['sent'] += 1
+        if nonce < self.account_nonces.get(sender, 0):
+            self.stats['nonce_too_low'] += 1
+            return {"error": {"code": -32000, "message": "nonce too low"}}
+        pending = self.mempool.setdefault(sender, {})
+        if nonce in pending:
+            if pending[nonce]['hash'] == tx_hash:
+                return {"result": tx_hash}
+            self.stats['replaced'] += 1
+        pending[nonce] = {"hash": tx_hash, "from": sender, "to": "0x" + to.hex(), "data": data,
+                          "arrived": time.monotonic()}
+        return {"result": tx_hash}
+
+    def eth_call(self, call: Dict[str, Any]) -> str:
+        data = HexBytes(call['data'])
+        function = self.selectors.get(data[:4].hex())
+        if function is None:
+            return "0x"
+        name = function['name']
+        if name == 'acceptRelayedCall':
+            self.stats['accept_relayed_calls'] += 1
+            return "0x" + encode(['uint256', 'bytes'], [self.accept_status, b""]).hex()
+        args = self.hub.decode_function_input(data)[1]
+        if name == 'canRelay':
+            user = args['from'].lower()
+            status = self.accept_status if args['nonce'] == self.user_nonces.get(user, 0) else 2
+            result = encode(['uint256', 'bytes'], [status, b""])
+        elif name == 'getNonce':
+            result = encode(['uint256'], [self.user_nonces.get(args['from'].lower(), 0)])
+        elif name == 'balanceOf':
+            result = encode(['uint256'], [10**24])
+        elif name == 'getRelay':
+            result = encode(['uint256', 'uint256', 'uint256', 'address', 'uint8'], [10**18, 86400, 0, RECIPIENT, 3])
+        else:
+            result = encode([o['type'] for o in function['outputs']], [0] * len(function['outputs']))
+        return "0x" + result.hex()
+
+    def handle(self, method: str, params: List[Any]) -> Dict[str, Any]:
+        with self.lock:
+            self.mine()
+            if method == "eth_sendRawTransaction":
+                return self.send_raw_transaction(params[0])
+            if method == "eth_getTransactionReceipt":
+                return {"result": self.get_receipt(params[0])}
+            if method == "eth_getTransactionByHash":
+                return {"result": self.get_transaction(params[0])}
+            if method == "eth_getTransactionCount":
+                sender = params[0].lower()
+                nonce = self.pending_nonce(sender) if params[1] == "pending" else self.account_nonces.get(sender, 0)
+                return {"result": hex(nonce)}
+            if method == "eth_call":
+                return {"result": self.eth_call(params[0])}
+            results = {
+                "eth_chainId": hex(CHAIN_ID),
+                "net_version": str(CHAIN_ID),
+                "web3_clientVersion": "fake-node/1.0",
+                "eth_blockNumber": hex(self.block_number()),
+                "eth_gasPrice": hex(GAS_PRICE),
+                "eth_estimateGas": hex(400000),
+                "eth_getBalance": hex(10**21),
+            }
+            if method == "eth_feeHistory":
+                count = int(params[0], 16) if isinstance(params[0], str) else params[0]
+                return {"result": {
+                    "oldestBlock": hex(self.block_number() - count), "baseFeePerGas": ["0x0"] * (count + 1),
+                    "gasUsedRatio": [0.5] * count, "reward": [["0x0"]] * count,
+                }}
+            if method in results:
+                return {"result": results[method]}
+            return {"error": {"code": -32601, "message": f"{method} not supported"}}
+
+    def integrity(self) -> Dict[str, int]:
+        """Nonce health once the run has drained"""
+        with self.lock:
+            self.mine()
+            stuck = sum(len(pending) for pending in self.mempool.values())
+            gapped = sum(
+                1 for sender, pending in self.mempool.items()
+                for nonce in pending if nonce > self.pending_nonce(sender)
+            )
+            return {
+                "relayer_txs_sent": self.stats['sent'],
+                "mined": self.stats['mined'],
+                "still_pending": stuck,
+                "behind_nonce_gap": gapped,
+                "replaced": self.stats['replaced'],
+                "nonce_too_low": self.stats['nonce_too_low'],
+                "user_nonce_conflicts": self.stats['user_nonce_conflicts'],
+                "reorged": self.stats['reorged'],
+                "rpc_dropped": self.stats['dropped'],
+                "rpc_rate_limited": self.stats['rate_limited'],
+            }
+
+
+def make_handler(chain: FakeChain):
+    faults = chain.faults
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers['Content-Length']))
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            request = json.loads(body)
+            if request['method'] == "bench_integrity":
+                return self._reply(200, json.dumps({"id": request['id'], "result": chain.integrity()}).encode())
+
+            if faults.latency_ms:
+                time.sleep(max(0.0, random.gauss(faults.latency_ms, faults.jitter_ms)) / 1000)
+            if random.random() < faults.rate_limit_rate:
+                chain.stats['rate_limited'] += 1
+                return self._reply(429, b'{"error": "rate limited"}')
+
+            drop = random.random() < faults.drop_rate
+            if drop and random.random() < 0.5:
+                chain.stats['dropped'] += 1
+                self.close_connection = True
+                return
+            try:
+                result = chain.handle(request['method'], request['params'])
+            except Exception as e:
+                result = {"error": {"code": -32603, "message": f"{type(e).__name__}: {e}"}}
+            response = {"jsonrpc": "2.0", "id": request['id'], **result}
+            if drop:
+                # Processed, but the answer never arrives
+                chain.stats['dropped'] += 1
+                self.close_connection = True
+                return
+            self._reply(200, json.dumps(response).encode())
+
+        def _reply(self, status: int, body: bytes):
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve_node(faults: Faults, ready):
+    """Fake node process: keeps its work off the relayer's GIL"""
+    chain = FakeChain(faults)
+    node = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(chain))
+    node.daemon_threads = True
+    ready.send(node.server_port)
+    node.serve_forever()
+
+
+def percentile(samples: List[float], q: float) -> Optional[float]:
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+async def run_load(seconds: float, rate: float, users: int, drain: float) -> Dict[str, Any]:
+    """Open-loop load: one request every 1/rate seconds from a user with none in flight"""
+    import httpx
+    from src.api import server
+    from src.client import sign_relay_request
+    from src.config import config
+
+    accounts = [Account.create() for _ in range(users)]
+    next_nonce = {account.address: 0 for account in accounts}
+    free = list(accounts)
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    in_flight = 0
+    peak_in_flight = 0
+    tasks = set()
+    signing = ThreadPoolExecutor(max_workers=2, thread_name_prefix="bench-signer")
+    node = httpx.AsyncClient(base_url=os.environ["RPC_URL"], timeout=10)
+
+    async def integrity() -> Dict[str, Any]:
+        response = await node.post("", json={"jsonrpc": "2.0", "id": 0, "method": "bench_integrity", "params": []})
+        return response.json()['result']
+
+    async with server.lifespan(server.app):
+        relayer = server.relayer
+        while not relayer.is_connected:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://relayer", timeout=120) as client:
+
+            async def relay(account):
+                nonlocal in_flight, peak_in_flight
+                relay_request = {
+                    'from': account.address, 'to': RECIPIENT, 'encodedFunction': b"\x12\x34\x56\x78",
+                    'transactionFee': config.relay_fee_percentage, 'gasPrice': GAS_PRICE, 'gasLimit': 100000,
+                    'nonce': next_nonce[account.address], 'approvalData': b"",
+                }
+                relay_request['signature'] = await asyncio.get_running_loop().run_in_executor(
+                    signing, sign_relay_request, account, relay_request, config.relay_hub_address, relayer.address
+                )
+                body = {k: "0x" + v.hex() if isinstance(v, bytes) else v for k, v in relay_request.items()}
+                in_flight += 1
+                peak_in_flight = max(peak_in_flight, in_flight)
+                start = time.monotonic()
+                try:
+                    response = await client.post("/relay", params={"wait": "false"}, json=body)
+                    result = response.json() if response.status_code == 200 else {}
+                    if result.get('success'):
+                        next_nonce[account.address] += 1
+                        outcomes['ok'] += 1
+                    else:
+                        error = result.get('error_code') or (result.get('error') or "")[:48]
+                        outcomes[error or f"HTTP {response.status_code}"] += 1
+                        # Resynchronise: the relay may have gone through anyway
+                        nonce = await client.get(f"/nonce/{account.address}")
+                        if nonce.status_code == 200:
+                            next_nonce[account.address] = nonce.json()['pending_nonce']
+                except httpx.HTTPError as e:
+                    outcomes[type(e).__name__] += 1
+                finally:
+                    latencies.append(time.monotonic() - start)
+                    in_flight -= 1
+                    free.append(account)
+
+            deadline = time.monotonic() + seconds
+            interval = 1 / rate
+            next_at = time.monotonic()
+            while time.monotonic() < deadline:
+                next_at += interval
+                if free:
+                    account = free.pop(random.randrange(len(free)))
+                    task = asyncio.create_task(relay(account))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    outcomes['shed (no idle user)'] += 1
+                await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+            if tasks:
+                await asyncio.wait(tasks, timeout=drain)
+            # Let broadcast relays be mined
+            end = time.monotonic() + drain
+            while time.monotonic() < end and ((await integrity())['still_pending'] or relayer._background):
+                await asyncio.sleep(0.25)
+
+    result = await integrity()
+    await node.aclose()
+    signing.shutdown(wait=False)
+
+    return {
+        **result,
+        "requests": sum(outcomes.values()),
+        "ok": outcomes['ok'],
+        "throughput_rps": round(outcomes['ok'] / seconds, 1),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+        "peak_in_flight": peak_in_flight,
+        "outcomes": dict(outcomes),
+    }
+
+
+def run_scenario(name: str, seconds: float, rate: float, users: int, drain: float) -> Dict[str, Any]:
+    ready, port = multiprocessing.Pipe()
+    node = multiprocessing.Process(target=serve_node, args=(SCENARIOS[name], ready), daemon=True)
+    node.start()
+
+    # Configure the relayer before src.config is imported
+    state_dir = tempfile.mkdtemp(prefix="gsn-bench-")
+    os.environ.update({
+        "RPC_URL": f"http://127.0.0.1:{port.recv()}",
+        "RPC_URLS": "",
+        "CHAIN_ID": str(CHAIN_ID),
+        "STATE_DB_PATH": os.path.join(state_dir, "state.db"),
+        "PRICING_ENFORCE": "false",
+        "LOG_LEVEL": os.environ.get("LOG_LEVEL", "CRITICAL"),
+        "STATUS_POLL_INTERVAL_SECONDS": str(BLOCK_TIME),
+        "RPC_TIMEOUT_SECONDS": os.environ.get("RPC_TIMEOUT_SECONDS", "2"),
+        "PROXY_PRESETS_PATH": "",
+    })
+    os.environ.setdefault("RELAYER_PRIVATE_KEY", "0x" + os.urandom(32).hex())
+
+    result = asyncio.run(run_load(seconds, rate, users, drain))
+    node.terminate()
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    result["scenario"] = name
+    result["faults"] = asdict(SCENARIOS[name])
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), help="run one scenario (default: all)")
+    parser.add_argument("--seconds", type=float, default=10, help="load duration per scenario")
+    parser.add_argument("--rate", type=float, default=40, help="relay requests per second")
+    parser.add_argument("--users", type=int, default=400, help="distinct signing users")
+    parser.add_argument("--drain", type=float, default=20, help="seconds to wait for relays to settle")
+    parser.add_argument("--json", action="store_true", help="print raw results as JSON lines")
+    args = parser.parse_args()
+
+    if args.scenario:
+        print(json.dumps(run_scenario(args.scenario, args.seconds, args.rate, args.users, args.drain)), flush=True)
+        # Receipt waits still parked in worker threads would hold up interpreter exit
+        os._exit(0)
+
+    # One process per scenario: fresh relayer, state and peak memory
+    results = []
+    for name in SCENARIOS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.rpc_faults", "--scenario", name, "--seconds", str(args.seconds),
+             "--rate", str(args.rate), "--users", str(args.users), "--drain", str(args.drain)],
+            capture_output=True, text=True
+        )
+        lines = output.stdout.strip().splitlines()
+        if output.returncode != 0 or not lines:
+            print(f"{name}: failed\n{output.stderr[-2000:]}", file=sys.stderr)
+            continue
+        results.append(json.loads(lines[-1]))
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+
+    columns = [
+        ("scenario", "scenario", 14), ("ok rps", "throughput_rps", 8), ("p50 ms", "p50_ms", 9),
+        ("p99 ms", "p99_ms", 9), ("in-flight", "peak_in_flight", 10), ("rss MB", "peak_rss_mb", 8),
+        ("sent", "relayer_txs_sent", 6), ("mined", "mined", 6), ("pending", "still_pending", 8),
+        ("gapped", "behind_nonce_gap", 7), ("replaced", "replaced", 9), ("user conflicts", "user_nonce_conflicts", 15),
+    ]
+    print("".join(f"{title:>{width}}" for title, _, width in columns))
+    for result in results:
+        print("".join(f"{str(result.get(key)):>{width}}" for _, key, width in columns))
+    print()
+    for result in results:
+        print(f"{result['scenario']:>14}: {result['outcomes']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Per-request parse and serialize cost of the relay API.
+
+Compares the previous path (FastAPI's json.loads, a model with hex strings,
+a hand-built dict and repeated hex decoding in the relayer) with the current
+one (pydantic parsing the raw body, hex decoded once, orjson responses).
+
+    python -m benchmarks.serialization
+"""
+
+import json
+import timeit
+from typing import Optional
+
+from fastapi.responses import JSONResponse
+from hexbytes import HexBytes
+from pydantic import BaseModel, Field
+
+from src.api.models import RelayRequest, RelayResponse, QuoteResponse
+from src.api.responses import FastJSONResponse
+
+
+BODY = json.dumps({
+    "from": "0x" + "11" * 20,
+    "to": "0x" + "22" * 20,
+    "encodedFunction": "0x" + "a9059cbb" + "00" * 12 + "33" * 20 + "00" * 31 + "01",
+    "transactionFee": 10,
+    "gasPrice": 30_000_000_000,
+    "gasLimit": 500_000,
+    "nonce": 7,
+    "signature": "0x" + "44" * 65,
+    "approvalData": "0x"
+}).encode()
+
+# How often the relayer turns each hex field into bytes on the way to relayCall
+HEX_DECODES_PER_REQUEST = 5
+
+
+class LegacyRelayRequest(BaseModel):
+    """The request model before hex fields were decoded at parse time"""
+    from_address: str = Field(..., alias="from")
+    to: str
+    encoded_function: str = Field(..., alias="encodedFunction")
+    transaction_fee: int = Field(..., alias="transactionFee")
+    gas_price: int = Field(..., alias="gasPrice")
+    gas_limit: int = Field(..., alias="gasLimit")
+    nonce: int
+    signature: str
+    approval_data: Optional[str] = Field(default="0x", alias="approvalData")
+
+
+def legacy_parse():
+    request = LegacyRelayRequest.model_validate(json.loads(BODY))
+    relay_request = {
+        'from': request.from_address,
+        'to': request.to,
+        'encodedFunction': request.encoded_function,
+        'transactionFee': request.transaction_fee,
+        'gasPrice': request.gas_price,
+        'gasLimit': request.gas_limit,
+        'nonce': request.nonce,
+        'signature': request.signature,
+        'approvalData': request.approval_data
+    }
+    for _ in range(HEX_DECODES_PER_REQUEST):
+        HexBytes(relay_request['encodedFunction'])
+        HexBytes(relay_request['signature'])
+        HexBytes(relay_request['approvalData'])
+    return relay_request
+
+
+def current_parse():
+    relay_request = RelayRequest.model_validate_json(BODY).to_relay_request()
+    for _ in range(HEX_DECODES_PER_REQUEST):
+        HexBytes(relay_request['encodedFunction'])
+        HexBytes(relay_request['signature'])
+        HexBytes(relay_request['approvalData'])
+    return relay_request
+
+
+RELAY_RESPONSE = RelayResponse(success=True, tx_hash="0x" + "55" * 32).model_dump(mode="json")
+QUOTE_RESPONSE = QuoteResponse(
+    gas=898204, gas_price=30_000_000_000, network_gas_price=30_000_000_000, transaction_fee=10,
+    charge=29587932000000000, cost=26946120000000000, profit=2641812000000000,
+    min_transaction_fee=1, profitable=True
+).model_dump(mode="json")
+STATS_RESPONSE = {
+    "rpc_endpoints": [
+        {"url": f"https://node-{i}.example", "weight": 1.0, "healthy": True,
+         "error_rate": 0.0, "p50_ms": 12.5, "p95_ms": 40.1}
+        for i in range(3)
+    ],
+    "rpc_cache": {"block_number": 123456, "entries": 512, "hits": 10000, "misses": 2000, "hit_rate": 0.8333},
+}
+
+
+def bench(fn, number: int) -> float:
+    """Best-of-5 microseconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    number = 20000
+    rows = [
+        ("parse /relay body", bench(legacy_parse, number), bench(current_parse, number)),
+    ]
+    for name, content in (("RelayResponse", RELAY_RESPONSE), ("QuoteResponse", QUOTE_RESPONSE),
+                          ("/stats", STATS_RESPONSE)):
+        rows.append((
+            f"serialize {name}",
+            bench(lambda: JSONResponse(content), number),
+            bench(lambda: FastJSONResponse(content), number),
+        ))
+
+    print(f"{'':28}{'before (us)':>12}{'after (us)':>12}{'speedup':>10}")
+    for name, before, after in rows:
+        print(f"{name:28}{before:12.2f}{after:12.2f}{before / after:9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,36 @@
 """Main entry point for GSN Relayer"""
 
-import asyncio
-import uvicorn
+import argparse
 from src.config import config
-from src.api.server import app
 
 
-async def main():
+def main():
     """Start the GSN relayer server"""
-    print(f"Starting GSN Relayer on {config.host}:{config.port}")
+    parser = argparse.ArgumentParser(description='Run the GSN relayer server')
+    parser.add_argument('--workers', type=int, default=config.workers,
+                        help='Number of worker processes (default: WORKERS or 1)')
+    parser.add_argument('--reload', action='store_true',
+                        help='Auto-reload on code changes (development only, single worker)')
+    args = parser.parse_args()
     
-    config_dict = {
-        "app": "src.api.server:app",
-        "host": config.host,
-        "port": config.port,
-        "reload": True,
-        "log_level": "info"
-    }
+    if args.reload and args.workers > 1:
+        parser.error('--reload cannot be combined with multiple workers')
     
-    await uvicorn.Server(uvicorn.Config(**config_dict)).serve()
+    # Deferred so the app module (and web3) is only loaded by uvicorn itself
+    import uvicorn
+    
+    print(f"Starting GSN Relayer on {config.host}:{config.port} with {args.workers} worker(s)")
+    
+    # Workers share relayer nonces and in-flight state through config.state_db_path
+    uvicorn.run(
+        "src.api.server:app",
+        host=config.host,
+        port=config.port,
+        workers=args.workers,
+        reload=args.reload,
+        log_level="info"
+    )
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
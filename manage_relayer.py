@@ -4,11 +4,26 @@ import asyncio
 import argparse
 import sys
 from src.config import config
-from src.relayer import relayer
+from src.log import setup_logging, shutdown_logging
+
+
+def load_relayer():
+    """Build the relayer and connect it to the RPC node.
+    
+    Imported lazily so that `--help` and argument errors never load web3
+    or touch the network.
+    """
+    from src.relayer import get_relayer
+    
+    relayer = get_relayer()
+    if not relayer.is_connected:
+        relayer.connect()
+    return relayer
 
 
 async def status():
     """Show relayer status"""
+    relayer = load_relayer()
     status = await relayer.get_relay_status()
     balance = relayer.w3.eth.get_balance(relayer.address)
     
@@ -35,6 +50,7 @@ async def stake(amount: str = None):
     amount = amount or config.stake_amount_ether
     
     print(f"\n💰 Staking {amount} ETH...")
+    relayer = load_relayer()
     try:
         tx_hash = await relayer.stake_relay(amount)
         print(f"✅ Staking successful! TX: {tx_hash}")
@@ -49,6 +65,7 @@ async def register(fee: int = None, url: str = None):
     url = url or config.relay_url
     
     print(f"\n📝 Registering relayer with {fee}% fee at {url}...")
+    relayer = load_relayer()
     try:
         tx_hash = await relayer.register_relay(fee, url)
         print(f"✅ Registration successful! TX: {tx_hash}")
@@ -84,19 +101,24 @@ async def main():
         parser.print_help()
         return
     
-    if args.command == 'status':
-        await status()
-    elif args.command == 'stake':
-        await stake(args.amount)
-    elif args.command == 'register':
-        await register(args.fee, args.url)
-    elif args.command == 'setup':
-        # First stake
-        await stake(args.amount)
-        # Then register
-        await register(args.fee)
-        # Show final status
-        await status()
+    # Relayer logs (transactions sent, confirmations) go to stdout as JSON lines
+    setup_logging()
+    try:
+        if args.command == 'status':
+            await status()
+        elif args.command == 'stake':
+            await stake(args.amount)
+        elif args.command == 'register':
+            await register(args.fee, args.url)
+        elif args.command == 'setup':
+            # First stake
+            await stake(args.amount)
+            # Then register
+            await register(args.fee)
+            # Show final status
+            await status()
+    finally:
+        shutdown_logging()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 """Contract ABIs for GSN Relayer"""
 
-from .relay_hub import RELAY_HUB_ABI
+from .relay_hub import RELAY_HUB_ABI, RELAY_RECIPIENT_ABI
 from .proxy_wallet_factory import (
     PROXY_WALLET_FACTORY_ABI,
     ERC20_ABI,
@@ -9,6 +9,7 @@ from .proxy_wallet_factory import (
 
 __all__ = [
     "RELAY_HUB_ABI",
+    "RELAY_RECIPIENT_ABI",
     "PROXY_WALLET_FACTORY_ABI",
     "ERC20_ABI",
     "ERC1155_ABI"
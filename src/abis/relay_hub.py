@@ -133,4 +133,28 @@ RELAY_HUB_ABI = [
         "name": "RelayAdded",
         "type": "event"
     }
-] 
\ No newline at end of file
+] 
+# IRelayRecipient: the check RelayHub.canRelay runs after the signature and nonce
+RELAY_RECIPIENT_ABI = [
+    {
+        "constant": True,
+        "inputs": [
+            {"name": "relay", "type": "address"},
+            {"name": "from", "type": "address"},
+            {"name": "encodedFunction", "type": "bytes"},
+            {"name": "transactionFee", "type": "uint256"},
+            {"name": "gasPrice", "type": "uint256"},
+            {"name": "gasLimit", "type": "uint256"},
+            {"name": "nonce", "type": "uint256"},
+            {"name": "approvalData", "type": "bytes"},
+            {"name": "maxPossibleCharge", "type": "uint256"}
+        ],
+        "name": "acceptRelayedCall",
+        "outputs": [
+            {"name": "", "type": "uint256"},
+            {"name": "", "type": "bytes"}
+        ],
+        "payable": False,
+        "type": "function"
+    }
+]
@@ -1,7 +1,20 @@
 """Pydantic models for API requests and responses"""
 
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Optional
+from pydantic import BaseModel, BeforeValidator, Field
+
+
+def hex_to_bytes(value: Any) -> Any:
+    """Decode "0x..." hex strings once, at parse time"""
+    if value is None:
+        return b""
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value[:2] in ("0x", "0X") else value)
+    return value
+
+
+# Hex string on the wire, bytes once parsed
+HexData = Annotated[bytes, BeforeValidator(hex_to_bytes)]
 
 
 class ProxyCall(BaseModel):
@@ -9,39 +22,66 @@ class ProxyCall(BaseModel):
     typeCode: int = Field(..., description="Call type: 2 for CALL, 3 for DELEGATECALL")
     to: str = Field(..., description="Target contract address")
     value: str = Field(default="0", description="ETH value to send")
-    data: str = Field(..., description="Encoded function call data")
+    data: HexData = Field(..., description="Encoded function call data")
+
+    def to_proxy_call(self) -> Dict[str, Any]:
+        return {'typeCode': self.typeCode, 'to': self.to, 'value': int(self.value), 'data': self.data}
 
 
 class RelayRequest(BaseModel):
     """GSN relay request"""
     from_address: str = Field(..., alias="from", description="Transaction sender address")
     to: str = Field(..., description="Target contract address")
-    encoded_function: str = Field(..., alias="encodedFunction", description="Encoded function call")
+    encoded_function: HexData = Field(..., alias="encodedFunction", description="Encoded function call")
     transaction_fee: int = Field(..., alias="transactionFee", description="Fee percentage for relayer")
     gas_price: int = Field(..., alias="gasPrice", description="Gas price in wei")
     gas_limit: int = Field(..., alias="gasLimit", description="Gas limit")
     nonce: int = Field(..., description="Sender's nonce from RelayHub")
-    signature: str = Field(..., description="User's signature")
-    approval_data: Optional[str] = Field(default="0x", alias="approvalData", description="Additional approval data")
+    signature: HexData = Field(..., description="User's signature")
+    approval_data: HexData = Field(default=b"", alias="approvalData", description="Additional approval data")
 
     class Config:
         populate_by_name = True
 
+    def to_relay_request(self) -> Dict[str, Any]:
+        """The dict the relayer works with"""
+        return {
+            'from': self.from_address,
+            'to': self.to,
+            'encodedFunction': self.encoded_function,
+            'transactionFee': self.transaction_fee,
+            'gasPrice': self.gas_price,
+            'gasLimit': self.gas_limit,
+            'nonce': self.nonce,
+            'signature': self.signature,
+            'approvalData': self.approval_data
+        }
+
 
 class ProxyWalletRequest(BaseModel):
     """Request to execute proxy wallet calls"""
     user_address: str = Field(..., description="User's address (owner of proxy wallet)")
     proxy_calls: List[ProxyCall] = Field(..., description="List of calls to execute")
-    signature: str = Field(..., description="User's signature for GSN")
+    signature: HexData = Field(..., description="User's signature for GSN")
     gas_price: Optional[int] = Field(None, description="Gas price in wei (optional)")
     gas_limit: Optional[int] = Field(default=800000, description="Gas limit")
 
 
+class ProxyPresetRequest(BaseModel):
+    """Request to execute a named proxy call bundle"""
+    user_address: str = Field(..., description="User's address (owner of proxy wallet)")
+    signature: HexData = Field(..., description="User's signature for GSN")
+    gas_price: Optional[int] = Field(None, description="Gas price in wei (optional)")
+    gas_limit: Optional[int] = Field(None, description="Gas limit (default: the preset's, else 800000)")
+
+
 class RelayResponse(BaseModel):
     """Response from relay operations"""
     success: bool
+    relay_id: Optional[str] = None
     tx_hash: Optional[str] = None
     error: Optional[str] = None
+    error_code: Optional[str] = None
     gas_used: Optional[int] = None
     charge: Optional[int] = None
 
@@ -55,4 +95,32 @@ class StatusResponse(BaseModel):
     unstake_delay: Optional[int] = None
     owner: Optional[str] = None
     balance: Optional[str] = None
-    is_ready: bool 
\ No newline at end of file
+    is_ready: bool
+    block_number: Optional[int] = None
+    is_fresh: bool = True
+
+
+class QuoteRequest(BaseModel):
+    """Request to price a relay before signing it"""
+    to: str = Field(..., description="Target contract address")
+    encoded_function: HexData = Field(..., alias="encodedFunction", description="Encoded function call")
+    gas_limit: int = Field(..., alias="gasLimit", description="Gas limit")
+    gas_price: Optional[int] = Field(None, alias="gasPrice", description="Gas price in wei (default: network gas price)")
+    transaction_fee: Optional[int] = Field(None, alias="transactionFee", description="Fee percentage (default: relay fee)")
+
+    class Config:
+        populate_by_name = True
+
+
+class QuoteResponse(BaseModel):
+    """Expected economics of a relay, amounts in wei"""
+    gas: int
+    gas_price: int
+    network_gas_price: int
+    cost_gas_price: int
+    transaction_fee: int
+    charge: int
+    cost: int
+    profit: int
+    min_transaction_fee: Optional[int] = None
+    profitable: bool
@@ -0,0 +1,68 @@
+"""JSON response class and request body parsing for the API"""
+
+import json
+from typing import Any, Callable, Type, TypeVar
+
+import orjson
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ValidationError
+
+
+Model = TypeVar("Model", bound=BaseModel)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson.
+
+    orjson only handles integers up to 64 bits; wei amounts can be larger,
+    so those (rare) bodies fall back to the standard library encoder.
+    """
+
+    def render(self, content: Any) -> bytes:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_body(model: Type[Model]) -> Callable:
+    """Dependency that validates the raw request body straight into model.
+
+    pydantic parses the JSON bytes itself, skipping the intermediate
+    json.loads dict FastAPI builds for ordinary body parameters.
+    """
+
+    async def parse(request: Request) -> Model:
+        try:
+            return model.model_validate_json(await request.body())
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+            for error in errors:
+                error["loc"] = ("body", *error["loc"])
+            raise RequestValidationError(errors)
+
+    return parse
+
+
+def _inline_refs(schema: Any, defs: dict) -> Any:
+    if isinstance(schema, dict):
+        ref = schema.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/$defs/"):
+            return _inline_refs(defs[ref[len("#/$defs/"):]], defs)
+        return {key: _inline_refs(value, defs) for key, value in schema.items() if key != "$defs"}
+    if isinstance(schema, list):
+        return [_inline_refs(item, defs) for item in schema]
+    return schema
+
+
+def json_body_schema(model: Type[BaseModel]) -> dict:
+    """openapi_extra documenting a json_body() request body"""
+    schema = model.model_json_schema(by_alias=True)
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": _inline_refs(schema, schema.get("$defs", {}))}}
+        }
+    }
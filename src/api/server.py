@@ -1,24 +1,88 @@
 """FastAPI server for GSN Relayer"""
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import hmac
+import math
+import uuid
+from contextlib import asynccontextmanager
+from typing import Optional
+from fastapi import Depends, FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from web3 import Web3
-import traceback
+from fastapi.responses import StreamingResponse
+from starlette.websockets import WebSocketState
 
+from .. import profiling
 from ..config import config
-from ..relayer import relayer
-from ..encoders import encode_proxy_calls
-from ..abis import PROXY_WALLET_FACTORY_ABI
+from ..relayer import GSNRelayer, get_relayer
+from ..rpc import CircuitOpenError
+from ..status import StatusRefresher
+from ..log import get_logger, log_stats, setup_logging, shutdown_logging
+from ..validation import RelayRequestError
+from .responses import FastJSONResponse, json_body, json_body_schema
 from .models import (
-    RelayRequest, ProxyWalletRequest, RelayResponse, 
-    StatusResponse, ProxyCall
+    RelayRequest, ProxyWalletRequest, ProxyPresetRequest, RelayResponse, 
+    StatusResponse, QuoteRequest, QuoteResponse
 )
 
 
+logger = get_logger("api")
+
+# Gas limit for proxy wallet relays that do not set one
+DEFAULT_PROXY_GAS_LIMIT = 800000
+
+# Created by the lifespan hook so that importing this module never touches the network
+relayer: Optional[GSNRelayer] = None
+status_refresher: Optional[StatusRefresher] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Build the relayer and run the background status refresher.
+    
+    The refresher connects the relayer to the RPC node (retrying until it
+    succeeds), so the server starts even while the node is unreachable.
+    Relay events published by other workers are picked up by a poller;
+    events still queued for the state database are written on shutdown.
+    """
+    global relayer, status_refresher
+    setup_logging()
+    relayer = get_relayer()
+    status_refresher = StatusRefresher(relayer)
+    status_refresher.start()
+    events_poller = asyncio.create_task(relayer.events.run())
+    yield
+    events_poller.cancel()
+    await status_refresher.stop()
+    await relayer.events.flush()
+    relayer.signer.close()
+    shutdown_logging()
+
+
+def rpc_unavailable(retry_after: float) -> HTTPException:
+    """503 telling the client when an RPC endpoint will be probed again"""
+    return HTTPException(
+        status_code=503,
+        detail="RPC node unavailable (circuit open)",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+def connected_relayer() -> GSNRelayer:
+    """Return the relayer, or fail fast if it is not connected yet or every RPC circuit is open"""
+    if relayer is None or not relayer.is_connected:
+        raise HTTPException(status_code=503, detail="Relayer is not connected to the RPC node")
+    retry_after = relayer.w3.provider.retry_after()
+    if retry_after is not None:
+        raise rpc_unavailable(retry_after)
+    return relayer
+
+
 app = FastAPI(
     title="GSN Relayer",
     description="Gas Station Network Relayer for Ethereum/Polygon",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Enable CORS
@@ -37,36 +101,98 @@ async def root():
     return {
         "status": "online",
         "relayer": relayer.address,
-        "network": relayer.w3.eth.chain_id
+        "network": relayer.chain_id
+    }
+
+
+@app.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """Readiness probe: the relayer is connected and the cached chain state is fresh"""
+    snapshot = status_refresher.snapshot
+    body = {
+        "ready": relayer.is_connected and status_refresher.is_fresh,
+        "connected": relayer.is_connected,
+        "block_number": snapshot.block_number if snapshot else None,
+        "age_seconds": status_refresher.age,
+        "error": status_refresher.last_error
     }
+    return FastJSONResponse(status_code=200 if body["ready"] else 503, content=body)
+
+
+def require_admin(authorization: Optional[str] = Header(None)):
+    """Admin endpoints take ADMIN_TOKEN as a bearer token, and do not exist without one"""
+    if not config.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.encode(), config.admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required", headers={"WWW-Authenticate": "Bearer"})
+
+
+@app.get("/stats", dependencies=[Depends(require_admin)])
+async def get_stats():
+    """RPC endpoint health (with node URLs), cache hit rates and deposit reservations"""
+    return {
+        "rpc_endpoints": relayer.w3.provider.stats(),
+        "rpc_retries": relayer.w3.provider.retries,
+        "rpc_cache": relayer.rpc_cache.stats(),
+        "gas_estimates": relayer.gas_estimator.stats(),
+        "gas_model": relayer.gas_model.stats(),
+        "deposits": relayer.deposits.stats(),
+        "events": relayer.events.stats(),
+        "receipts": relayer.receipts.stats(),
+        "fees": relayer.fees.stats(),
+        "proxy_encoder": relayer.proxy_encoder.stats(),
+        "replay_filter": relayer.replay_filter.stats(),
+        "logging": log_stats()
+    }
+
+
+@app.get("/debug/profile", dependencies=[Depends(require_admin)], include_in_schema=False)
+async def debug_profile(seconds: float = 10, mode: str = "sample", interval_ms: float = 5):
+    """Profile this worker for a few seconds: collapsed stacks or pstats, plus event-loop stalls"""
+    try:
+        return await profiling.profile(seconds, mode, interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 @app.get("/status", response_model=StatusResponse)
 async def get_status():
     """Get relayer status"""
-    try:
-        status = await relayer.get_relay_status()
-        balance = relayer.w3.eth.get_balance(relayer.address)
-        
-        return StatusResponse(
-            address=status['address'],
-            state=status['state'],
-            state_text=status['stateText'],
-            total_stake=status.get('totalStake'),
-            unstake_delay=status.get('unstakeDelay'),
-            owner=status.get('owner'),
-            balance=str(balance),
-            is_ready=status['state'] == 2  # Registered state
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    snapshot = status_refresher.snapshot
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Relayer status not yet available")
+    
+    status = snapshot.relay
+    return StatusResponse(
+        address=status['address'],
+        state=status['state'],
+        state_text=status['stateText'],
+        total_stake=status.get('totalStake'),
+        unstake_delay=status.get('unstakeDelay'),
+        owner=status.get('owner'),
+        balance=str(snapshot.balance),
+        is_ready=status['state'] == 2,  # Registered state
+        block_number=snapshot.block_number,
+        is_fresh=status_refresher.is_fresh
+    )
 
 
 @app.post("/stake", response_model=RelayResponse)
 async def stake_relay(stake_amount_ether: str = "1", unstake_delay_seconds: int = None):
     """Stake the relay"""
+    relayer = connected_relayer()
     try:
         tx_hash = await relayer.stake_relay(stake_amount_ether, unstake_delay_seconds)
+        status_refresher.request_refresh()
         return RelayResponse(
             success=True,
             tx_hash=tx_hash
@@ -81,8 +207,10 @@ async def stake_relay(stake_amount_ether: str = "1", unstake_delay_seconds: int
 @app.post("/register", response_model=RelayResponse)
 async def register_relay(transaction_fee: int = None, url: str = None):
     """Register the relay after staking"""
+    relayer = connected_relayer()
     try:
         tx_hash = await relayer.register_relay(transaction_fee, url)
+        status_refresher.request_refresh()
         return RelayResponse(
             success=True,
             tx_hash=tx_hash
@@ -94,113 +222,243 @@ async def register_relay(transaction_fee: int = None, url: str = None):
         )
 
 
-@app.post("/relay", response_model=RelayResponse)
-async def relay_transaction(request: RelayRequest):
-    """Relay a transaction"""
+@app.post("/quote", response_model=QuoteResponse, openapi_extra=json_body_schema(QuoteRequest))
+async def quote_relay(request: QuoteRequest = Depends(json_body(QuoteRequest))):
+    """Price a relay request without sending anything"""
+    relayer = connected_relayer()
+    gas_price = request.gas_price or relayer.network_gas_price
+    if gas_price is None:
+        gas_price = await asyncio.to_thread(lambda: relayer.w3.eth.gas_price)
+    
+    relay_request = {
+        'to': request.to,
+        'encodedFunction': request.encoded_function,
+        'transactionFee': config.relay_fee_percentage if request.transaction_fee is None else request.transaction_fee,
+        'gasPrice': gas_price,
+        'gasLimit': request.gas_limit
+    }
+    return QuoteResponse(**relayer.quote_relay(relay_request).to_dict())
+
+
+@app.post("/relay", response_model=RelayResponse, openapi_extra=json_body_schema(RelayRequest))
+async def relay_transaction(request: RelayRequest = Depends(json_body(RelayRequest)), wait: bool = True):
+    """Relay a transaction (wait=false returns once it is broadcast)"""
+    relayer = connected_relayer()
+    relay_id = uuid.uuid4().hex
     try:
-        # Convert request to dict format expected by relayer
-        relay_request = {
-            'from': request.from_address,
-            'to': request.to,
-            'encodedFunction': request.encoded_function,
-            'transactionFee': request.transaction_fee,
-            'gasPrice': request.gas_price,
-            'gasLimit': request.gas_limit,
-            'nonce': request.nonce,
-            'signature': request.signature,
-            'approvalData': request.approval_data
-        }
-        
-        # Verify signature
-        if not relayer.verify_relay_request_signature(relay_request):
-            raise ValueError("Invalid signature")
-        
-        # Execute relay
-        tx_hash = await relayer.relay_call(relay_request)
+        # Execute relay (validates the request and signature first)
+        tx_hash = await relayer.relay_call(request.to_relay_request(), wait=wait, relay_id=relay_id)
         
         return RelayResponse(
             success=True,
-            tx_hash=tx_hash
+            tx_hash=tx_hash,
+            relay_id=relay_id
         )
+    except RelayRequestError as e:
+        return RelayResponse(
+            success=False,
+            error=str(e),
+            error_code=e.code,
+            relay_id=relay_id
+        )
+    except CircuitOpenError as e:
+        raise rpc_unavailable(e.retry_after)
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("relay failed", extra={"relay_id": relay_id})
         return RelayResponse(
             success=False,
-            error=str(e)
+            error=str(e),
+            relay_id=relay_id
         )
 
 
-@app.post("/relay/proxy-wallet", response_model=RelayResponse)
-async def relay_proxy_wallet_transaction(request: ProxyWalletRequest):
+@app.post("/relay/proxy-wallet", response_model=RelayResponse, openapi_extra=json_body_schema(ProxyWalletRequest))
+async def relay_proxy_wallet_transaction(request: ProxyWalletRequest = Depends(json_body(ProxyWalletRequest)),
+                                         wait: bool = True):
     """Relay a ProxyWalletFactory transaction (simplified endpoint)"""
+    relayer = connected_relayer()
+    
+    # Encode the proxy function call (cached for repeated bundles)
     try:
-        # Get nonce for user
-        nonce = relayer.relay_hub.functions.getNonce(request.user_address).call()
-        
-        # Encode the proxy calls
-        proxy_calls_data = []
-        for call in request.proxy_calls:
-            proxy_calls_data.append({
-                'typeCode': call.typeCode,
-                'to': call.to,
-                'value': int(call.value),
-                'data': call.data
-            })
-        
-        # Get ProxyWalletFactory address (you'll need to set this in config)
-        proxy_factory_address = config.proxy_wallet_factory_address
-        
-        # Create contract instance
-        proxy_factory = relayer.w3.eth.contract(
-            address=Web3.to_checksum_address(proxy_factory_address),
-            abi=PROXY_WALLET_FACTORY_ABI
-        )
+        proxy_calls_data = [call.to_proxy_call() for call in request.proxy_calls]
+        encoded_function = relayer.proxy_encoder.encode(proxy_calls_data)
+    except ValueError as e:
+        return RelayResponse(success=False, error=str(e))
+    
+    return await relay_proxy_wallet_call(
+        relayer, request.user_address, encoded_function, request.signature,
+        request.gas_price, request.gas_limit, wait
+    )
+
+
+@app.get("/relay/proxy-wallet/presets")
+async def list_proxy_presets():
+    """Named proxy call bundles served by /relay/proxy-wallet/preset/{name}"""
+    return {"presets": [preset.to_dict() for preset in relayer.proxy_presets.values()]}
+
+
+@app.post("/relay/proxy-wallet/preset/{name}", response_model=RelayResponse,
+          openapi_extra=json_body_schema(ProxyPresetRequest))
+async def relay_proxy_wallet_preset(name: str,
+                                    request: ProxyPresetRequest = Depends(json_body(ProxyPresetRequest)),
+                                    wait: bool = True):
+    """Relay a named proxy call bundle whose calldata was encoded at startup"""
+    relayer = connected_relayer()
+    preset = relayer.proxy_presets.get(name)
+    if preset is None:
+        raise HTTPException(status_code=404, detail=f"Unknown proxy preset {name!r}")
+    
+    return await relay_proxy_wallet_call(
+        relayer, request.user_address, preset.encoded_function, request.signature,
+        request.gas_price, request.gas_limit or preset.gas_limit or DEFAULT_PROXY_GAS_LIMIT, wait
+    )
+
+
+async def relay_proxy_wallet_call(relayer: GSNRelayer, user_address: str, encoded_function: bytes,
+                                  signature: bytes, gas_price: Optional[int], gas_limit: int,
+                                  wait: bool) -> RelayResponse:
+    """Relay ProxyWalletFactory calldata on behalf of user_address"""
+    relay_id = uuid.uuid4().hex
+    try:
+        # Next nonce for user, after relays already mined or in flight
+        _, nonce = await relayer.next_user_nonce(user_address)
         
-        # Encode the proxy function call
-        encoded_function = proxy_factory.encodeABI(
-            fn_name='proxy',
-            args=[proxy_calls_data]
+        # Use provided gas price, else the network gas price cached each block
+        gas_price = (
+            gas_price or relayer.network_gas_price
+            or await asyncio.to_thread(lambda: relayer.w3.eth.gas_price)
         )
         
-        # Use provided gas price or current network gas price
-        gas_price = request.gas_price or relayer.w3.eth.gas_price
-        
         # Create relay request
         relay_request = {
-            'from': request.user_address,
-            'to': proxy_factory_address,
+            'from': user_address,
+            'to': relayer.proxy_wallet_factory.address,
             'encodedFunction': encoded_function,
             'transactionFee': config.relay_fee_percentage,
             'gasPrice': gas_price,
-            'gasLimit': request.gas_limit,
+            'gasLimit': gas_limit,
             'nonce': nonce,
-            'signature': request.signature,
+            'signature': signature,
             'approvalData': '0x'
         }
         
         # Execute relay
-        tx_hash = await relayer.relay_call(relay_request)
+        tx_hash = await relayer.relay_call(relay_request, wait=wait, relay_id=relay_id)
         
         return RelayResponse(
             success=True,
-            tx_hash=tx_hash
+            tx_hash=tx_hash,
+            relay_id=relay_id
+        )
+    except RelayRequestError as e:
+        return RelayResponse(
+            success=False,
+            error=str(e),
+            error_code=e.code,
+            relay_id=relay_id
         )
+    except CircuitOpenError as e:
+        raise rpc_unavailable(e.retry_after)
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("relay failed", extra={"relay_id": relay_id})
         return RelayResponse(
             success=False,
-            error=str(e)
+            error=str(e),
+            relay_id=relay_id
         )
 
 
+@app.get("/relay/{relay_id}/events")
+async def relay_events(relay_id: str):
+    """Server-sent events for one relay: accepted, broadcast, mined or failed.
+    
+    Past events are replayed first; the stream ends after mined or failed.
+    """
+    events = relayer.events
+    subscription = events.open()
+    
+    async def stream():
+        try:
+            await events.subscribe(subscription, relay_id)
+            while True:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), timeout=config.events_keepalive_seconds
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    break
+                if event.id is not None:
+                    yield f"id: {event.id}\n"
+                yield f"event: {event.event}\ndata: {event.data}\n\n"
+                if event.terminal:
+                    break
+        finally:
+            events.close(subscription)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.websocket("/ws/relays")
+async def relay_events_websocket(websocket: WebSocket):
+    """Relay events for many relays over one connection.
+    
+    Send {"subscribe": [relay_id, ...]} or {"unsubscribe": [...]}; each event
+    arrives as one JSON text message. Relays are unsubscribed once they finish.
+    """
+    await websocket.accept()
+    events = relayer.events
+    subscription = events.open()
+    
+    async def receive():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                for relay_id in message.get("unsubscribe", []):
+                    events.unsubscribe(subscription, str(relay_id))
+                for relay_id in message.get("subscribe", []):
+                    await events.subscribe(subscription, str(relay_id))
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            # Malformed message or too many subscriptions
+            logger.info("closing relay events websocket", extra={"error": str(e)})
+        finally:
+            events.close(subscription)
+    
+    reader = asyncio.create_task(receive())
+    try:
+        while True:
+            event = await subscription.queue.get()
+            if event is None:
+                break
+            await websocket.send_text(event.data)
+            if event.terminal:
+                events.unsubscribe(subscription, event.relay_id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        events.close(subscription)
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
+
+
 @app.get("/nonce/{address}")
 async def get_nonce(address: str):
-    """Get nonce for an address from RelayHub"""
+    """Get nonce for an address from RelayHub, and the next nonce after our in-flight relays"""
+    relayer = connected_relayer()
     try:
-        nonce = relayer.relay_hub.functions.getNonce(
-            Web3.to_checksum_address(address)
-        ).call()
-        return {"address": address, "nonce": nonce}
+        nonce, pending = await relayer.next_user_nonce(address)
+        return {"address": address, "nonce": nonce, "pending_nonce": pending}
+    except CircuitOpenError as e:
+        raise rpc_unavailable(e.retry_after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -208,10 +466,16 @@ async def get_nonce(address: str):
 # Error handlers
 @app.exception_handler(ValueError)
 async def value_error_handler(request, exc):
-    return HTTPException(status_code=400, detail=str(exc))
+    return FastJSONResponse(status_code=400, content={"detail": str(exc)})
+
+
+@app.exception_handler(CircuitOpenError)
+async def circuit_open_handler(request, exc):
+    error = rpc_unavailable(exc.retry_after)
+    return FastJSONResponse(status_code=error.status_code, content={"detail": error.detail}, headers=error.headers)
 
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    traceback.print_exc()
-    return HTTPException(status_code=500, detail=str(exc)) 
\ No newline at end of file
+    logger.error("unhandled error", exc_info=exc, extra={"path": request.url.path})
+    return FastJSONResponse(status_code=500, content={"detail": str(exc)}) 
\ No newline at end of file
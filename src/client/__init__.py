@@ -0,0 +1,8 @@
+# GSN Relayer client SDK
+from .client import PROXY_WALLET_FACTORY_ADDRESS, RELAY_HUB_ADDRESS, RelayClient
+from .signing import sign_relay_request, sign_relay_requests
+
+__all__ = [
+    "RelayClient", "RELAY_HUB_ADDRESS", "PROXY_WALLET_FACTORY_ADDRESS",
+    "sign_relay_request", "sign_relay_requests",
+]
@@ -0,0 +1,245 @@
+"""Async HTTP client for the relayer API"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from eth_account.signers.local import LocalAccount
+
+from ..encoders import ProxyCallEncoder
+from .signing import sign_relay_request, sign_relay_requests
+
+
+# GSN v1 deployments on Polygon, the relayer's defaults
+RELAY_HUB_ADDRESS = "0xD216153c06E857cD7f72665E0aF1d7D82172F494"
+PROXY_WALLET_FACTORY_ADDRESS = "0xaB45c5A4B0c941a2F231C04C3f49182e1A254052"
+
+# Gas limit the relayer uses for proxy wallet relays that do not set one
+DEFAULT_PROXY_GAS_LIMIT = 800000
+
+# Encoded proxy(...) calldata kept per client for repeated call bundles
+PROXY_ENCODER_CACHE_SIZE = 256
+
+
+def _wire(value: Any) -> Any:
+    """bytes as 0x-prefixed hex, everything else unchanged"""
+    if isinstance(value, (bytes, bytearray)):
+        return "0x" + bytes(value).hex()
+    return value
+
+
+class RelayClient:
+    """Relayer API client over a pool of keep-alive connections.
+
+    Relay requests are signed locally, so private keys never leave the
+    caller. relay_batch looks up nonces for many users concurrently, signs
+    on a thread pool and submits each user's relays in nonce order while
+    different users proceed in parallel. Signatures commit to the RelayHub
+    and ProxyWalletFactory addresses, which must match the relayer's.
+
+        async with RelayClient("http://localhost:8090") as client:
+            result = await client.sign_and_relay(account, to, data, gas_limit=500000)
+    """
+
+    def __init__(self, base_url: str, relay_hub_address: str = RELAY_HUB_ADDRESS,
+                 proxy_wallet_factory_address: str = PROXY_WALLET_FACTORY_ADDRESS,
+                 max_connections: int = 100, timeout: float = 30.0, signing_threads: int = 4):
+        self.relay_hub_address = relay_hub_address
+        self.proxy_wallet_factory_address = proxy_wallet_factory_address
+        self._proxy_encoder = ProxyCallEncoder(PROXY_ENCODER_CACHE_SIZE)
+        self.max_connections = max_connections
+        self._http = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=signing_threads, thread_name_prefix="relay-signer")
+        self._relay_address: Optional[str] = None
+
+    async def __aenter__(self) -> "RelayClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        await self._http.aclose()
+        self._executor.shutdown(wait=False)
+
+    async def _get(self, path: str) -> Dict[str, Any]:
+        response = await self._http.get(path)
+        response.raise_for_status()
+        return response.json()
+
+    async def _post(self, path: str, body: Dict[str, Any], wait: Optional[bool] = None) -> Dict[str, Any]:
+        params = None if wait is None else {"wait": "true" if wait else "false"}
+        response = await self._http.post(path, json={k: _wire(v) for k, v in body.items()}, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def status(self) -> Dict[str, Any]:
+        return await self._get("/status")
+
+    async def relay_address(self) -> str:
+        """The relay's address, which every signature commits to (cached)"""
+        if self._relay_address is None:
+            self._relay_address = (await self.status())['address']
+        return self._relay_address
+
+    async def nonce(self, address: str) -> int:
+        """The next RelayHub nonce for address, counting the relayer's in-flight relays"""
+        body = await self._get(f"/nonce/{address}")
+        return body.get('pending_nonce', body['nonce'])
+
+    async def quote(self, to: str, encoded_function: bytes, gas_limit: int,
+                    gas_price: Optional[int] = None, transaction_fee: Optional[int] = None) -> Dict[str, Any]:
+        body = {'to': to, 'encodedFunction': encoded_function, 'gasLimit': gas_limit}
+        if gas_price is not None:
+            body['gasPrice'] = gas_price
+        if transaction_fee is not None:
+            body['transactionFee'] = transaction_fee
+        return await self._post("/quote", body)
+
+    async def relay(self, relay_request: Dict[str, Any], wait: bool = True) -> Dict[str, Any]:
+        """POST a signed relay request to /relay"""
+        return await self._post("/relay", relay_request, wait)
+
+    async def relay_proxy_wallet(self, user_address: str, proxy_calls: List[Dict[str, Any]], signature: bytes,
+                                 gas_price: Optional[int] = None, gas_limit: Optional[int] = None,
+                                 wait: bool = True) -> Dict[str, Any]:
+        """POST proxy calls to /relay/proxy-wallet with a signature from prepare_proxy_wallet.
+
+        The relayer rebuilds the request with its own fee and the user's
+        next nonce, so sign with the default fee and pass the same gas
+        price and gas limit here.
+        """
+        body = {
+            'user_address': user_address,
+            'proxy_calls': [
+                {**call, 'data': _wire(call['data']), 'value': str(call.get('value', 0))} for call in proxy_calls
+            ],
+            'signature': signature,
+        }
+        if gas_price is not None:
+            body['gas_price'] = gas_price
+        if gas_limit is not None:
+            body['gas_limit'] = gas_limit
+        return await self._post("/relay/proxy-wallet", body, wait)
+
+    async def prepare(self, account: LocalAccount, to: str, encoded_function: bytes, gas_limit: int,
+                      gas_price: Optional[int] = None, transaction_fee: Optional[int] = None,
+                      nonce: Optional[int] = None) -> Dict[str, Any]:
+        """A signed relay request, with the nonce, gas price and fee filled in from the relayer"""
+        if gas_price is None or transaction_fee is None:
+            quote = await self.quote(to, encoded_function, gas_limit, gas_price, transaction_fee)
+            gas_price, transaction_fee = quote['gas_price'], quote['transaction_fee']
+        relay_request = {
+            'from': account.address,
+            'to': to,
+            'encodedFunction': encoded_function,
+            'transactionFee': transaction_fee,
+            'gasPrice': gas_price,
+            'gasLimit': gas_limit,
+            'nonce': await self.nonce(account.address) if nonce is None else nonce,
+            'approvalData': b"",
+        }
+        relay_address = await self.relay_address()
+        loop = asyncio.get_running_loop()
+        relay_request['signature'] = await loop.run_in_executor(
+            self._executor, sign_relay_request, account, relay_request, self.relay_hub_address, relay_address
+        )
+        return relay_request
+
+    async def sign_and_relay(self, account: LocalAccount, to: str, encoded_function: bytes, gas_limit: int,
+                             gas_price: Optional[int] = None, transaction_fee: Optional[int] = None,
+                             wait: bool = True) -> Dict[str, Any]:
+        relay_request = await self.prepare(account, to, encoded_function, gas_limit, gas_price, transaction_fee)
+        return await self.relay(relay_request, wait)
+
+    async def prepare_proxy_wallet(self, account: LocalAccount, proxy_calls: List[Dict[str, Any]],
+                                   gas_limit: int = DEFAULT_PROXY_GAS_LIMIT, gas_price: Optional[int] = None,
+                                   transaction_fee: Optional[int] = None,
+                                   nonce: Optional[int] = None) -> Dict[str, Any]:
+        """A signed relay request running proxy_calls through the user's proxy wallet.
+
+        Each call has 'typeCode', 'to', 'value' and 'data', as for
+        /relay/proxy-wallet; the request calls ProxyWalletFactory.proxy
+        with them.
+        """
+        encoded_function = self._proxy_encoder.encode(proxy_calls)
+        return await self.prepare(
+            account, self.proxy_wallet_factory_address, encoded_function, gas_limit, gas_price, transaction_fee, nonce
+        )
+
+    async def sign_and_relay_proxy_wallet(self, account: LocalAccount, proxy_calls: List[Dict[str, Any]],
+                                          gas_limit: int = DEFAULT_PROXY_GAS_LIMIT, gas_price: Optional[int] = None,
+                                          transaction_fee: Optional[int] = None,
+                                          wait: bool = True) -> Dict[str, Any]:
+        relay_request = await self.prepare_proxy_wallet(account, proxy_calls, gas_limit, gas_price, transaction_fee)
+        return await self.relay(relay_request, wait)
+
+    async def relay_batch(self, calls: Sequence[Tuple[LocalAccount, Dict[str, Any]]],
+                          wait: bool = False) -> List[Dict[str, Any]]:
+        """Sign and relay many (account, call) pairs; results are in input order.
+
+        Each call has 'to', 'encodedFunction' and 'gasLimit', and may set
+        'gasPrice' and 'transactionFee' (otherwise one quote supplies the
+        network gas price and the relay fee). Nonces are looked up once per
+        user and assigned consecutively. A user's relays are submitted one
+        after another, and once one fails the rest of that user's relays
+        are not sent.
+        """
+        if not calls:
+            return []
+        relay_address = await self.relay_address()
+        limit = asyncio.Semaphore(self.max_connections)
+
+        defaults: Dict[str, Any] = {}
+        if any('gasPrice' not in call or 'transactionFee' not in call for _, call in calls):
+            first = calls[0][1]
+            quote = await self.quote(first['to'], first['encodedFunction'], first['gasLimit'])
+            defaults = {'gasPrice': quote['gas_price'], 'transactionFee': quote['transaction_fee']}
+
+        async def next_nonce(address: str) -> Tuple[str, int]:
+            async with limit:
+                return address, await self.nonce(address)
+
+        nonces = dict(await asyncio.gather(*(next_nonce(a) for a in {account.address for account, _ in calls})))
+
+        relay_requests = []
+        by_user: Dict[str, List[int]] = {}
+        for i, (account, call) in enumerate(calls):
+            relay_requests.append({
+                **defaults,
+                **call,
+                'from': account.address,
+                'nonce': nonces[account.address],
+                'approvalData': call.get('approvalData', b""),
+            })
+            nonces[account.address] += 1
+            by_user.setdefault(account.address, []).append(i)
+
+        signatures = await sign_relay_requests(
+            [account for account, _ in calls], relay_requests, self.relay_hub_address, relay_address, self._executor
+        )
+        for relay_request, signature in zip(relay_requests, signatures):
+            relay_request['signature'] = signature
+
+        results: List[Optional[Dict[str, Any]]] = [None] * len(calls)
+
+        async def submit_in_order(indexes: List[int]):
+            failed = False
+            for i in indexes:
+                if failed:
+                    results[i] = {'success': False, 'error': "not sent: an earlier relay for this user failed"}
+                    continue
+                async with limit:
+                    try:
+                        results[i] = await self.relay(relay_requests[i], wait)
+                    except httpx.HTTPError as e:
+                        results[i] = {'success': False, 'error': str(e)}
+                failed = not results[i].get('success')
+
+        await asyncio.gather(*(submit_in_order(indexes) for indexes in by_user.values()))
+        return results
@@ -0,0 +1,45 @@
+"""Local signing of GSN v1 relay requests"""
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional, Sequence
+
+from eth_account.messages import encode_defunct
+from eth_account.signers.local import LocalAccount
+
+from ..encoders import relay_request_digest
+
+
+# Requests signed per executor task in bulk signing
+SIGN_CHUNK_SIZE = 64
+
+
+def sign_relay_request(account: LocalAccount, relay_request: Dict[str, Any],
+                       relay_hub_address: str, relay_address: str) -> bytes:
+    """The 65-byte signature RelayHub.canRelay accepts for relay_request"""
+    digest = relay_request_digest(relay_request, relay_hub_address, relay_address)
+    return bytes(account.sign_message(encode_defunct(digest)).signature)
+
+
+def _sign_chunk(accounts: Sequence[LocalAccount], relay_requests: Sequence[Dict[str, Any]],
+                relay_hub_address: str, relay_address: str) -> List[bytes]:
+    return [
+        sign_relay_request(account, relay_request, relay_hub_address, relay_address)
+        for account, relay_request in zip(accounts, relay_requests)
+    ]
+
+
+async def sign_relay_requests(accounts: Sequence[LocalAccount], relay_requests: Sequence[Dict[str, Any]],
+                              relay_hub_address: str, relay_address: str,
+                              executor: Optional[Executor] = None) -> List[bytes]:
+    """Sign relay_requests[i] with accounts[i], in chunks on executor threads"""
+    loop = asyncio.get_running_loop()
+    chunks = [
+        loop.run_in_executor(
+            executor, _sign_chunk,
+            accounts[start:start + SIGN_CHUNK_SIZE], relay_requests[start:start + SIGN_CHUNK_SIZE],
+            relay_hub_address, relay_address
+        )
+        for start in range(0, len(relay_requests), SIGN_CHUNK_SIZE)
+    ]
+    return [signature for chunk in await asyncio.gather(*chunks) for signature in chunk]
@@ -11,6 +11,7 @@ load_dotenv()
 class Config:
     # RPC and blockchain settings
     rpc_url: str = os.getenv("RPC_URL", "https://polygon-rpc.com")
+    rpc_urls: str = os.getenv("RPC_URLS", "")  # "url|weight,url|weight", overrides RPC_URL
     chain_id: int = int(os.getenv("CHAIN_ID", "137"))  # Default to Polygon
     
     # Relayer settings
@@ -32,7 +33,122 @@ class Config:
     
     # Gas settings
     max_gas_price_gwei: int = int(os.getenv("MAX_GAS_PRICE_GWEI", "200"))
+    max_relay_gas_limit: int = int(os.getenv("MAX_RELAY_GAS_LIMIT", "10000000"))
+    # How far below the cached network gas price a signed gasPrice may be
+    gas_price_tolerance_percent: float = float(os.getenv("GAS_PRICE_TOLERANCE_PERCENT", "10"))
     gas_limit_multiplier: float = float(os.getenv("GAS_LIMIT_MULTIPLIER", "1.2"))
+    gas_estimate_margin: float = float(os.getenv("GAS_ESTIMATE_MARGIN", "1.05"))
+    gas_estimate_bucket_bytes: int = int(os.getenv("GAS_ESTIMATE_BUCKET_BYTES", "128"))
+    gas_estimate_cache_size: int = int(os.getenv("GAS_ESTIMATE_CACHE_SIZE", "1024"))
+    gas_estimate_ttl_seconds: float = float(os.getenv("GAS_ESTIMATE_TTL_SECONDS", "600"))
+    gas_model_window: int = int(os.getenv("GAS_MODEL_WINDOW", "256"))
+    gas_model_min_samples: int = int(os.getenv("GAS_MODEL_MIN_SAMPLES", "10"))
+    gas_model_max_keys: int = int(os.getenv("GAS_MODEL_MAX_KEYS", "1024"))
+    gas_model_percentile: float = float(os.getenv("GAS_MODEL_PERCENTILE", "0.99"))
+    gas_model_reject_percentile: float = float(os.getenv("GAS_MODEL_REJECT_PERCENTILE", "0.01"))
+    
+    # RPC endpoint selection, hedging, failover and circuit breakers
+    rpc_timeout_seconds: float = float(os.getenv("RPC_TIMEOUT_SECONDS", "10"))
+    rpc_max_concurrency: int = int(os.getenv("RPC_MAX_CONCURRENCY", "32"))
+    rpc_stats_window: int = int(os.getenv("RPC_STATS_WINDOW", "200"))
+    rpc_min_samples: int = int(os.getenv("RPC_MIN_SAMPLES", "20"))
+    rpc_hedge_default_ms: float = float(os.getenv("RPC_HEDGE_DEFAULT_MS", "250"))
+    rpc_hedge_min_ms: float = float(os.getenv("RPC_HEDGE_MIN_MS", "50"))
+    rpc_broadcast_fanout: int = int(os.getenv("RPC_BROADCAST_FANOUT", "3"))
+    rpc_retries: int = int(os.getenv("RPC_RETRIES", "3"))  # after every endpoint failed a call
+    rpc_retry_backoff_ms: float = float(os.getenv("RPC_RETRY_BACKOFF_MS", "100"))  # doubled on each retry
+    rpc_send_retries: int = int(os.getenv("RPC_SEND_RETRIES", "3"))  # resends of the same bytes after an unconfirmed send
+    # (the breaker settings fall back to the older RPC_EJECT_* names)
+    rpc_breaker_error_rate: float = float(os.getenv("RPC_BREAKER_ERROR_RATE", os.getenv("RPC_EJECT_ERROR_RATE", "0.5")))
+    rpc_breaker_latency_ms: float = float(os.getenv("RPC_BREAKER_LATENCY_MS", os.getenv("RPC_EJECT_LATENCY_MS", "5000")))
+    rpc_breaker_open_seconds: float = float(os.getenv("RPC_BREAKER_OPEN_SECONDS", os.getenv("RPC_EJECT_SECONDS", "30")))
+    rpc_breaker_half_open_probes: int = int(os.getenv("RPC_BREAKER_HALF_OPEN_PROBES", "1"))
+    rpc_breaker_consecutive_failures: int = int(os.getenv("RPC_BREAKER_CONSECUTIVE_FAILURES", "3"))  # unanswered in a row
+    
+    # RPC HTTP connections, pooled per endpoint and kept alive
+    rpc_pool_size: int = int(os.getenv("RPC_POOL_SIZE", "32"))
+    rpc_keepalive_seconds: float = float(os.getenv("RPC_KEEPALIVE_SECONDS", "60"))
+    rpc_connect_timeout_seconds: float = float(os.getenv("RPC_CONNECT_TIMEOUT_SECONDS", "3"))
+    rpc_pool_timeout_seconds: float = float(os.getenv("RPC_POOL_TIMEOUT_SECONDS", "5"))
+    rpc_http2: bool = os.getenv("RPC_HTTP2", "false").lower() == "true"  # needs h2 (pip install "httpx[http2]")
+    rpc_compress_min_bytes: int = int(os.getenv("RPC_COMPRESS_MIN_BYTES", "0"))  # 0: never gzip requests
+    
+    # Block-scoped RPC response cache
+    rpc_cache_max_entries: int = int(os.getenv("RPC_CACHE_MAX_ENTRIES", "10000"))
+    rpc_cache_max_age_seconds: float = float(os.getenv("RPC_CACHE_MAX_AGE_SECONDS", "5"))
+    
+    # Transaction fees: "auto" uses EIP-1559 when the chain has a base fee, "legacy" never does
+    fee_mode: str = os.getenv("FEE_MODE", "auto")
+    fee_history_blocks: int = int(os.getenv("FEE_HISTORY_BLOCKS", "10"))
+    fee_priority_percentile: float = float(os.getenv("FEE_PRIORITY_PERCENTILE", "50"))
+    fee_min_priority_gwei: float = float(os.getenv("FEE_MIN_PRIORITY_GWEI", "0"))
+    fee_base_fee_multiplier: float = float(os.getenv("FEE_BASE_FEE_MULTIPLIER", "2"))
+    
+    # Pricing: reject relays whose expected charge does not cover gas plus this margin
+    pricing_enforce: bool = os.getenv("PRICING_ENFORCE", "true").lower() == "true"
+    pricing_min_margin_percent: float = float(os.getenv("PRICING_MIN_MARGIN_PERCENT", "0"))
+    
+    # Highest RelayHub nonce seen per user
+    nonce_cache_size: int = int(os.getenv("NONCE_CACHE_SIZE", "10000"))
+    # How long a pipelined relay waits for the one before it to be sent
+    pipeline_wait_seconds: float = float(os.getenv("PIPELINE_WAIT_SECONDS", "30"))
+    
+    # Accepted relay requests, for rejecting replays in memory
+    replay_filter_capacity: int = int(os.getenv("REPLAY_FILTER_CAPACITY", "1000000"))
+    replay_filter_fp_rate: float = float(os.getenv("REPLAY_FILTER_FP_RATE", "0.000001"))
+    replay_lru_size: int = int(os.getenv("REPLAY_LRU_SIZE", "10000"))
+    
+    # Recipient deposit cache
+    deposit_cache_size: int = int(os.getenv("DEPOSIT_CACHE_SIZE", "1024"))
+    deposit_active_seconds: float = float(os.getenv("DEPOSIT_ACTIVE_SECONDS", "300"))
+    
+    # Encoded ProxyWalletFactory.proxy calldata for repeated call bundles
+    proxy_encoder_cache_size: int = int(os.getenv("PROXY_ENCODER_CACHE_SIZE", "256"))
+    
+    # JSON file of named proxy call bundles for /relay/proxy-wallet/preset/{name}
+    proxy_presets_path: str = os.getenv("PROXY_PRESETS_PATH", "")
+    
+    # Status cache settings
+    status_poll_interval_seconds: float = float(os.getenv("STATUS_POLL_INTERVAL_SECONDS", "2"))
+    status_max_age_seconds: float = float(os.getenv("STATUS_MAX_AGE_SECONDS", "30"))
+    
+    # Shared worker state (nonces and in-flight relays)
+    state_db_path: str = os.getenv("STATE_DB_PATH", "relayer_state.db")
+    state_db_timeout_seconds: float = float(os.getenv("STATE_DB_TIMEOUT_SECONDS", "5"))
+    inflight_max_age_seconds: float = float(os.getenv("INFLIGHT_MAX_AGE_SECONDS", "3600"))
+    
+    # Receipts of broadcast transactions, polled for all relays by one task
+    receipt_poll_interval_seconds: float = float(os.getenv("RECEIPT_POLL_INTERVAL_SECONDS", "0.5"))
+    receipt_workers: int = int(os.getenv("RECEIPT_WORKERS", "4"))
+    receipt_dropped_seconds: float = float(os.getenv("RECEIPT_DROPPED_SECONDS", "60"))
+    receipt_confirm_seconds: float = float(os.getenv("RECEIPT_CONFIRM_SECONDS", "10"))
+    
+    # Relay lifecycle events (SSE and WebSocket)
+    events_queue_size: int = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+    events_max_subscriptions: int = int(os.getenv("EVENTS_MAX_SUBSCRIPTIONS", "1000"))
+    events_max_relays: int = int(os.getenv("EVENTS_MAX_RELAYS", "100000"))
+    events_max_age_seconds: float = float(os.getenv("EVENTS_MAX_AGE_SECONDS", "3600"))
+    events_poll_interval_seconds: float = float(os.getenv("EVENTS_POLL_INTERVAL_SECONDS", "0.25"))
+    events_keepalive_seconds: float = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+    events_write_retries: int = int(os.getenv("EVENTS_WRITE_RETRIES", "3"))
+    events_write_backoff_ms: float = float(os.getenv("EVENTS_WRITE_BACKOFF_MS", "100"))  # doubled on each retry
+    
+    # Logging (JSON lines on stdout, written from a background thread)
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_queue_size: int = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+    log_success_sample_rate: float = float(os.getenv("LOG_SUCCESS_SAMPLE_RATE", "1.0"))
+    
+    # Transaction signing: "thread" or "process" pool, or "inline" on the event loop
+    signer_mode: str = os.getenv("SIGNER_MODE", "thread")
+    signer_workers: int = int(os.getenv("SIGNER_WORKERS", "2"))
+    
+    # Server process settings
+    workers: int = int(os.getenv("WORKERS", "1"))
+    
+    # Admin endpoints (/stats, /debug/profile); disabled while ADMIN_TOKEN is empty
+    admin_token: str = os.getenv("ADMIN_TOKEN", "")
+    profile_max_seconds: float = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+    loop_lag_threshold_ms: float = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100"))
     
     # Owner configuration (for staking)
     owner_private_key: str = os.getenv("OWNER_PRIVATE_KEY", relayer_private_key)
@@ -0,0 +1,137 @@
+"""Cached RelayHub deposits of relay recipients"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .config import config
+from .gas import required_gas
+from .log import get_logger
+from .pricing import calculate_charge
+from .store import RelayStore
+
+
+logger = get_logger("deposits")
+
+
+def max_possible_charge(gas_limit: int, gas_price: int, transaction_fee: int) -> int:
+    """RelayHub.maxPossibleCharge: the most a relay can cost its recipient"""
+    return calculate_charge(required_gas(gas_limit), gas_price, transaction_fee)
+
+
+# Settled reservations are kept this many blocks past the block they were
+# mined in, so every worker has re-read the balance by the time they go
+SETTLED_KEEP_BLOCKS = 64
+
+
+class DepositCache:
+    """RelayHub balanceOf(recipient), minus what our in-flight relays may charge.
+
+    Balances of recipients seen within config.deposit_active_seconds are
+    re-read once per block. Each relay reserves its maximum possible charge
+    before it is sent; the reservation is kept until a balance read at or
+    after the block the relay was mined in, so the charge is never counted
+    twice or not at all. Balances are cached per worker process, but the
+    reservations live in the shared RelayStore, so workers together never
+    reserve more than a recipient's deposit.
+
+    Methods that touch reservations block on the store; coroutines call
+    them through store.run().
+    """
+
+    def __init__(self, store: RelayStore, max_entries: Optional[int] = None,
+                 active_seconds: Optional[float] = None):
+        self.store = store
+        self.max_entries = max_entries or config.deposit_cache_size
+        self.active_seconds = active_seconds or config.deposit_active_seconds
+        # recipient -> (balance, block read at, last used)
+        self._balances: "OrderedDict[str, Tuple[int, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.rejections = 0
+
+    def _balance(self, recipient: str) -> Optional[Tuple[int, int, float]]:
+        with self._lock:
+            return self._balances.get(recipient)
+
+    def known(self, recipient: str) -> bool:
+        """Whether the recipient's balance is cached"""
+        return self._balance(recipient.lower()) is not None
+
+    def available(self, recipient: str) -> Optional[int]:
+        """Deposit not yet claimed by in-flight relays of any worker, or None if unknown"""
+        recipient = recipient.lower()
+        entry = self._balance(recipient)
+        if entry is None:
+            return None
+        return entry[0] - self.store.reserved_deposit(recipient, entry[1])
+
+    def load(self, recipient: str, balance: int, block_number: int):
+        """Store a balance read outside the per-block refresh"""
+        recipient = recipient.lower()
+        with self._lock:
+            entry = self._balances.get(recipient)
+            if entry is not None and entry[1] > block_number:
+                return
+            self._balances[recipient] = (balance, block_number, time.monotonic())
+            self._balances.move_to_end(recipient)
+            while len(self._balances) > self.max_entries:
+                self._balances.popitem(last=False)
+
+    def reserve(self, recipient: str, relay_id: str, amount: int) -> bool:
+        """Claim amount of the recipient's deposit; False if it cannot cover it"""
+        recipient = recipient.lower()
+        entry = self._balance(recipient)
+        if entry is None:
+            return False
+        if not self.store.reserve_deposit(relay_id, recipient, amount, entry[0], entry[1]):
+            with self._lock:
+                self.rejections += 1
+            return False
+        with self._lock:
+            entry = self._balances.get(recipient)
+            if entry is not None:
+                self._balances[recipient] = (entry[0], entry[1], time.monotonic())
+                self._balances.move_to_end(recipient)
+        return True
+
+    def release(self, relay_id: str):
+        """Drop a reservation for a relay that was never sent or never mined"""
+        self.store.release_deposit(relay_id)
+
+    def settle(self, relay_id: str, block_number: int):
+        """Keep the reservation until a balance read at block_number reflects it"""
+        self.store.settle_deposit(relay_id, block_number)
+
+    def refresh(self, block_number: int, fetch: Callable[[str], int]):
+        """Re-read the balances of active recipients (blocking; run in a thread)"""
+        cutoff = time.monotonic() - self.active_seconds
+        with self._lock:
+            for recipient, entry in list(self._balances.items()):
+                if entry[2] < cutoff:
+                    del self._balances[recipient]
+            recipients = list(self._balances)
+
+        for recipient in recipients:
+            try:
+                balance = fetch(recipient)
+            except Exception as e:
+                logger.warning("deposit refresh failed", extra={"recipient": recipient, "error": str(e)})
+                continue
+            with self._lock:
+                entry = self._balances.get(recipient)
+                if entry is not None:
+                    self._balances[recipient] = (balance, block_number, entry[2])
+
+        # Relays that never got a receipt are given up on with the in-flight records
+        self.store.expire_deposits(block_number - SETTLED_KEEP_BLOCKS)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recipients = len(self._balances)
+        return {
+            "recipients": recipients,
+            "reservations": self.store.deposit_reservations(),
+            "rejections": self.rejections,
+        }
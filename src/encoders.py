@@ -1,46 +1,213 @@
 """Helper functions for encoding contract calls"""
 
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
 from web3 import Web3
-from eth_abi import encode
 from hexbytes import HexBytes
 
 
+WORD = 32
+UINT256_MAX = 2 ** 256 - 1
+
+# Function selectors, computed once
+PROXY_SELECTOR = bytes(Web3.keccak(text="proxy((uint8,address,uint256,bytes)[])")[:4])
+ERC20_APPROVE_SELECTOR = bytes(Web3.keccak(text="approve(address,uint256)")[:4])
+ERC1155_SET_APPROVAL_FOR_ALL_SELECTOR = bytes(Web3.keccak(text="setApprovalForAll(address,bool)")[:4])
+
+CALL = 2
+# Left padding of an address to a word
+_ADDRESS_PAD = bytes(12)
+_FALSE_WORD = bytes(WORD)
+_TRUE_WORD = (1).to_bytes(WORD, 'big')
+
+
+def _address_bytes(address: str) -> bytes:
+    """The 20 bytes of a hex address (any case, with or without 0x)"""
+    try:
+        data = bytes.fromhex(address[2:] if address[:2] in ("0x", "0X") else address)
+    except (TypeError, ValueError):
+        data = b""
+    if len(data) != 20:
+        raise ValueError(f"not a valid address: {address!r}")
+    return data
+
+
+def _uint256_word(value: int) -> bytes:
+    if not 0 <= value <= UINT256_MAX:
+        raise ValueError(f"value must be a uint256, got {value}")
+    return value.to_bytes(WORD, 'big')
+
+
+def encode_erc20_approve_batch(approvals: Iterable[Tuple[str, int]]) -> List[bytes]:
+    """approve(spender, amount) calldata for each (spender, amount)"""
+    selector = ERC20_APPROVE_SELECTOR + _ADDRESS_PAD
+    return [selector + _address_bytes(spender) + _uint256_word(amount) for spender, amount in approvals]
+
+
+def encode_erc1155_set_approval_for_all_batch(approvals: Iterable[Tuple[str, bool]]) -> List[bytes]:
+    """setApprovalForAll(operator, approved) calldata for each (operator, approved)"""
+    selector = ERC1155_SET_APPROVAL_FOR_ALL_SELECTOR + _ADDRESS_PAD
+    return [
+        selector + _address_bytes(operator) + (_TRUE_WORD if approved else _FALSE_WORD)
+        for operator, approved in approvals
+    ]
+
+
+def erc20_approve_calls(approvals: Iterable[Tuple[str, str, int]]) -> List[Dict[str, Any]]:
+    """Proxy calls approving spender for amount of token, for each (token, spender, amount)"""
+    approvals = list(approvals)
+    data = encode_erc20_approve_batch((spender, amount) for _, spender, amount in approvals)
+    return [
+        {'typeCode': CALL, 'to': token, 'value': 0, 'data': calldata}
+        for (token, _, _), calldata in zip(approvals, data)
+    ]
+
+
+def erc1155_set_approval_for_all_calls(approvals: Iterable[Tuple[str, str, bool]]) -> List[Dict[str, Any]]:
+    """Proxy calls setting operator's approval on token, for each (token, operator, approved)"""
+    approvals = list(approvals)
+    data = encode_erc1155_set_approval_for_all_batch((operator, approved) for _, operator, approved in approvals)
+    return [
+        {'typeCode': CALL, 'to': token, 'value': 0, 'data': calldata}
+        for (token, _, _), calldata in zip(approvals, data)
+    ]
+
+
 def encode_erc20_approve(spender: str, amount: int) -> str:
     """Encode an ERC20 approve call"""
-    # Function selector for approve(address,uint256)
-    selector = Web3.keccak(text="approve(address,uint256)")[:4]
-    
-    # Encode parameters
-    params = encode(['address', 'uint256'], [Web3.to_checksum_address(spender), amount])
-    
-    return HexBytes(selector + params).hex()
+    return encode_erc20_approve_batch([(spender, amount)])[0].hex()
 
 
 def encode_erc1155_set_approval_for_all(operator: str, approved: bool) -> str:
     """Encode an ERC1155 setApprovalForAll call"""
-    # Function selector for setApprovalForAll(address,bool)
-    selector = Web3.keccak(text="setApprovalForAll(address,bool)")[:4]
-    
-    # Encode parameters
-    params = encode(['address', 'bool'], [Web3.to_checksum_address(operator), approved])
-    
-    return HexBytes(selector + params).hex()
+    return encode_erc1155_set_approval_for_all_batch([(operator, approved)])[0].hex()
+
+
+def relay_request_digest(relay_request: Dict[str, Any], relay_hub_address: str, relay_address: str) -> bytes:
+    """The hash a GSN v1 user signs (with the EIP-191 prefix) to authorize a relay.
+
+    keccak256(abi.encodePacked("rlx:", from, to, encodedFunction,
+    transactionFee, gasPrice, gasLimit, nonce, relayHub, relay)), as
+    RelayHub.canRelay computes it.
+    """
+    return bytes(Web3.keccak(b"".join((
+        b"rlx:",
+        _address_bytes(relay_request['from']),
+        _address_bytes(relay_request['to']),
+        _to_bytes(relay_request['encodedFunction']),
+        _uint256_word(relay_request['transactionFee']),
+        _uint256_word(relay_request['gasPrice']),
+        _uint256_word(relay_request['gasLimit']),
+        _uint256_word(relay_request['nonce']),
+        _address_bytes(relay_hub_address),
+        _address_bytes(relay_address),
+    ))))
+
+
+# (typeCode, to, value, data) with to as 20 raw bytes
+ProxyCallKey = Tuple[int, bytes, int, bytes]
+
+# typeCode, to, value and the offset of data, then the length of data
+PROXY_CALL_HEAD = 5 * WORD
+
+
+def _to_bytes(data: Any) -> bytes:
+    if isinstance(data, (bytes, bytearray)):
+        return bytes(data)
+    return bytes(HexBytes(data))
+
+
+def _proxy_call_key(call: Dict[str, Any]) -> ProxyCallKey:
+    """Normalize one call dict, checking what the ABI encoder would check"""
+    type_code = int(call['typeCode'])
+    if not 0 <= type_code <= 0xff:
+        raise ValueError(f"typeCode must be a uint8, got {type_code}")
+    try:
+        address = _address_bytes(call['to'])
+    except ValueError as e:
+        raise ValueError(f"to is {e}")
+    value = int(call.get('value', 0))
+    if not 0 <= value <= UINT256_MAX:
+        raise ValueError(f"value must be a uint256, got {value}")
+    return type_code, address, value, _to_bytes(call['data'])
+
+
+def _encode_proxy_calls(calls: Sequence[ProxyCallKey], selector: bytes = PROXY_SELECTOR) -> bytes:
+    """ABI-encode proxy((uint8,address,uint256,bytes)[]) into one preallocated buffer"""
+    tails = [PROXY_CALL_HEAD + -(-len(data) // WORD) * WORD for _, _, _, data in calls]
+    count = len(calls)
+    start = len(selector)
+    buffer = bytearray(start + 2 * WORD + count * WORD + sum(tails))
+
+    buffer[:start] = selector
+    # Offset of the array, then its length
+    buffer[start + WORD - 1] = WORD
+    buffer[start + WORD:start + 2 * WORD] = count.to_bytes(WORD, 'big')
+
+    offsets = start + 2 * WORD
+    position = count * WORD  # relative to the offsets
+    for i, ((type_code, address, value, data), size) in enumerate(zip(calls, tails)):
+        buffer[offsets + i * WORD:offsets + (i + 1) * WORD] = position.to_bytes(WORD, 'big')
+        head = offsets + position
+        buffer[head + WORD - 1] = type_code
+        buffer[head + 2 * WORD - 20:head + 2 * WORD] = address
+        buffer[head + 2 * WORD:head + 3 * WORD] = value.to_bytes(WORD, 'big')
+        buffer[head + 4 * WORD - 1] = 4 * WORD
+        buffer[head + 4 * WORD:head + 5 * WORD] = len(data).to_bytes(WORD, 'big')
+        buffer[head + PROXY_CALL_HEAD:head + PROXY_CALL_HEAD + len(data)] = data
+        position += size
+    return bytes(buffer)
+
+
+class ProxyCallEncoder:
+    """ProxyWalletFactory.proxy calldata with an LRU cache of whole bundles.
+
+    The same bundles (e.g. the Polymarket approvals every new user sends)
+    come in over and over; a cache hit costs one dict lookup.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        if max_entries is None:
+            # Imported here: the client SDK uses this module without the server's settings
+            from .config import config
+            max_entries = config.proxy_encoder_cache_size
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[ProxyCallKey, ...], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, calls: List[Dict[str, Any]]) -> bytes:
+        """Selector and arguments for proxy(calls)"""
+        key = tuple(_proxy_call_key(call) for call in calls)
+        with self._lock:
+            calldata = self._cache.get(key)
+            if calldata is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return calldata
+            self.misses += 1
+
+        calldata = _encode_proxy_calls(key)
+        if self.max_entries > 0:
+            with self._lock:
+                self._cache[key] = calldata
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return calldata
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
 
 
 def encode_proxy_calls(calls: list) -> bytes:
-    """Encode proxy calls for ProxyWalletFactory"""
-    # Encode the array of ProxyCall structs
-    encoded_calls = []
-    for call in calls:
-        encoded_calls.append((
-            call['typeCode'],
-            Web3.to_checksum_address(call['to']),
-            int(call.get('value', 0)),
-            HexBytes(call['data'])
-        ))
-    
-    # The proxy function takes an array of structs
-    return encode(
-        ['(uint8,address,uint256,bytes)[]'],
-        [encoded_calls]
-    ) 
\ No newline at end of file
+    """Encode proxy calls for ProxyWalletFactory (arguments only, no selector)"""
+    return _encode_proxy_calls([_proxy_call_key(call) for call in calls], selector=b"")
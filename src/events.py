@@ -0,0 +1,229 @@
+"""Relay lifecycle events, fanned out to SSE and WebSocket subscribers"""
+
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Set
+
+import orjson
+
+from .config import config
+from .log import get_logger
+from .store import RelayStore
+
+
+logger = get_logger("events")
+
+# accepted -> broadcast -> mined | (replaced ->) failed
+ACCEPTED = "accepted"
+BROADCAST = "broadcast"
+REPLACED = "replaced"
+MINED = "mined"
+FAILED = "failed"
+TERMINAL_EVENTS = {MINED, FAILED}
+
+
+class RelayEvent(NamedTuple):
+    id: Optional[int]  # None if it could not be stored
+    relay_id: str
+    event: str
+    data: str  # JSON, encoded once for every subscriber
+
+    @property
+    def terminal(self) -> bool:
+        return self.event in TERMINAL_EVENTS
+
+
+def encode_event(fields: Dict[str, Any]) -> str:
+    try:
+        return orjson.dumps(fields).decode()
+    except TypeError:
+        # orjson stops at 64-bit integers; wei amounts can be larger
+        return json.dumps(fields, separators=(",", ":"), default=str)
+
+
+class Subscription:
+    """One client connection's queue of events for the relays it follows"""
+
+    def __init__(self, max_queue: int):
+        self.queue: "asyncio.Queue[Optional[RelayEvent]]" = asyncio.Queue()
+        self.max_queue = max_queue
+        self.relay_ids: Set[str] = set()
+        self.last_ids: Dict[str, int] = {}
+        # Live events that arrive while a relay's history is being loaded
+        self.pending: Dict[str, List[RelayEvent]] = {}
+        self.closed = False
+
+    def deliver(self, event: RelayEvent) -> bool:
+        """Queue event unless already seen; False if the client is too slow"""
+        if event.id is not None and event.id <= self.last_ids.get(event.relay_id, 0):
+            return True
+        if self.queue.qsize() >= self.max_queue:
+            return False
+        if event.id is not None:
+            self.last_ids[event.relay_id] = event.id
+        self.queue.put_nowait(event)
+        return True
+
+
+class RelayEventBus:
+    """Publishes relay lifecycle events to subscribers in every worker.
+
+    Events are appended to the shared state database, which gives them
+    ids that increase across workers, then delivered to local subscribers.
+    publish() only queues an event: one writer task stores everything
+    queued since its last write in a single transaction on the store's
+    thread, so the loop never waits on SQLite and a relay's events keep
+    their order. Each worker polls the table for events published by the
+    others. Subscribing replays a relay's stored events first, so a client
+    that learns its relay ID from the /relay response misses nothing.
+    A write that keeps failing is retried EVENTS_WRITE_RETRIES times; after
+    that its events are still delivered to local subscribers, without an
+    id, so none of them waits forever for a mined or failed event.
+    A subscriber whose queue fills up is disconnected rather than letting
+    memory grow.
+    """
+
+    def __init__(self, store: RelayStore):
+        self.store = store
+        self.pid = os.getpid()
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._last_id = 0
+        self._queue: List[tuple] = []
+        self._writer: Optional[asyncio.Task] = None
+        self.connections = 0
+        self.disconnected_slow = 0
+        self.writes = 0
+        self.written = 0
+        self.unstored = 0
+
+    def publish(self, relay_id: str, event: str, **fields):
+        """Queue an event to be recorded and fanned out; ignored once the relay has finished"""
+        if relay_id in self._finished:
+            return
+        if event in TERMINAL_EVENTS:
+            self._finished[relay_id] = None
+            while len(self._finished) > config.events_max_relays:
+                self._finished.popitem(last=False)
+
+        data = encode_event({"relay_id": relay_id, "event": event, "ts": round(time.time(), 3), **fields})
+        self._queue.append((relay_id, event, data))
+        loop = asyncio.get_running_loop()
+        if self._writer is None or self._writer.done() or self._writer.get_loop() is not loop:
+            self._writer = loop.create_task(self._write())
+
+    async def _write(self):
+        """Store the queued events in batches, then deliver them"""
+        while self._queue:
+            batch, self._queue = self._queue, []
+            event_ids = await self._store_batch(batch)
+            if event_ids is None:
+                # Other workers will not see these, but local subscribers must
+                self.unstored += len(batch)
+                event_ids = [None] * len(batch)
+            else:
+                self.writes += 1
+                self.written += len(batch)
+            for event_id, (relay_id, event, data) in zip(event_ids, batch):
+                self._dispatch(RelayEvent(event_id, relay_id, event, data))
+    
+    async def _store_batch(self, batch: List[tuple]) -> Optional[List[int]]:
+        """Ids of the stored events, or None once every retry has failed (e.g. SQLite busy)"""
+        for attempt in range(config.events_write_retries + 1):
+            try:
+                return await self.store.run(self.store.add_events, batch)
+            except Exception as e:
+                error = e
+            if attempt < config.events_write_retries:
+                await asyncio.sleep(config.events_write_backoff_ms / 1000 * 2 ** attempt)
+        logger.warning("failed to store relay events", extra={"events": len(batch), "error": str(error)})
+        return None
+
+    async def flush(self):
+        """Wait until every published event is stored and delivered"""
+        while self._writer is not None and not self._writer.done():
+            await self._writer
+
+    def _dispatch(self, event: RelayEvent):
+        for subscription in list(self._subscribers.get(event.relay_id, ())):
+            pending = subscription.pending.get(event.relay_id)
+            if pending is not None:
+                pending.append(event)
+            elif not subscription.deliver(event):
+                self._drop_slow(subscription)
+
+    def _drop_slow(self, subscription: Subscription):
+        self.disconnected_slow += 1
+        self.close(subscription)
+
+    def open(self) -> Subscription:
+        self.connections += 1
+        return Subscription(config.events_queue_size)
+
+    def close(self, subscription: Subscription):
+        """Forget a subscription and wake its reader with None"""
+        if subscription.closed:
+            return
+        subscription.closed = True
+        self.connections -= 1
+        for relay_id in list(subscription.relay_ids):
+            self.unsubscribe(subscription, relay_id)
+        subscription.queue.put_nowait(None)
+
+    async def subscribe(self, subscription: Subscription, relay_id: str):
+        """Follow relay_id, replaying the events it already has"""
+        if subscription.closed or relay_id in subscription.relay_ids:
+            return
+        if len(subscription.relay_ids) >= config.events_max_subscriptions:
+            raise ValueError(f"At most {config.events_max_subscriptions} relays per connection")
+        subscription.relay_ids.add(relay_id)
+        subscription.pending[relay_id] = []
+        self._subscribers.setdefault(relay_id, set()).add(subscription)
+
+        rows = await self.store.run(self.store.relay_events, relay_id)
+        buffered = subscription.pending.pop(relay_id, None)
+        if buffered is None:
+            return  # unsubscribed meanwhile
+        history = [RelayEvent(*row[:4]) for row in rows]
+        for event in history + buffered:
+            if not subscription.deliver(event):
+                self._drop_slow(subscription)
+                return
+
+    def unsubscribe(self, subscription: Subscription, relay_id: str):
+        subscription.relay_ids.discard(relay_id)
+        subscription.pending.pop(relay_id, None)
+        subscribers = self._subscribers.get(relay_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[relay_id]
+
+    async def run(self):
+        """Deliver events published by other workers (runs until cancelled)"""
+        self._last_id = await self.store.run(self.store.last_event_id)
+        while True:
+            await asyncio.sleep(config.events_poll_interval_seconds)
+            try:
+                rows = await self.store.run(self.store.events_since, self._last_id)
+            except Exception as e:
+                logger.warning("relay event poll failed", extra={"error": str(e)})
+                continue
+            for row in rows:
+                self._last_id = row[0]
+                if row[4] != self.pid and row[1] in self._subscribers:
+                    self._dispatch(RelayEvent(*row[:4]))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": self.connections,
+            "relays_followed": len(self._subscribers),
+            "disconnected_slow": self.disconnected_slow,
+            "queued": len(self._queue),
+            "writes": self.writes,
+            "written": self.written,
+            "unstored": self.unstored,
+        }
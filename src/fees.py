@@ -0,0 +1,127 @@
+"""EIP-1559 fee selection from a per-block fee history"""
+
+import threading
+from statistics import median
+from typing import Any, Dict, Optional, Tuple
+
+from web3 import Web3
+
+from .config import config
+from .log import get_logger
+
+
+logger = get_logger("fees")
+
+
+class FeeStrategy:
+    """Type-2 transaction fees, refreshed once per block with eth_feeHistory.
+
+    The priority fee is a percentile of recent block rewards and the max fee
+    leaves room for the base fee to rise. On chains without a base fee (or
+    with FEE_MODE=legacy) callers get None and send legacy transactions.
+    """
+
+    def __init__(self):
+        self.mode = config.fee_mode.lower()
+        self.base_fee: Optional[int] = None
+        self.priority_fee: Optional[int] = None
+        self.block_number: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def eip1559(self) -> bool:
+        return self.mode != "legacy" and self.base_fee is not None
+
+    def update(self, w3: Web3, block_number: int):
+        """Read the fee history up to block_number (blocking; run in a thread)"""
+        if self.mode == "legacy":
+            return
+        try:
+            history = w3.eth.fee_history(
+                config.fee_history_blocks, block_number, [config.fee_priority_percentile]
+            )
+        except Exception as e:
+            logger.warning("fee history unavailable", extra={"error": str(e)})
+            return
+
+        # The last entry is the base fee of the next block
+        base_fees = history.get('baseFeePerGas') or []
+        base_fee = base_fees[-1] if base_fees else 0
+        rewards = [reward[0] for reward in history.get('reward') or [] if reward]
+        priority_fee = max(
+            int(median(rewards)) if rewards else 0,
+            Web3.to_wei(config.fee_min_priority_gwei, 'gwei')
+        )
+
+        with self._lock:
+            if not base_fee and self.mode == "auto":
+                # No base fee: the chain does not support EIP-1559
+                self.base_fee = None
+            else:
+                self.base_fee = base_fee
+            self.priority_fee = priority_fee
+            self.block_number = block_number
+
+    def _market_fees(self) -> Optional[Tuple[int, int, int]]:
+        """(next base fee, priority fee, max fee), or None for legacy"""
+        with self._lock:
+            if not self.eip1559:
+                return None
+            base_fee, priority_fee = self.base_fee, self.priority_fee
+        return base_fee, priority_fee, int(base_fee * config.fee_base_fee_multiplier) + priority_fee
+
+    def transaction_fees(self) -> Optional[Dict[str, int]]:
+        """maxFeePerGas/maxPriorityFeePerGas for a new transaction, or None for legacy"""
+        market = self._market_fees()
+        if market is None:
+            return None
+        _, priority_fee, max_fee = market
+        return {'maxFeePerGas': max_fee, 'maxPriorityFeePerGas': priority_fee}
+
+    def relay_fees(self, gas_price: int) -> Optional[Dict[str, int]]:
+        """Fees for relayCall, whose effective gas price must cover the signed gasPrice.
+
+        RelayHub requires tx.gasprice >= gasPrice, and the effective price
+        is min(maxFee, baseFee + priorityFee). When gasPrice covers the
+        market price, maxFee = priorityFee = gasPrice pays exactly gasPrice
+        whatever the base fee does. Otherwise the market fees are used so
+        the transaction is not stuck, with maxFee and priorityFee both at
+        least gasPrice, so it still covers gasPrice however far the base
+        fee falls before inclusion.
+        """
+        market = self._market_fees()
+        if market is None:
+            return None
+        return self._relay_fees(market, gas_price)
+
+    @staticmethod
+    def _relay_fees(market: Tuple[int, int, int], gas_price: int) -> Dict[str, int]:
+        base_fee, priority_fee, max_fee = market
+        if gas_price >= base_fee + priority_fee:
+            return {'maxFeePerGas': gas_price, 'maxPriorityFeePerGas': gas_price}
+
+        max_fee = max(max_fee, gas_price)
+        priority_fee = min(max(priority_fee, gas_price), max_fee)
+        return {'maxFeePerGas': max_fee, 'maxPriorityFeePerGas': priority_fee}
+
+    def relay_gas_price(self, gas_price: int) -> Optional[int]:
+        """Per-gas price of relayCall sent with relay_fees(gas_price), or None for legacy.
+
+        This is the effective price at the next base fee,
+        min(maxFee, baseFee + priorityFee), which exceeds gasPrice when the
+        market fees are used.
+        """
+        market = self._market_fees()
+        if market is None:
+            return None
+        fees = self._relay_fees(market, gas_price)
+        return min(fees['maxFeePerGas'], market[0] + fees['maxPriorityFeePerGas'])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "eip1559": self.eip1559,
+            "block_number": self.block_number,
+            "base_fee": self.base_fee,
+            "priority_fee": self.priority_fee,
+        }
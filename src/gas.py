@@ -0,0 +1,262 @@
+"""Gas limit estimation for relayCall transactions"""
+
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from hexbytes import HexBytes
+
+from .config import config
+from .encoders import PROXY_SELECTOR
+from .log import get_logger
+
+
+logger = get_logger("gas")
+
+
+# Constants from RelayHub contract (GSN v1)
+GAS_OVERHEAD = 48204
+GAS_RESERVE = 100000
+ACCEPT_RELAYED_CALL_MAX_GAS = 50000
+PRE_RELAYED_CALL_MAX_GAS = 100000
+POST_RELAYED_CALL_MAX_GAS = 100000
+
+# Intrinsic transaction costs (EIP-2028)
+TX_BASE_GAS = 21000
+TX_ZERO_BYTE_GAS = 4
+TX_NONZERO_BYTE_GAS = 16
+
+# RelayHub work done before it measures gasleft() (dispatch, calldata copy)
+HUB_ENTRY_GAS = 10000
+
+
+def required_gas(gas_limit: int) -> int:
+    """RelayHub.requiredGas: worst-case gas for a relayed call with this stipend"""
+    return (
+        GAS_OVERHEAD +
+        GAS_RESERVE +
+        ACCEPT_RELAYED_CALL_MAX_GAS +
+        PRE_RELAYED_CALL_MAX_GAS +
+        POST_RELAYED_CALL_MAX_GAS +
+        gas_limit
+    )
+
+
+def fallback_gas_limit(gas_limit: int) -> int:
+    """Static relayCall gas limit: requiredGas plus a 10% safety buffer"""
+    return int(required_gas(gas_limit) * 1.1)
+
+
+def calldata_gas(calldata: bytes) -> int:
+    """Intrinsic gas for the transaction's calldata bytes"""
+    zeros = calldata.count(0)
+    return zeros * TX_ZERO_BYTE_GAS + (len(calldata) - zeros) * TX_NONZERO_BYTE_GAS
+
+
+def intrinsic_gas(calldata: bytes) -> int:
+    """Gas charged for a transaction before any code runs"""
+    return TX_BASE_GAS + calldata_gas(calldata)
+
+
+def hub_minimum_gas(gas_limit: int, relay_calldata: bytes) -> int:
+    """Smallest relayCall gas limit that passes RelayHub's gasleft() check"""
+    return required_gas(gas_limit) - GAS_OVERHEAD + intrinsic_gas(relay_calldata) + HUB_ENTRY_GAS
+
+
+def proxy_call_count(calldata: bytes) -> int:
+    """Number of calls in a ProxyWalletFactory proxy(...) bundle, else 0"""
+    if calldata[:4] != PROXY_SELECTOR or len(calldata) < 68:
+        return 0
+    offset = int.from_bytes(calldata[4:36], 'big')
+    return int.from_bytes(calldata[4 + offset:36 + offset], 'big')
+
+
+class GasEstimator:
+    """Sizes relayCall gas limits from an eth_estimateGas simulation.
+
+    RelayHub rejects relayCall unless gasleft() covers requiredGas(gasLimit)
+    minus GAS_OVERHEAD, so an estimate grows one-for-one with the user's
+    gasLimit. What is cached per (recipient, selector, calldata-length
+    bucket) is therefore the estimate minus gasLimit, which stays valid for
+    requests of the same shape with different gas limits.
+    """
+
+    def __init__(self, margin: Optional[float] = None, max_entries: Optional[int] = None, ttl: Optional[float] = None):
+        self.margin = margin or config.gas_estimate_margin
+        self.max_entries = max_entries or config.gas_estimate_cache_size
+        self.ttl = ttl or config.gas_estimate_ttl_seconds
+        self._overheads: "OrderedDict[Tuple[str, bytes, int], Tuple[int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.simulations = 0
+        self.cache_hits = 0
+        self.fallbacks = 0
+
+    @staticmethod
+    def cache_key(relay_request: Dict[str, Any]) -> Tuple[str, bytes, int]:
+        calldata = HexBytes(relay_request['encodedFunction'])
+        bucket = len(calldata) // config.gas_estimate_bucket_bytes
+        return relay_request['to'].lower(), bytes(calldata[:4]), bucket
+
+    def cached_overhead(self, key: Tuple[str, bytes, int]) -> Optional[int]:
+        with self._lock:
+            entry = self._overheads.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                return None
+            self._overheads.move_to_end(key)
+            return entry[0]
+
+    def store_overhead(self, key: Tuple[str, bytes, int], overhead: int):
+        with self._lock:
+            self._overheads[key] = (overhead, time.monotonic())
+            self._overheads.move_to_end(key)
+            while len(self._overheads) > self.max_entries:
+                self._overheads.popitem(last=False)
+
+    def estimate(self, relay_fn, relay_request: Dict[str, Any], relayer_address: str) -> int:
+        """Gas limit for a relayCall transaction (blocking; run in a thread).
+
+        Simulates relayFn from the relayer's address at the user's gas price
+        (RelayHub requires tx.gasprice >= gasPrice). Falls back to the static
+        RelayHub formula if the simulation fails.
+        """
+        gas_limit = relay_request['gasLimit']
+        key = self.cache_key(relay_request)
+
+        overhead = self.cached_overhead(key)
+        if overhead is not None:
+            self.cache_hits += 1
+            return int((gas_limit + overhead) * self.margin)
+
+        try:
+            estimated = relay_fn.estimate_gas({
+                'from': relayer_address,
+                'gasPrice': relay_request['gasPrice'],
+            })
+        except Exception as e:
+            logger.warning("relayCall gas simulation failed, using static limit", extra={"error": str(e)})
+            self.fallbacks += 1
+            return fallback_gas_limit(gas_limit)
+
+        self.simulations += 1
+        self.store_overhead(key, estimated - gas_limit)
+        return int(estimated * self.margin)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._overheads),
+            "simulations": self.simulations,
+            "cache_hits": self.cache_hits,
+            "fallbacks": self.fallbacks,
+        }
+
+
+class RollingSamples:
+    """Fixed-size ring buffer of gas amounts (4 bytes per sample)"""
+    __slots__ = ("values", "size", "pos")
+
+    def __init__(self, size: int):
+        self.values = array('I')
+        self.size = size
+        self.pos = 0
+
+    def add(self, value: int):
+        value = min(value, 0xFFFFFFFF)
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            self.values[self.pos] = value
+        self.pos = (self.pos + 1) % self.size
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def percentile(self, q: float) -> int:
+        ordered = sorted(self.values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class GasUsageModel:
+    """Learned relayCall gas usage per (recipient, selector, proxy-call count).
+
+    Records gasUsed from relay receipts. Once a call shape has enough
+    history its gas limit comes from a high percentile of that history
+    (never below what RelayHub's gasleft() check demands), so no simulation
+    is needed. Requests whose gasLimit is below what the inner call has
+    always needed are rejected before any RPC call.
+    """
+
+    def __init__(self):
+        self.window = config.gas_model_window
+        self.min_samples = config.gas_model_min_samples
+        self.max_keys = config.gas_model_max_keys
+        self._used: "OrderedDict[Tuple[str, bytes, int], RollingSamples]" = OrderedDict()
+        self._inner: "OrderedDict[Tuple[str, bytes, int], RollingSamples]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(relay_request: Dict[str, Any]) -> Tuple[str, bytes, int]:
+        calldata = bytes(HexBytes(relay_request['encodedFunction']))
+        return relay_request['to'].lower(), calldata[:4], proxy_call_count(calldata)
+
+    def _samples(self, table: OrderedDict, key) -> RollingSamples:
+        samples = table.get(key)
+        if samples is None:
+            samples = table[key] = RollingSamples(self.window)
+            while len(table) > self.max_keys:
+                table.popitem(last=False)
+        table.move_to_end(key)
+        return samples
+
+    def record(self, key, gas_used: int, relay_calldata: bytes, inner_succeeded: bool):
+        """Add a mined relay's gasUsed to the history for its call shape"""
+        with self._lock:
+            self._samples(self._used, key).add(gas_used)
+            if inner_succeeded:
+                # accept/pre/post use at most their caps, so what remains is
+                # a conservative (low) estimate of the recipient call itself
+                inner = gas_used - intrinsic_gas(relay_calldata) - GAS_OVERHEAD - (
+                    ACCEPT_RELAYED_CALL_MAX_GAS + PRE_RELAYED_CALL_MAX_GAS + POST_RELAYED_CALL_MAX_GAS
+                )
+                if inner > 0:
+                    self._samples(self._inner, key).add(inner)
+
+    def forget(self, key):
+        """Drop the history for a call shape, e.g. after an out-of-gas revert"""
+        with self._lock:
+            self._used.pop(key, None)
+            self._inner.pop(key, None)
+
+    def gas_limit(self, key, gas_limit: int, relay_calldata: bytes) -> Optional[int]:
+        """Learned relayCall gas limit, or None without enough history"""
+        with self._lock:
+            samples = self._used.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            learned = int(samples.percentile(config.gas_model_percentile) * config.gas_estimate_margin)
+        return max(learned, hub_minimum_gas(gas_limit, relay_calldata))
+
+    def expected_gas_used(self, key) -> Optional[int]:
+        """Median gasUsed for this call shape, or None without enough history"""
+        with self._lock:
+            samples = self._used.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            return samples.percentile(0.5)
+
+    def minimum_gas_limit(self, key) -> Optional[int]:
+        """Smallest gasLimit this call shape can plausibly succeed with"""
+        with self._lock:
+            samples = self._inner.get(key)
+            if samples is None or len(samples) < self.min_samples:
+                return None
+            return samples.percentile(config.gas_model_reject_percentile)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "call_shapes": len(self._used),
+                "trained": sum(1 for s in self._used.values() if len(s) >= self.min_samples),
+            }
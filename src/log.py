@@ -0,0 +1,153 @@
+"""Structured JSON logging written from a background thread"""
+
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from .config import config
+
+
+LOGGER_NAME = "gsn"
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "sample"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SuccessSampler(logging.Filter):
+    """Keeps a fraction of INFO records logged with extra={"sample": True}.
+
+    Routine success records are the bulk of the volume; warnings and errors
+    are never sampled out.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not getattr(record, "sample", False):
+            return True
+        return self.rate >= 1 or random.random() < self.rate
+
+
+class BoundedQueueHandler(QueueHandler):
+    """Hands records to the writer thread without ever blocking the caller.
+
+    When the queue is full (the sink is slower than we log) records are
+    dropped and counted instead of growing memory or stalling the event loop.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__(queue.Queue(maxsize=max_size))
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only merge the message here; JSON encoding happens on the writer thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class DropReporter(logging.Handler):
+    """Writer-side handler that reports records dropped since the last report"""
+
+    def __init__(self, source: BoundedQueueHandler, target: logging.Handler):
+        super().__init__()
+        self.source = source
+        self.target = target
+        self.reported = 0
+
+    def emit(self, record: logging.LogRecord):
+        dropped = self.source.dropped
+        if dropped != self.reported:
+            self.target.handle(logging.makeLogRecord({
+                "name": LOGGER_NAME, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "log records dropped", "dropped": dropped - self.reported, "created": time.time(),
+            }))
+            self.reported = dropped
+        self.target.handle(record)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[BoundedQueueHandler] = None
+_lock = threading.Lock()
+
+
+def setup_logging():
+    """Route the "gsn" loggers through a bounded queue to a JSON writer thread"""
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+
+        _handler = BoundedQueueHandler(config.log_queue_size)
+        _handler.addFilter(SuccessSampler(config.log_success_sample_rate))
+
+        _listener = QueueListener(_handler.queue, DropReporter(_handler, stream))
+        _listener.start()
+
+        logger = logging.getLogger(LOGGER_NAME)
+        logger.setLevel(config.log_level.upper())
+        logger.addHandler(_handler)
+        logger.propagate = False
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener, _handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger(LOGGER_NAME).removeHandler(_handler)
+        _listener.stop()
+        _listener = None
+        _handler = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "gsn" hierarchy, e.g. get_logger("relayer")"""
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def log_stats() -> Dict[str, Any]:
+    handler = _handler
+    if handler is None:
+        return {"enabled": False}
+    return {"enabled": True, "queued": handler.queue.qsize(), "dropped": handler.dropped}
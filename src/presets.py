@@ -0,0 +1,86 @@
+"""Named ProxyWalletFactory call bundles, encoded once at startup"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from hexbytes import HexBytes
+
+from .encoders import (
+    CALL, PROXY_SELECTOR, UINT256_MAX, encode_proxy_calls, erc20_approve_calls, erc1155_set_approval_for_all_calls
+)
+
+
+@dataclass
+class ProxyPreset:
+    """A bundle of proxy calls and its proxy(...) calldata"""
+    name: str
+    calls: List[Dict[str, Any]]
+    encoded_function: bytes
+    description: str = ""
+    gas_limit: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "description": self.description,
+            "gas_limit": self.gas_limit,
+            "calls": [
+                {**call, 'data': '0x' + call['data'].hex(), 'value': str(call['value'])}
+                for call in self.calls
+            ],
+        }
+
+
+def _amount(value: Any) -> int:
+    return UINT256_MAX if value == "max" else int(value)
+
+
+def build_proxy_call(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """One proxy call from a presets file entry.
+
+    Entries are {"type": "erc20_approve", "token", "spender", "amount"},
+    {"type": "erc1155_set_approval_for_all", "token", "operator", "approved"}
+    or a raw {"typeCode", "to", "value", "data"} call. An amount of "max"
+    means 2**256 - 1.
+    """
+    kind = entry.get('type', 'call')
+    if kind == 'erc20_approve':
+        return erc20_approve_calls([(entry['token'], entry['spender'], _amount(entry.get('amount', 'max')))])[0]
+    if kind == 'erc1155_set_approval_for_all':
+        return erc1155_set_approval_for_all_calls([(entry['token'], entry['operator'], bool(entry.get('approved', True)))])[0]
+    if kind == 'call':
+        return {
+            'typeCode': int(entry.get('typeCode', CALL)),
+            'to': entry['to'],
+            'value': _amount(entry.get('value', 0)),
+            'data': bytes(HexBytes(entry.get('data', '0x'))),
+        }
+    raise ValueError(f"unknown call type {kind!r}")
+
+
+def build_preset(name: str, spec: Dict[str, Any]) -> ProxyPreset:
+    try:
+        calls = [build_proxy_call(entry) for entry in spec['calls']]
+        encoded_function = PROXY_SELECTOR + encode_proxy_calls(calls)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid proxy preset {name!r}: {e!r}") from e
+    gas_limit = spec.get('gas_limit')
+    return ProxyPreset(
+        name=name,
+        calls=calls,
+        encoded_function=encoded_function,
+        description=spec.get('description', ""),
+        gas_limit=int(gas_limit) if gas_limit is not None else None,
+    )
+
+
+def load_presets(path: str) -> Dict[str, ProxyPreset]:
+    """Presets from a JSON file mapping names to bundles; none if path is empty"""
+    if not path:
+        return {}
+    with open(path) as f:
+        specs = json.load(f)
+    if not isinstance(specs, dict):
+        raise ValueError(f"{path} must map preset names to bundles")
+    return {name: build_preset(name, spec) for name, spec in specs.items()}
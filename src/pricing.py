@@ -0,0 +1,74 @@
+"""Relay pricing: expected RelayHub charge versus our gas cost"""
+
+import math
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Optional
+
+from .config import config
+
+
+def calculate_charge(gas: int, gas_price: int, transaction_fee: int) -> int:
+    """RelayHub.calculateCharge (GSN v1): what the recipient pays the relay"""
+    return gas_price * gas * (100 + transaction_fee) // 100
+
+
+@dataclass
+class Quote:
+    """Expected economics of relaying one request, all amounts in wei"""
+    gas: int
+    gas_price: int
+    network_gas_price: int
+    cost_gas_price: int
+    transaction_fee: int
+    charge: int
+    cost: int
+    profit: int
+    min_transaction_fee: Optional[int]
+    profitable: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class PricingEngine:
+    """Decides whether a relay pays for itself before anything is sent.
+
+    RelayHub charges the recipient for the gas it measures plus
+    GAS_OVERHEAD, which covers the fixed transaction cost but not the
+    calldata we pay for. We pay for all of the gas used, at the price the
+    relay transaction will pay per gas; without one, at the network gas
+    price if that is higher than the price the user signed.
+    """
+
+    def __init__(self, min_margin_percent: Optional[float] = None):
+        self.min_margin_percent = config.pricing_min_margin_percent if min_margin_percent is None else min_margin_percent
+
+    def quote(self, gas: int, calldata_gas: int, gas_price: int, network_gas_price: int, transaction_fee: int,
+              cost_gas_price: Optional[int] = None) -> Quote:
+        charged_gas = max(gas - calldata_gas, 0)
+        if cost_gas_price is None:
+            cost_gas_price = max(gas_price, network_gas_price)
+
+        charge = calculate_charge(charged_gas, gas_price, transaction_fee)
+        cost = gas * cost_gas_price
+        required = cost * (100 + self.min_margin_percent) / 100
+
+        return Quote(
+            gas=gas,
+            gas_price=gas_price,
+            network_gas_price=network_gas_price,
+            cost_gas_price=cost_gas_price,
+            transaction_fee=transaction_fee,
+            charge=charge,
+            cost=cost,
+            profit=charge - cost,
+            min_transaction_fee=self.min_transaction_fee(charged_gas, gas_price, required),
+            profitable=charge >= required
+        )
+
+    @staticmethod
+    def min_transaction_fee(charged_gas: int, gas_price: int, required: float) -> Optional[int]:
+        """Smallest fee percentage whose charge covers the required amount"""
+        if charged_gas == 0 or gas_price == 0:
+            return None
+        return max(0, math.ceil(required * 100 / (charged_gas * gas_price) - 100))
@@ -0,0 +1,202 @@
+"""On-demand profiling of a live worker: stack sampling, cProfile and event-loop lag"""
+
+import asyncio
+import cProfile
+import inspect
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from .config import config
+from .log import get_logger
+
+
+logger = get_logger("profiling")
+
+PROFILE_MODES = ("sample", "cprofile")
+
+# Longest loop stalls kept per profile
+LOOP_LAG_MAX_EVENTS = 20
+
+# Lines of pstats output
+PSTATS_LIMIT = 60
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _stack(frame) -> List[str]:
+    """Frames from the outermost call to frame"""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _coroutine(frame) -> Optional[str]:
+    """The outermost coroutine on the stack: the task the loop was running"""
+    coroutine = None
+    while frame is not None:
+        if frame.f_code.co_flags & inspect.CO_COROUTINE:
+            coroutine = frame.f_code.co_qualname
+        frame = frame.f_back
+    return coroutine
+
+
+class StackSampler:
+    """Samples every thread's stack at a fixed interval into collapsed stacks.
+
+    Runs on its own thread for a bounded time, so nothing is sampled (and
+    nothing costs anything) outside a profile.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples = 0
+        self.stacks: Counter = Counter()
+
+    def run(self, duration: float):
+        own = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = ";".join([names.get(ident, str(ident))] + _stack(frame))
+                self.stacks[stack] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """One "frame;frame;frame count" line per stack (flamegraph.pl / speedscope input)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag and catches the coroutine that caused it.
+
+    A heartbeat task on the loop records when it last ran; a watchdog
+    thread notices when the heartbeat is overdue by more than threshold and
+    captures the loop thread's stack while the loop is still blocked.
+    """
+
+    def __init__(self, threshold: float, interval: float = 0.01):
+        self.threshold = threshold
+        self.interval = interval
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.beats = 0
+        self.events: List[Dict[str, Any]] = []
+        self._beat = time.monotonic()
+        self._stall: Optional[Dict[str, Any]] = None
+        self._loop_thread = threading.get_ident()
+        self._stopped = threading.Event()
+
+    async def _heartbeat(self):
+        while not self._stopped.is_set():
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat = now = time.monotonic()
+            lag = max(0.0, now - before - self.interval)
+            self.beats += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            stall, self._stall = self._stall, None
+            if stall is not None:
+                stall["lag_ms"] = round(lag * 1000, 1)
+                self._record(stall)
+
+    def _watchdog(self):
+        while not self._stopped.wait(self.threshold / 4):
+            beat = self._beat
+            if self._stall is None and time.monotonic() - beat > self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None and self._beat == beat:
+                    self._stall = {"coroutine": _coroutine(frame), "stack": _stack(frame)}
+
+    def _record(self, stall: Dict[str, Any]):
+        self.events.append(stall)
+        self.events.sort(key=lambda event: event["lag_ms"], reverse=True)
+        del self.events[LOOP_LAG_MAX_EVENTS:]
+
+    def start(self):
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name="loop-lag-watchdog", daemon=True).start()
+
+    async def stop(self):
+        self._stopped.set()
+        await self._heartbeat_task
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_ms": self.threshold * 1000,
+            "max_ms": round(self.max_lag * 1000, 1),
+            "mean_ms": round(self.total_lag / self.beats * 1000, 2) if self.beats else 0.0,
+            "stalls": self.events,
+        }
+
+
+_profiling = False
+
+
+async def profile(seconds: float, mode: str = "sample", interval_ms: float = 5.0) -> Dict[str, Any]:
+    """Profile this worker for seconds (capped at PROFILE_MAX_SECONDS).
+
+    mode "sample" returns collapsed stacks of every thread; "cprofile"
+    returns pstats output sorted by cumulative time. Both include the
+    event-loop lag seen during the profile. One profile runs at a time.
+    """
+    global _profiling
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}; use {' or '.join(PROFILE_MODES)}")
+    if _profiling:
+        raise RuntimeError("A profile is already running")
+    seconds = min(max(seconds, 0.1), config.profile_max_seconds)
+    _profiling = True
+    monitor = LoopLagMonitor(config.loop_lag_threshold_ms / 1000)
+    monitor.start()
+    try:
+        result: Dict[str, Any] = {"mode": mode, "seconds": seconds, "pid": os.getpid()}
+        if mode == "sample":
+            sampler = StackSampler(max(interval_ms, 1.0) / 1000)
+            done = asyncio.get_running_loop().create_future()
+
+            def sample():
+                try:
+                    sampler.run(seconds)
+                finally:
+                    done.get_loop().call_soon_threadsafe(done.set_result, None)
+
+            # A thread of its own: the default executor may be the thing that is saturated
+            threading.Thread(target=sample, name="stack-sampler", daemon=True).start()
+            await done
+            result.update(samples=sampler.samples, collapsed=sampler.collapsed())
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PSTATS_LIMIT)
+            result["pstats"] = output.getvalue()
+    finally:
+        await monitor.stop()
+        _profiling = False
+    result["loop_lag"] = monitor.stats()
+    logger.info("profile taken", extra={"mode": mode, "seconds": seconds,
+                                        "max_loop_lag_ms": result["loop_lag"]["max_ms"]})
+    return result
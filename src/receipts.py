@@ -0,0 +1,221 @@
+"""Transaction receipts of every broadcast relay, polled by one task"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from hexbytes import HexBytes
+from web3.exceptions import TransactionNotFound
+
+from .config import config
+from .log import get_logger
+
+
+logger = get_logger("receipts")
+
+
+class TransactionNotMined(Exception):
+    """The transaction can no longer be mined; its sender nonce is used or free"""
+
+
+class TransactionReplaced(TransactionNotMined):
+    """Another transaction of the sender was mined with the same nonce"""
+
+
+class TransactionDropped(TransactionNotMined):
+    """The node no longer knows the transaction, and its nonce is still unused"""
+
+
+class _Watch:
+    __slots__ = ("tx_hash", "sender", "nonce", "future", "since", "passed_since", "missing_since")
+
+    def __init__(self, tx_hash: HexBytes, sender: str, nonce: int, future: asyncio.Future):
+        self.tx_hash = tx_hash
+        self.sender = sender
+        self.nonce = nonce
+        self.future = future
+        self.since = time.monotonic()
+        # When the chain was first seen saying the transaction will not be mined
+        self.passed_since: Optional[float] = None
+        self.missing_since: Optional[float] = None
+
+
+class ReceiptWatcher:
+    """Waits for transaction receipts without holding a thread per transaction.
+
+    wait() registers a future; a single task asks the node for every
+    pending receipt each poll interval, on a small executor of its own,
+    and resolves the futures. An RPC error is counted and the transaction
+    is polled again next time: a wait only fails when the chain says the
+    transaction will not be mined, consistently for RECEIPT_CONFIRM_SECONDS.
+    That is when the sender's mined nonce has passed the transaction's
+    without it (replaced), or when, after RECEIPT_DROPPED_SECONDS unmined,
+    the node no longer knows the transaction (dropped). The task only runs
+    while something is being waited for.
+    """
+
+    def __init__(self, w3, poll_interval: Optional[float] = None, workers: Optional[int] = None,
+                 dropped_after: Optional[float] = None, confirm: Optional[float] = None):
+        self.w3 = w3
+        self.poll_interval = poll_interval or config.receipt_poll_interval_seconds
+        self.workers = workers or config.receipt_workers
+        self.dropped_after = dropped_after if dropped_after is not None else config.receipt_dropped_seconds
+        self.confirm = confirm if confirm is not None else config.receipt_confirm_seconds
+        self._pending: Dict[HexBytes, _Watch] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self.polls = 0
+        self.errors = 0
+        self.replaced = 0
+        self.dropped = 0
+
+    async def wait(self, tx_hash, sender: str, nonce: int) -> Any:
+        """The receipt of sender's transaction nonce; TransactionNotMined if it will never have one"""
+        tx_hash = HexBytes(tx_hash)
+        loop = asyncio.get_running_loop()
+        watch = self._pending.get(tx_hash)
+        if watch is None:
+            watch = _Watch(tx_hash, sender, nonce, loop.create_future())
+            self._pending[tx_hash] = watch
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return await watch.future
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error("receipt poll failed", extra={"error": str(e)})
+
+    def _executor_for_process(self) -> ThreadPoolExecutor:
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="receipts")
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _fetch(self, tx_hash: HexBytes) -> Optional[Any]:
+        try:
+            return self.w3.eth.get_transaction_receipt(tx_hash)
+        except TransactionNotFound:
+            return None
+
+    def known(self, tx_hash: HexBytes) -> bool:
+        """Whether the node has the transaction (in its mempool or mined)"""
+        try:
+            return self.w3.eth.get_transaction(tx_hash) is not None
+        except TransactionNotFound:
+            return False
+
+    def _mined_nonce(self, sender: str) -> int:
+        return self.w3.eth.get_transaction_count(sender, 'latest')
+
+    async def _gather(self, fn, items: List[Any]) -> List[Any]:
+        """fn(item) for every item on the executor; exceptions are returned, not raised"""
+        loop = asyncio.get_running_loop()
+        executor = self._executor_for_process()
+        return await asyncio.gather(
+            *(loop.run_in_executor(executor, fn, item) for item in items), return_exceptions=True
+        )
+
+    def _failed(self, results: List[Any], watches: List[_Watch]):
+        """Count RPC errors among results; the watches are polled again next time"""
+        for watch, result in zip(watches, results):
+            if isinstance(result, Exception):
+                # Transient (timeout, rate limit, open circuit)
+                self.errors += 1
+                logger.debug("receipt poll error", extra={"tx_hash": watch.tx_hash.hex(), "error": str(result)})
+
+    async def poll(self):
+        """Check every pending transaction once"""
+        self.polls += 1
+        watches = [watch for watch in self._pending.values() if not watch.future.done()]
+        receipts = await self._gather(self._fetch, [watch.tx_hash for watch in watches])
+        self._failed(receipts, watches)
+        unmined = []
+        for watch, receipt in zip(watches, receipts):
+            if receipt is None:
+                unmined.append(watch)
+            elif not isinstance(receipt, Exception):
+                self._resolve(watch, receipt)
+
+        if unmined:
+            await self._check_unmined(unmined)
+        for tx_hash in [tx_hash for tx_hash, watch in self._pending.items() if watch.future.done()]:
+            del self._pending[tx_hash]
+
+    async def _check_unmined(self, watches: List[_Watch]):
+        """Fail transactions whose nonce another transaction used, or that the node dropped"""
+        senders = list({watch.sender for watch in watches})
+        counts = await self._gather(self._mined_nonce, senders)
+        mined_nonces = {}
+        for sender, count in zip(senders, counts):
+            if isinstance(count, Exception):
+                self.errors += 1
+                logger.debug("nonce poll error", extra={"sender": sender, "error": str(count)})
+            else:
+                mined_nonces[sender] = count
+        watches = [watch for watch in watches if watch.sender in mined_nonces]
+        now = time.monotonic()
+
+        # Nonce used without this transaction (a reorg or a lagging node can say so briefly)
+        passed = [watch for watch in watches if mined_nonces[watch.sender] > watch.nonce]
+        unpassed = [watch for watch in watches if mined_nonces[watch.sender] <= watch.nonce]
+        for watch in unpassed:
+            watch.passed_since = None
+        if passed:
+            # The receipt may have appeared since the first call
+            receipts = await self._gather(self._fetch, [watch.tx_hash for watch in passed])
+            self._failed(receipts, passed)
+            for watch, receipt in zip(passed, receipts):
+                if isinstance(receipt, Exception):
+                    continue
+                if receipt is not None:
+                    self._resolve(watch, receipt)
+                    continue
+                if watch.passed_since is None:
+                    watch.passed_since = now
+                elif now - watch.passed_since >= self.confirm:
+                    self.replaced += 1
+                    self._resolve(watch, error=TransactionReplaced(
+                        f"Nonce {watch.nonce} of {watch.sender} was used by another transaction"
+                    ))
+
+        # Unmined for long: does the node still have it?
+        stale = [watch for watch in unpassed if now - watch.since >= self.dropped_after]
+        if stale:
+            known = await self._gather(self.known, [watch.tx_hash for watch in stale])
+            self._failed(known, stale)
+            for watch, result in zip(stale, known):
+                if isinstance(result, Exception):
+                    continue
+                if result:
+                    watch.missing_since = None
+                elif watch.missing_since is None:
+                    watch.missing_since = now
+                elif now - watch.missing_since >= self.confirm:
+                    self.dropped += 1
+                    self._resolve(watch, error=TransactionDropped(
+                        f"Transaction {watch.tx_hash.hex()} was dropped: the node no longer has it"
+                    ))
+
+    def _resolve(self, watch: _Watch, receipt: Any = None, error: Optional[Exception] = None):
+        if watch.future.done():
+            return
+        if error is not None:
+            watch.future.set_exception(error)
+        else:
+            watch.future.set_result(receipt)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "polls": self.polls,
+            "errors": self.errors,
+            "replaced": self.replaced,
+            "dropped": self.dropped,
+        }
@@ -1,50 +1,155 @@
 """Core GSN Relayer implementation"""
 
 import asyncio
+import threading
+import time
+import uuid
 from typing import Dict, Any, Optional, Tuple
 from web3 import Web3
 from eth_account import Account
 from eth_account.messages import encode_defunct
 from hexbytes import HexBytes
-from eth_abi.packed import encode_packed
+from web3.exceptions import ContractLogicError
 
 from .config import config
-from .abis import RELAY_HUB_ABI
+from .deposits import DepositCache, max_possible_charge
+from .encoders import ProxyCallEncoder, relay_request_digest
+from .events import ACCEPTED, BROADCAST, FAILED, MINED, REPLACED, RelayEventBus
+from .fees import FeeStrategy
+from .gas import ACCEPT_RELAYED_CALL_MAX_GAS, GasEstimator, GasUsageModel, calldata_gas, required_gas
+from .log import get_logger
+from .presets import load_presets
+from .pricing import PricingEngine, Quote
+from .receipts import ReceiptWatcher, TransactionDropped, TransactionNotMined, TransactionReplaced
+from .replay import ReplayFilter, replay_key
+from .rpc import already_known, make_provider, refused
+from .rpc_cache import BlockCacheMiddleware, RPCResponseCache
+from .signer import LocalSigner, NonceSequencer
+from .store import RelayStore
+from .validation import NonceCache, RelayRequestError, check_format, check_limits, check_nonce
+from .abis import RELAY_HUB_ABI, RELAY_RECIPIENT_ABI, PROXY_WALLET_FACTORY_ABI
+
+
+logger = get_logger("relayer")
+
+# RelayHub.canRelay statuses
+WRONG_NONCE = 2
+ACCEPT_RELAYED_CALL_REVERTED = 3
+INVALID_RECIPIENT_STATUS_CODE = 4
+
+# How often a pipelined relay checks whether the relay before it was sent
+PIPELINE_POLL_SECONDS = 0.01
+
+# What a quote does not know yet of a relayCall, sized like the real thing
+# and without zero bytes, so the quoted calldata gas is never too low
+QUOTE_FROM = Web3.to_checksum_address("0x" + "ff" * 20)
+QUOTE_NONCE = 2 ** 32 - 1
+QUOTE_SIGNATURE = b"\xff" * 65
+
+
+class StageTimer:
+    """Milliseconds spent in each named stage of a relay"""
+    
+    def __init__(self):
+        self.timings: Dict[str, float] = {}
+        self._last = time.perf_counter()
+    
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self.timings[stage] = round((now - self._last) * 1000, 2)
+        self._last = now
 
 
 class GSNRelayer:
     def __init__(self):
-        # Initialize Web3
-        self.w3 = Web3(Web3.HTTPProvider(config.rpc_url))
-        if not self.w3.is_connected():
-            raise ConnectionError(f"Failed to connect to {config.rpc_url}")
+        # Initialize Web3 (no network access until connect())
+        self.w3 = Web3(make_provider())
         
-        # Initialize account
+        # Serve repeated reads within a block (and the chain ID) from memory
+        self.rpc_cache = RPCResponseCache()
+        self.w3.middleware_onion.inject(BlockCacheMiddleware.build(self.rpc_cache), name='block_cache', layer=0)
+        
+        # Initialize account; transactions are signed off the event loop
         self.account = Account.from_key(config.relayer_private_key)
         self.address = self.account.address
+        self.signer = LocalSigner(filter(None, [config.relayer_private_key, config.owner_private_key]))
+        self.nonce_sequencer = NonceSequencer()
         
         # Initialize RelayHub contract
         self.relay_hub = self.w3.eth.contract(
             address=Web3.to_checksum_address(config.relay_hub_address),
             abi=RELAY_HUB_ABI
         )
+        self.proxy_wallet_factory = self.w3.eth.contract(
+            address=Web3.to_checksum_address(config.proxy_wallet_factory_address),
+            abi=PROXY_WALLET_FACTORY_ABI
+        )
+        self.proxy_encoder = ProxyCallEncoder()
+        self.proxy_presets = load_presets(config.proxy_presets_path)
+        
+        # relayCall gas limits from cached eth_estimateGas simulations
+        self.gas_estimator = GasEstimator()
+        self.gas_model = GasUsageModel()
+        self.pricing = PricingEngine()
         
-        print(f"Relayer initialized with address: {self.address}")
-        print(f"Connected to network: Chain ID {self.w3.eth.chain_id}")
+        
+        # Network gas price and EIP-1559 fees, refreshed once per block
+        self.network_gas_price: Optional[int] = None
+        self.fees = FeeStrategy()
+        
+        # Highest RelayHub nonce seen per user, for rejecting replays locally
+        self.user_nonces = NonceCache()
+        # Requests already accepted, so a retried signed request costs no RPC call
+        self.replay_filter = ReplayFilter()
+        
+        # Nonces, in-flight relays and deposit reservations shared with other worker processes
+        self.store = RelayStore()
+        
+        # Recipient RelayHub deposits, minus what in-flight relays of every worker may charge
+        self.deposits = DepositCache(self.store)
+        
+        # Relay lifecycle events for SSE and WebSocket subscribers
+        self.events = RelayEventBus(self.store)
+        
+        # Receipts of broadcast transactions, polled by one task
+        self.receipts = ReceiptWatcher(self.w3)
+        # Receipt waits of relays returned before they were mined
+        self._background: set = set()
+        
+        # Chain constants, filled in by connect()
+        self.chain_id: Optional[int] = None
+    
+    @property
+    def is_connected(self) -> bool:
+        """Whether connect() has succeeded"""
+        return self.chain_id is not None
+    
+    def connect(self):
+        """Check the RPC connection and cache chain constants"""
+        if not self.w3.is_connected():
+            raise ConnectionError(f"Failed to connect to {self.w3.provider}")
+        self.chain_id = self.w3.eth.chain_id
+        
+        logger.info("relayer connected", extra={"relayer": self.address, "chain_id": self.chain_id})
+    
+    def on_new_block(self, block_number: int):
+        """Per-block housekeeping, called from the status refresher thread"""
+        self.network_gas_price = self.w3.eth.gas_price
+        self.fees.update(self.w3, block_number)
+        self.deposits.refresh(
+            block_number,
+            lambda recipient: self.relay_hub.functions.balanceOf(
+                Web3.to_checksum_address(recipient)
+            ).call(block_identifier=block_number)
+        )
+        self.store.expire_inflight()
+        self.store.expire_events()
     
     async def get_relay_status(self) -> Dict[str, Any]:
         """Get the current status of this relay"""
         try:
             relay_info = self.relay_hub.functions.getRelay(self.address).call()
-            return {
-                "address": self.address,
-                "totalStake": relay_info[0],
-                "unstakeDelay": relay_info[1],
-                "unstakeTime": relay_info[2],
-                "owner": relay_info[3],
-                "state": relay_info[4],
-                "stateText": self._get_relay_state_text(relay_info[4])
-            }
+            return self.format_relay_info(relay_info)
         except Exception as e:
             return {
                 "address": self.address,
@@ -53,6 +158,18 @@ class GSNRelayer:
                 "stateText": "Unknown"
             }
     
+    def format_relay_info(self, relay_info) -> Dict[str, Any]:
+        """Convert a RelayHub getRelay result to a status dict"""
+        return {
+            "address": self.address,
+            "totalStake": relay_info[0],
+            "unstakeDelay": relay_info[1],
+            "unstakeTime": relay_info[2],
+            "owner": relay_info[3],
+            "state": relay_info[4],
+            "stateText": self._get_relay_state_text(relay_info[4])
+        }
+    
     def _get_relay_state_text(self, state: int) -> str:
         """Convert relay state enum to text"""
         states = {
@@ -73,35 +190,36 @@ class GSNRelayer:
         owner_address = owner_account.address
         
         # Check owner balance
-        balance = self.w3.eth.get_balance(owner_address)
+        balance = await asyncio.to_thread(self.w3.eth.get_balance, owner_address)
         if balance < stake_amount:
             raise ValueError(f"Insufficient owner balance. Have {Web3.from_wei(balance, 'ether')} ETH, need {Web3.from_wei(stake_amount, 'ether')} ETH")
         
-        print(f"Owner {owner_address} staking for relay {self.address}")
-        
-        # Build transaction
-        tx = self.relay_hub.functions.stake(
-            self.address,  # Relay address to stake for
-            unstake_delay
-        ).build_transaction({
-            'from': owner_address,  # Owner sends the transaction
-            'value': stake_amount,
-            'gas': 100000,
-            'gasPrice': self.w3.eth.gas_price,
-            'nonce': self.w3.eth.get_transaction_count(owner_address),
-        })
+        logger.info("staking relay", extra={"owner": owner_address, "relayer": self.address, "amount": stake_amount})
         
-        # Sign with owner account
-        signed_tx = owner_account.sign_transaction(tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        # Build, sign with owner account and send
+        fees = await self._transaction_fees()
+        nonce, tx_hash = await self._send_transaction(
+            owner_address,
+            lambda nonce: self.relay_hub.functions.stake(
+                self.address,  # Relay address to stake for
+                unstake_delay
+            ).build_transaction({
+                'from': owner_address,  # Owner sends the transaction
+                'value': stake_amount,
+                'gas': 100000,
+                **fees,
+                'chainId': self.chain_id,
+                'nonce': nonce,
+            })
+        )
         
-        print(f"Staking transaction sent: {tx_hash.hex()}")
+        logger.info("staking transaction sent", extra={"tx_hash": tx_hash.hex()})
         
         # Wait for confirmation
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = await self._wait_receipt(tx_hash, owner_address, nonce)
         
         if receipt.status == 1:
-            print(f"Successfully staked {Web3.from_wei(stake_amount, 'ether')} ETH")
+            logger.info("relay staked", extra={"tx_hash": tx_hash.hex(), "amount": stake_amount})
             return tx_hash.hex()
         else:
             raise Exception("Staking transaction failed")
@@ -116,35 +234,36 @@ class GSNRelayer:
         if relay_info.get("state", 0) < 1:
             raise ValueError("Relay must be staked before registering")
         
-        # Build transaction
-        tx = self.relay_hub.functions.registerRelay(
-            transaction_fee,
-            url
-        ).build_transaction({
-            'from': self.address,
-            'gas': 150000,
-            'gasPrice': self.w3.eth.gas_price,
-            'nonce': self.w3.eth.get_transaction_count(self.address),
-        })
-        
-        # Sign and send transaction
-        signed_tx = self.account.sign_transaction(tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        # Build, sign and send transaction
+        fees = await self._transaction_fees()
+        nonce, tx_hash = await self._send_transaction(
+            self.address,
+            lambda nonce: self.relay_hub.functions.registerRelay(
+                transaction_fee,
+                url
+            ).build_transaction({
+                'from': self.address,
+                'gas': 150000,
+                **fees,
+                'chainId': self.chain_id,
+                'nonce': nonce,
+            })
+        )
         
-        print(f"Registration transaction sent: {tx_hash.hex()}")
+        logger.info("registration transaction sent", extra={"tx_hash": tx_hash.hex()})
         
         # Wait for confirmation
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        receipt = await self._wait_receipt(tx_hash, self.address, nonce)
         
         if receipt.status == 1:
-            print(f"Successfully registered relay with {transaction_fee}% fee at {url}")
+            logger.info("relay registered", extra={"tx_hash": tx_hash.hex(), "fee": transaction_fee, "url": url})
             return tx_hash.hex()
         else:
             raise Exception("Registration transaction failed")
     
     async def can_relay(self, relay_request: Dict[str, Any]) -> Tuple[int, bytes]:
         """Check if a relay request can be fulfilled"""
-        status, context = self.relay_hub.functions.canRelay(
+        call = self.relay_hub.functions.canRelay(
             self.address,
             relay_request['from'],
             relay_request['to'],
@@ -155,91 +274,454 @@ class GSNRelayer:
             relay_request['nonce'],
             HexBytes(relay_request['signature']),
             HexBytes(relay_request.get('approvalData', '0x'))
-        ).call()
+        )
+        status, context = await asyncio.to_thread(call.call)
         
         return status, context
     
-    async def relay_call(self, relay_request: Dict[str, Any]) -> str:
-        """Execute a relay call"""
-        # First check if we can relay
-        status, context = await self.can_relay(relay_request)
-        if status != 0:
-            raise ValueError(f"Cannot relay: status {status}")
-        
-        # Calculate required gas using the same formula as RelayHub
-        # Constants from RelayHub contract
-        GAS_OVERHEAD = 48204
-        GAS_RESERVE = 100000
-        ACCEPT_RELAYED_CALL_MAX_GAS = 50000
-        PRE_RELAYED_CALL_MAX_GAS = 100000
-        POST_RELAYED_CALL_MAX_GAS = 100000
-        
-        required_gas = (
-            GAS_OVERHEAD + 
-            GAS_RESERVE + 
-            ACCEPT_RELAYED_CALL_MAX_GAS + 
-            PRE_RELAYED_CALL_MAX_GAS + 
-            POST_RELAYED_CALL_MAX_GAS + 
-            relay_request['gasLimit']
+    async def relay_call(self, relay_request: Dict[str, Any], wait: bool = True,
+                         relay_id: Optional[str] = None) -> str:
+        """Execute a relay call.
+        
+        With wait=False the transaction hash is returned as soon as the
+        transaction is broadcast and the receipt is handled in the background.
+        Lifecycle events are published under relay_id (generated if not given).
+        """
+        relay_id = relay_id or uuid.uuid4().hex
+        try:
+            return await self._relay(relay_request, wait, relay_id)
+        except Exception as e:
+            self.events.publish(relay_id, FAILED, error=str(e), code=getattr(e, 'code', None))
+            raise
+    
+    async def _relay(self, relay_request: Dict[str, Any], wait: bool, relay_id: str) -> str:
+        timer = StageTimer()
+        
+        # Reject malformed, out-of-policy, replayed and forged requests in memory
+        self.validate_relay_request(relay_request)
+        timer.mark("validate")
+        
+        # Reject gas limits this call shape has never been able to work with
+        gas_key = self.gas_model.key(relay_request)
+        minimum_gas_limit = self.gas_model.minimum_gas_limit(gas_key)
+        if minimum_gas_limit is not None and relay_request['gasLimit'] < minimum_gas_limit:
+            raise RelayRequestError(
+                "GAS_LIMIT_TOO_LOW",
+                f"gasLimit {relay_request['gasLimit']} is too low: this call has needed at least {minimum_gas_limit}"
+            )
+        
+        # Encode the relay transaction
+        relay_args = self.relay_call_args(relay_request)
+        relay_calldata = HexBytes(self.relay_hub.encode_abi('relayCall', args=relay_args))
+        
+        # Reject requests whose charge will not cover our gas
+        quote = self.quote_relay(relay_request, relay_calldata)
+        if config.pricing_enforce and not quote.profitable:
+            raise RelayRequestError(
+                "UNPROFITABLE",
+                f"Relay is not profitable: expected charge {quote.charge} wei does not cover "
+                f"cost {quote.cost} wei; minimum transactionFee is {quote.min_transaction_fee}"
+            )
+        
+        # Reserve the most this relay can charge the recipient's deposit
+        await self.reserve_deposit(relay_request, relay_id)
+        timer.mark("price")
+        
+        # Claim the request; a concurrent identical request is rejected here
+        key = replay_key(relay_request)
+        try:
+            self._check_replay(self.replay_filter.claim(key, relay_id), relay_request)
+        except RelayRequestError:
+            await self.store.run(self.deposits.release, relay_id)
+            raise
+        
+        try:
+            # Hold the user's nonce from now on, so concurrent later nonces can follow it
+            claimed = await self.store.run(
+                self.store.claim_user_nonce, relay_id, self.address, relay_request['from'], relay_request['nonce']
+            )
+            if not claimed:
+                raise RelayRequestError(
+                    "NONCE_PENDING", f"nonce {relay_request['nonce']} is already being relayed"
+                )
+            
+            # Check if we can relay
+            status, context = await self.can_relay(relay_request)
+            if status == WRONG_NONCE:
+                # Fine if the nonce follows our own in-flight relays for this user
+                status = await self.check_pending_nonce(relay_request, relay_id)
+            if status != 0:
+                raise RelayRequestError("CANNOT_RELAY", f"Cannot relay: status {status}")
+            timer.mark("can_relay")
+            self.events.publish(
+                relay_id, ACCEPTED,
+                user=relay_request['from'], to=relay_request['to'], nonce=relay_request['nonce']
+            )
+            
+            # Size the gas limit from learned usage, else by simulation
+            # (with the static RelayHub formula as the last resort)
+            total_gas = self.gas_model.gas_limit(gas_key, relay_request['gasLimit'], relay_calldata)
+            if total_gas is None:
+                relay_fn = self.relay_hub.functions.relayCall(*relay_args)
+                total_gas = await asyncio.to_thread(self.gas_estimator.estimate, relay_fn, relay_request, self.address)
+            timer.mark("gas")
+            
+            # Sign and send transaction with a nonce shared across workers; the
+            # calldata is already encoded, so the transaction is a plain dict
+            fees = self.fees.relay_fees(relay_request['gasPrice']) or {'gasPrice': relay_request['gasPrice']}
+            nonce, tx_hash = await self._send_transaction(
+                self.address,
+                lambda nonce: {
+                    'from': self.address,
+                    'to': self.relay_hub.address,
+                    'data': relay_calldata,
+                    'value': 0,
+                    'gas': total_gas,
+                    **fees,
+                    'chainId': self.chain_id,
+                    'nonce': nonce,
+                }
+            )
+        except Exception:
+            # Nothing was sent, so the request may be tried again; a send that
+            # may have reached a node is not an error and is followed below
+            await self.store.run(self.store.finish_inflight, relay_id)
+            await self.store.run(self.deposits.release, relay_id)
+            self.replay_filter.forget(key)
+            raise
+        timer.mark("send")
+        
+        await self.store.run(
+            self.store.add_inflight, relay_id, self.address, nonce,
+            relay_request['from'], relay_request['nonce'], tx_hash.hex()
         )
+        self.events.publish(relay_id, BROADCAST, tx_hash=tx_hash.hex(), relayer_nonce=nonce, gas=total_gas)
+        logger.info("relay sent", extra={
+            "relay_id": relay_id, "user": relay_request['from'], "tx_hash": tx_hash.hex(),
+            "nonce": nonce, "timings_ms": timer.timings, "sample": True
+        })
         
-        # Add some extra buffer for safety
-        total_gas = int(required_gas * 1.1)
+        finish = self._finish_relay(relay_id, tx_hash, nonce, relay_request, gas_key, relay_calldata, timer)
+        if not wait:
+            task = asyncio.create_task(finish)
+            self._background.add(task)
+            task.add_done_callback(self._background_done)
+            return tx_hash.hex()
+        return await finish
+    
+    async def check_pending_nonce(self, relay_request: Dict[str, Any], relay_id: Optional[str] = None) -> int:
+        """canRelay status for a request that failed with WrongNonce.
+        
+        RelayHub only knows the user's mined nonce. If one of our own
+        in-flight relays for the user (other than relay_id) holds the nonce
+        right before this request's, the request is sent with a later relayer nonce, so
+        it is mined after them and the nonce is correct by then. A relay
+        before it that is still being checked is waited for (up to
+        PIPELINE_WAIT_SECONDS), so relayer nonces follow user nonces.
+        canRelay stopped at the nonce, so the recipient's acceptRelayedCall
+        is checked here instead. If an earlier relay fails on chain after
+        all, this one is mined with the wrong nonce and the relayer pays
+        for its gas.
+        """
+        previous = relay_request['nonce'] - 1
+        deadline = time.monotonic() + config.pipeline_wait_seconds
+        while True:
+            inflight = await self.store.run(self.store.inflight, relay_request['from'])
+            pending = {r['user_nonce']: r for r in inflight if r['relay_id'] != relay_id}
+            if relay_request['nonce'] in pending:
+                raise RelayRequestError(
+                    "NONCE_PENDING", f"nonce {relay_request['nonce']} is already being relayed"
+                )
+            if previous not in pending:
+                return WRONG_NONCE
+            if pending[previous]['nonce'] >= 0:
+                return await self.accept_relayed_call(relay_request)
+            # Claimed but not sent yet
+            if time.monotonic() >= deadline:
+                return WRONG_NONCE
+            await asyncio.sleep(PIPELINE_POLL_SECONDS)
+    
+    async def accept_relayed_call(self, relay_request: Dict[str, Any]) -> int:
+        """canRelay status from the recipient's acceptRelayedCall alone.
         
-        # Build the relay transaction
-        tx = self.relay_hub.functions.relayCall(
+        Called the way RelayHub calls it: from the hub, with the hub's gas
+        allowance and the relay's maximum possible charge.
+        """
+        recipient = self.w3.eth.contract(address=relay_request['to'], abi=RELAY_RECIPIENT_ABI)
+        call = recipient.functions.acceptRelayedCall(
+            self.address,
             relay_request['from'],
-            relay_request['to'],
             HexBytes(relay_request['encodedFunction']),
             relay_request['transactionFee'],
             relay_request['gasPrice'],
             relay_request['gasLimit'],
             relay_request['nonce'],
-            HexBytes(relay_request['signature']),
-            HexBytes(relay_request.get('approvalData', '0x'))
-        ).build_transaction({
-            'from': self.address,
-            'gas': total_gas,
-            'gasPrice': relay_request['gasPrice'],
-            'nonce': self.w3.eth.get_transaction_count(self.address),
-        })
+            HexBytes(relay_request.get('approvalData', '0x')),
+            max_possible_charge(
+                relay_request['gasLimit'], relay_request['gasPrice'], relay_request['transactionFee']
+            )
+        )
+        try:
+            status, _ = await asyncio.to_thread(
+                call.call, {'from': self.relay_hub.address, 'gas': ACCEPT_RELAYED_CALL_MAX_GAS}
+            )
+        except ContractLogicError:
+            return ACCEPT_RELAYED_CALL_REVERTED
+        # Recipients may only return 0 (accept) or their own codes above 10
+        if status == 0 or status > 10:
+            return status
+        return INVALID_RECIPIENT_STATUS_CODE
+    
+    async def next_user_nonce(self, address: str) -> Tuple[int, int]:
+        """(RelayHub nonce, next nonce after our in-flight relays) of address.
         
-        # Sign and send transaction
-        signed_tx = self.account.sign_transaction(tx)
-        tx_hash = self.w3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        getNonce is an eth_call served from the block cache, so it can lag
+        behind relays whose receipts we have already seen; those are in the
+        nonce cache, and the higher of the two is used.
+        """
+        nonce = await asyncio.to_thread(self.get_user_nonce, address)
+        nonce = max(nonce, self.user_nonces.get(address) or 0)
+        pending = await self.pending_user_nonce(address)
+        return nonce, max(nonce, pending or 0)
+    
+    async def pending_user_nonce(self, address: str) -> Optional[int]:
+        """Next RelayHub nonce of address after our in-flight relays, or None if there are none"""
+        inflight = await self.store.run(self.store.inflight, address)
+        pending = [r['user_nonce'] for r in inflight]
+        return max(pending) + 1 if pending else None
+    
+    async def _wait_receipt(self, tx_hash: HexBytes, address: str, nonce: int) -> Any:
+        """Receipt of address's transaction nonce.
         
-        print(f"Relay transaction sent: {tx_hash.hex()}")
+        A dropped transaction never used its nonce, so it is handed back to
+        the store; otherwise every later transaction of address would wait
+        behind the gap.
+        """
+        try:
+            return await self.receipts.wait(tx_hash, address, nonce)
+        except TransactionDropped:
+            await self.store.run(self.store.release_nonce, address, nonce)
+            raise
+    
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # The failed event was published by _finish_relay
+            logger.error("background relay failed", exc_info=task.exception())
+    
+    async def _finish_relay(self, relay_id: str, tx_hash: HexBytes, nonce: int, relay_request: Dict[str, Any],
+                            gas_key, relay_calldata: bytes, timer: StageTimer) -> str:
+        """Wait for a broadcast relay to be mined and learn from its receipt.
         
-        # Wait for confirmation
-        receipt = self.w3.eth.wait_for_transaction_receipt(tx_hash)
+        RPC errors while waiting are retried by the receipt watcher; the
+        relay only counts as failed once its relayer nonce was used by
+        another transaction or the node dropped it. Until then it stays in
+        flight, since it may still be mined.
+        """
+        try:
+            receipt = await self._wait_receipt(tx_hash, self.address, nonce)
+        except TransactionNotMined as e:
+            # This transaction did not use the user's nonce, so allow a retry
+            await self.store.run(self.store.finish_inflight, relay_id)
+            await self.store.run(self.deposits.release, relay_id)
+            self.replay_filter.forget(replay_key(relay_request))
+            if isinstance(e, TransactionReplaced):
+                self.events.publish(relay_id, REPLACED, tx_hash=tx_hash.hex(), relayer_nonce=nonce)
+            self.events.publish(relay_id, FAILED, tx_hash=tx_hash.hex(), error=str(e))
+            raise
+        await self.store.run(self.store.finish_inflight, relay_id)
+        await self.store.run(self.deposits.settle, relay_id, receipt.blockNumber)
+        timer.mark("mined")
+        fields = {
+            "relay_id": relay_id, "user": relay_request['from'], "tx_hash": tx_hash.hex(),
+            "block_number": receipt.blockNumber, "gas_used": receipt.gasUsed, "timings_ms": timer.timings
+        }
         
         if receipt.status == 1:
-            print(f"Successfully relayed transaction")
+            # relayCall consumed the user's RelayHub nonce
+            self.user_nonces.observe(relay_request['from'], relay_request['nonce'] + 1)
             # Parse TransactionRelayed event
+            relayed_status = None
             for log in receipt.logs:
                 try:
                     event = self.relay_hub.events.TransactionRelayed().process_log(log)
-                    print(f"Relay status: {event['args']['status']}, charge: {event['args']['charge']}")
+                    relayed_status = event['args']['status']
+                    fields["charge"] = event['args']['charge']
                 except:
                     pass
+            fields["relay_status"] = relayed_status
+            self.events.publish(
+                relay_id, MINED, tx_hash=tx_hash.hex(), block_number=receipt.blockNumber,
+                gas_used=receipt.gasUsed, charge=fields.get("charge"), relay_status=relayed_status
+            )
+            logger.info("relay mined", extra={**fields, "sample": True})
+            self.gas_model.record(gas_key, receipt.gasUsed, relay_calldata, relayed_status == 0)
             return tx_hash.hex()
         else:
+            logger.warning("relay transaction reverted", extra=fields)
+            self.events.publish(
+                relay_id, FAILED, tx_hash=tx_hash.hex(), block_number=receipt.blockNumber,
+                gas_used=receipt.gasUsed, error="Relay transaction failed"
+            )
+            # Possibly our gas limit was too low: re-learn this call shape
+            self.gas_model.forget(gas_key)
+            self.replay_filter.forget(replay_key(relay_request))
             raise Exception("Relay transaction failed")
     
+    def validate_relay_request(self, relay_request: Dict[str, Any]):
+        """Checks that need no RPC call; raises RelayRequestError"""
+        check_format(relay_request)
+        check_limits(relay_request, self.network_gas_price)
+        check_nonce(relay_request, self.user_nonces.get(relay_request['from']))
+        self._check_replay(self.replay_filter.seen(replay_key(relay_request)), relay_request)
+        if not self.verify_relay_request_signature(relay_request):
+            raise RelayRequestError("INVALID_SIGNATURE", "Signature does not match the request sender")
+    
+    def _check_replay(self, original_relay_id: Optional[str], relay_request: Dict[str, Any]):
+        if original_relay_id is not None:
+            raise RelayRequestError(
+                "REPLAYED",
+                f"nonce {relay_request['nonce']} of {relay_request['from']} was already accepted"
+                + (f" as relay {original_relay_id}" if original_relay_id else "")
+            )
+    
+    def get_user_nonce(self, address: str) -> int:
+        """RelayHub nonce of address (blocking), remembered for validation"""
+        nonce = self.relay_hub.functions.getNonce(Web3.to_checksum_address(address)).call()
+        self.user_nonces.observe(address, nonce)
+        return nonce
+    
+    async def reserve_deposit(self, relay_request: Dict[str, Any], relay_id: str):
+        """Claim the relay's maximum charge from the cached recipient deposit"""
+        recipient = relay_request['to']
+        if not self.deposits.known(recipient):
+            # First request for this recipient: read its deposit once
+            balance = await asyncio.to_thread(
+                self.relay_hub.functions.balanceOf(Web3.to_checksum_address(recipient)).call
+            )
+            self.deposits.load(recipient, balance, self.rpc_cache.block_number or 0)
+        
+        max_charge = max_possible_charge(
+            relay_request['gasLimit'], relay_request['gasPrice'], relay_request['transactionFee']
+        )
+        if not await self.store.run(self.deposits.reserve, recipient, relay_id, max_charge):
+            available = await self.store.run(self.deposits.available, recipient)
+            raise RelayRequestError(
+                "RECIPIENT_BALANCE_TOO_LOW",
+                f"Recipient deposit too low: {available} wei available, "
+                f"relay may charge up to {max_charge} wei"
+            )
+    
+    @staticmethod
+    def relay_call_args(relay_request: Dict[str, Any]) -> list:
+        """RelayHub.relayCall arguments for a relay request"""
+        return [
+            relay_request['from'],
+            relay_request['to'],
+            HexBytes(relay_request['encodedFunction']),
+            relay_request['transactionFee'],
+            relay_request['gasPrice'],
+            relay_request['gasLimit'],
+            relay_request['nonce'],
+            HexBytes(relay_request['signature']),
+            HexBytes(relay_request.get('approvalData', '0x'))
+        ]
+    
+    def quote_relay(self, relay_request: Dict[str, Any], relay_calldata: Optional[bytes] = None) -> Quote:
+        """Expected charge, cost and profit of a relay request (no RPC calls).
+        
+        relay_calldata is the relayCall transaction's data. Without it, the
+        request is priced as relayCall calldata too, with stand-ins for the
+        sender, nonce and signature a quote is asked for before they exist,
+        so a fee quoted here also passes when the signed request is relayed.
+        """
+        gas = self.gas_model.expected_gas_used(self.gas_model.key(relay_request))
+        if gas is None:
+            # No history for this call shape: assume the worst case RelayHub allows for
+            gas = required_gas(relay_request['gasLimit'])
+        if relay_calldata is None:
+            relay_calldata = HexBytes(self.relay_hub.encode_abi('relayCall', args=self.relay_call_args({
+                'from': QUOTE_FROM, 'nonce': QUOTE_NONCE, 'signature': QUOTE_SIGNATURE, **relay_request,
+                'to': Web3.to_checksum_address(relay_request['to'])
+            })))
+        
+        return self.pricing.quote(
+            gas,
+            calldata_gas(relay_calldata),
+            relay_request['gasPrice'],
+            self.network_gas_price or relay_request['gasPrice'],
+            relay_request['transactionFee'],
+            # What relayCall will pay per gas with the fees _relay sends it with
+            self.fees.relay_gas_price(relay_request['gasPrice'])
+        )
+    
+    async def _transaction_fees(self) -> Dict[str, int]:
+        """EIP-1559 fees from the cached fee history, else the legacy gas price"""
+        fees = self.fees.transaction_fees()
+        if fees is None:
+            fees = {'gasPrice': await asyncio.to_thread(lambda: self.w3.eth.gas_price)}
+        return fees
+    
+    async def _send_transaction(self, address: str, build_tx) -> Tuple[int, HexBytes]:
+        """Allocate a shared nonce for address, then build, sign and send.
+        
+        Signing runs on the signer's executor; transactions still reach the
+        node in nonce order. The nonce is handed back to the store if the
+        transaction certainly never reached the node, so a failed send does
+        not leave a nonce gap; an exception therefore means nothing was sent.
+        """
+        chain_nonce = await asyncio.to_thread(self.w3.eth.get_transaction_count, address, 'pending')
+        nonce = await self.store.run(self.store.allocate_nonce, address, chain_nonce)
+        self.nonce_sequencer.claim(address, nonce)
+        try:
+            try:
+                raw_transaction = await self.signer.sign_transaction(build_tx(nonce))
+                await self.nonce_sequencer.wait_turn(address, nonce)
+            except Exception:
+                await self.store.run(self.store.release_nonce, address, nonce)
+                raise
+            tx_hash = await self._send_raw_transaction(address, nonce, raw_transaction)
+        finally:
+            await self.nonce_sequencer.done(address, nonce)
+        return nonce, tx_hash
+    
+    async def _send_raw_transaction(self, address: str, nonce: int, raw_transaction: bytes) -> HexBytes:
+        """Broadcast a signed transaction, releasing its nonce only if the node refused it.
+        
+        A timeout or a reset connection can follow the node accepting the
+        transaction, and handing its nonce to another relay would then
+        replace it or fail with "nonce too low". The same bytes are sent
+        again instead (up to RPC_SEND_RETRIES times; the hash is the same,
+        and "already known" means the node has it). If no attempt is
+        confirmed, the send still counts as sent: the caller follows its
+        receipt like any other, and the receipt watcher hands the nonce back
+        if the transaction turns out dropped.
+        """
+        tx_hash = HexBytes(Web3.keccak(raw_transaction))
+        error: Optional[Exception] = None
+        for attempt in range(config.rpc_send_retries + 1):
+            if attempt:
+                await asyncio.sleep(config.rpc_retry_backoff_ms / 1000 * 2 ** (attempt - 1))
+            try:
+                return await asyncio.to_thread(self.w3.eth.send_raw_transaction, raw_transaction)
+            except Exception as e:
+                if already_known(e):
+                    return tx_hash
+                # After an unconfirmed attempt a refusal such as "nonce too low"
+                # may mean that attempt was mined, so only the first one counts
+                if error is None and refused(e):
+                    await self.store.run(self.store.release_nonce, address, nonce)
+                    raise
+                error = e
+        logger.warning("transaction send unconfirmed, following its receipt", extra={
+            "tx_hash": tx_hash.hex(), "nonce": nonce, "error": str(error)
+        })
+        return tx_hash
+    
     def verify_relay_request_signature(self, relay_request: Dict[str, Any]) -> bool:
         """Verify the signature of a relay request"""
         # Reconstruct the message that was signed
-        packed = encode_packed(
-            ['string', 'address', 'address', 'bytes', 'uint256', 'uint256', 'uint256', 'uint256', 'address'],
-            ['rlx:', relay_request['from'], relay_request['to'], HexBytes(relay_request['encodedFunction']), 
-             relay_request['transactionFee'], relay_request['gasPrice'], relay_request['gasLimit'], 
-             relay_request['nonce'], config.relay_hub_address]
-        )
-        
-        # Hash the concatenation of packed and relay address (matching abi.encodePacked in RelayHub)
-        relay_address_bytes = Web3.to_bytes(hexstr=self.address)
-        concatenated = packed + relay_address_bytes
-        hashed_message = Web3.keccak(concatenated)
+        hashed_message = relay_request_digest(relay_request, config.relay_hub_address, self.address)
         
         # Recover the signer - GSN v1 RelayHub uses toEthSignedMessageHash
         try:
@@ -249,9 +731,20 @@ class GSNRelayer:
             recovered = Account.recover_message(prefixed_message, signature=HexBytes(relay_request['signature']))
             return recovered.lower() == relay_request['from'].lower()
         except Exception as e:
-            print(f"Signature verification failed: {e}")
+            logger.debug("signature verification failed", extra={"user": relay_request['from'], "error": str(e)})
             return False
 
 
-# Global relayer instance
-relayer = GSNRelayer() 
\ No newline at end of file
+_relayer: Optional[GSNRelayer] = None
+_relayer_lock = threading.Lock()
+
+
+def get_relayer() -> GSNRelayer:
+    """Return the process-wide relayer, creating it on first use"""
+    global _relayer
+    if _relayer is None:
+        with _relayer_lock:
+            if _relayer is None:
+                _relayer = GSNRelayer()
+    return _relayer
+ 
\ No newline at end of file
@@ -0,0 +1,129 @@
+"""Fixed-memory filter of relay requests we have already accepted"""
+
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from hexbytes import HexBytes
+
+from .config import config
+
+
+def replay_key(relay_request: Dict[str, Any]) -> bytes:
+    """16-byte digest of (from, nonce, signature)"""
+    return hashlib.blake2b(
+        b"%s:%d:%s" % (relay_request['from'].lower().encode(), relay_request['nonce'],
+                       bytes(HexBytes(relay_request['signature']))),
+        digest_size=16
+    ).digest()
+
+
+class BloomFilter:
+    """Bit array sized for capacity keys at false-positive rate fp_rate"""
+
+    def __init__(self, capacity: int, fp_rate: float):
+        self.capacity = capacity
+        self.bits = max(8, math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacity * math.log(2)))
+        self.count = 0
+        self._array = bytearray((self.bits + 7) // 8)
+
+    def _positions(self, key: bytes):
+        # Enhanced double hashing over the two halves of the digest; plain
+        # h1 + i * h2 clusters in small filters, well above fp_rate
+        h1 = int.from_bytes(key[:8], 'little')
+        h2 = int.from_bytes(key[8:16], 'little')
+        return ((h1 + i * h2 + (i ** 3 - i) // 6) % self.bits for i in range(self.hashes))
+
+    def add(self, key: bytes):
+        for position in self._positions(key):
+            self._array[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def full(self) -> bool:
+        return self.count >= self.capacity
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+
+class ReplayFilter:
+    """Remembers accepted relay requests so replays are rejected in memory.
+
+    Two Bloom filter generations hold the last 1-2x REPLAY_FILTER_CAPACITY
+    keys in fixed memory; the older generation is dropped when the newer
+    fills. A small exact LRU holds the most recent keys with their relay
+    ID. Requests that were never mined (dropped, reverted or failed before
+    broadcast) are forgotten: they leave the LRU and go on a small list
+    that overrides the Bloom filter, so the same signed request can be
+    retried.
+    """
+
+    def __init__(self, capacity: Optional[int] = None, fp_rate: Optional[float] = None,
+                 lru_size: Optional[int] = None):
+        self.capacity = capacity or config.replay_filter_capacity
+        self.fp_rate = fp_rate or config.replay_filter_fp_rate
+        self.lru_size = lru_size or config.replay_lru_size
+        self._current = BloomFilter(self.capacity, self.fp_rate)
+        self._previous: Optional[BloomFilter] = None
+        self._recent: "OrderedDict[bytes, str]" = OrderedDict()
+        self._forgotten: "OrderedDict[bytes, None]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.rejected = 0
+
+    def _seen(self, key: bytes) -> bool:
+        if key in self._recent:
+            return True
+        if key in self._forgotten:
+            return False
+        return key in self._current or (self._previous is not None and key in self._previous)
+
+    def seen(self, key: bytes) -> Optional[str]:
+        """The original relay ID ("" if only the Bloom filter knows it), or None"""
+        with self._lock:
+            if not self._seen(key):
+                return None
+            self.rejected += 1
+            return self._recent.get(key, "")
+
+    def claim(self, key: bytes, relay_id: str) -> Optional[str]:
+        """Record key for relay_id unless it was seen; returns the original relay ID if so"""
+        with self._lock:
+            if self._seen(key):
+                self.rejected += 1
+                return self._recent.get(key, "")
+            if self._current.full:
+                self._previous, self._current = self._current, BloomFilter(self.capacity, self.fp_rate)
+            self._current.add(key)
+            self._forgotten.pop(key, None)
+            self._recent[key] = relay_id
+            while len(self._recent) > self.lru_size:
+                self._recent.popitem(last=False)
+            return None
+
+    def forget(self, key: bytes):
+        """The relay was never mined; let the same request through again"""
+        with self._lock:
+            self._recent.pop(key, None)
+            self._forgotten[key] = None
+            while len(self._forgotten) > self.lru_size:
+                self._forgotten.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            generations = [g for g in (self._current, self._previous) if g is not None]
+            return {
+                "keys": sum(g.count for g in generations),
+                "capacity": self.capacity,
+                "memory_bytes": sum(g.size_bytes for g in generations),
+                "recent": len(self._recent),
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,563 @@
+"""Multi-endpoint JSON-RPC provider with hedged reads, failover and circuit breakers"""
+
+import gzip
+import importlib.util
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+from web3.exceptions import ProviderConnectionError, Web3RPCError
+from web3.providers.base import JSONBaseProvider
+from web3.types import RPCEndpoint, RPCResponse
+
+from .config import config
+from .log import get_logger
+
+
+logger = get_logger("rpc")
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+# Reads on the relay critical path (canRelay, getNonce, nonces)
+HEDGED_METHODS = {"eth_call", "eth_getTransactionCount", "eth_estimateGas"}
+
+# Fanned out to several nodes so one slow mempool does not delay inclusion
+BROADCAST_METHODS = {"eth_sendRawTransaction"}
+
+# JSON-RPC error codes that mean "this node refused", not "the call failed"
+RATE_LIMIT_ERROR_CODES = {-32005, 429}
+
+# How nodes (geth, erigon, nethermind, older geth) answer a transaction they already have
+ALREADY_KNOWN_MESSAGES = ("already known", "alreadyknown", "known transaction")
+
+
+def parse_rpc_urls(value: str) -> List[Tuple[str, float]]:
+    """Parse "url|weight,url|weight" (weight optional, default 1)"""
+    endpoints = []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, weight = item.partition("|")
+        endpoints.append((url.strip(), float(weight) if weight else 1.0))
+    return endpoints
+
+
+class RateLimitedError(Exception):
+    """The node answered with a rate-limit error"""
+
+
+def rate_limited(error: BaseException) -> bool:
+    """Whether error is a node refusing the request (HTTP 429 or a rate-limit JSON-RPC error)"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code == 429
+    return isinstance(error, RateLimitedError)
+
+
+def unreachable(error: BaseException) -> bool:
+    """Whether error means the node did not answer at all (connection refused or a timeout).
+
+    Waiting for a free pooled connection is local pressure, not the node.
+    """
+    if isinstance(error, httpx.PoolTimeout):
+        return False
+    return isinstance(error, (httpx.ConnectError, httpx.TimeoutException))
+
+
+class CircuitOpenError(ConnectionError):
+    """Refused without a network call: the endpoint's circuit is open"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def already_known(error: BaseException) -> bool:
+    """Whether error is a node answering that the transaction is already in its mempool"""
+    if not isinstance(error, Web3RPCError):
+        return False
+    message = str(error).lower()
+    return any(known in message for known in ALREADY_KNOWN_MESSAGES)
+
+
+def refused(error: BaseException) -> bool:
+    """Whether the request certainly did not take effect: the node answered
+    with an error or a rate limit, or it was never sent.
+
+    A timeout or a dropped connection may follow the node acting on it, and
+    "already known" means it has.
+    """
+    if already_known(error):
+        return False
+    return isinstance(error, (Web3RPCError, CircuitOpenError)) or rate_limited(error)
+
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Closed, open or half-open state of one endpoint.
+
+    Closed lets every request through. Open refuses them without touching
+    the network for RPC_BREAKER_OPEN_SECONDS. After that the circuit is
+    half-open: up to RPC_BREAKER_HALF_OPEN_PROBES requests probe the node,
+    and the first outcome closes the circuit again or re-opens it. The
+    endpoint decides when to trip it.
+    """
+
+    def __init__(self):
+        self.state = CLOSED
+        self.open_until = 0.0
+        self.opened = 0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _half_open_if_due(self):
+        if self.state == OPEN and time.monotonic() >= self.open_until:
+            self.state = HALF_OPEN
+            self._probes = 0
+
+    @property
+    def available(self) -> bool:
+        """Whether a request would be let through right now"""
+        with self._lock:
+            self._half_open_if_due()
+            return self.state == CLOSED or (
+                self.state == HALF_OPEN and self._probes < config.rpc_breaker_half_open_probes
+            )
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the circuit half-opens (0 unless open)"""
+        return max(0.0, self.open_until - time.monotonic()) if self.state == OPEN else 0.0
+
+    def allow(self) -> bool:
+        """Admit a request, taking a probe slot when half-open"""
+        with self._lock:
+            self._half_open_if_due()
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes < config.rpc_breaker_half_open_probes:
+                self._probes += 1
+                return True
+            return False
+
+    def trip(self):
+        with self._lock:
+            if self.state != OPEN:
+                self.opened += 1
+            self.state = OPEN
+            self.open_until = time.monotonic() + config.rpc_breaker_open_seconds
+
+    def close(self) -> bool:
+        """A probe succeeded; returns whether the circuit was half-open"""
+        with self._lock:
+            if self.state != HALF_OPEN:
+                return False
+            self.state = CLOSED
+            return True
+
+
+class ConnectionPool:
+    """Bounds concurrent requests to one endpoint and measures pool pressure.
+
+    A slot is held for the whole request, so waiting for a slot is waiting
+    for a pooled connection. Sustained waits or utilization near 1 mean
+    RPC_POOL_SIZE is too small for the load.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.requests = 0
+        self.waited = 0
+        self.wait_times: deque = deque(maxlen=config.rpc_stats_window)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            if not self._slots.acquire(timeout=config.rpc_pool_timeout_seconds):
+                raise httpx.PoolTimeout("Timed out waiting for an RPC connection")
+            with self._lock:
+                self.waited += 1
+        waited = time.monotonic() - start
+        with self._lock:
+            self.requests += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.wait_times.append(waited)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self.wait_times)
+            p95 = waits[min(len(waits) - 1, int(0.95 * len(waits)))] if waits else 0.0
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "utilization": round(self.in_use / self.size, 4),
+                "requests": self.requests,
+                "waited": self.waited,
+                "p95_wait_ms": round(p95 * 1000, 2),
+            }
+
+
+class PooledHTTPProvider(JSONBaseProvider):
+    """JSON-RPC over a tuned httpx client: pooled keep-alive connections,
+    HTTP/2 when the node offers it, separate connect/read/pool timeouts and
+    optional gzip request bodies. It does not retry; the caller fails over.
+    """
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        self.pool = ConnectionPool(config.rpc_pool_size)
+        http2 = config.rpc_http2 and HTTP2_AVAILABLE
+        if config.rpc_http2 and not HTTP2_AVAILABLE:
+            logger.warning("RPC_HTTP2 is set but h2 is not installed; RPC uses HTTP/1.1", extra={"url": url})
+        self._client = httpx.Client(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=config.rpc_pool_size,
+                max_keepalive_connections=config.rpc_pool_size,
+                keepalive_expiry=config.rpc_keepalive_seconds,
+            ),
+            timeout=httpx.Timeout(
+                config.rpc_timeout_seconds,
+                connect=config.rpc_connect_timeout_seconds,
+                pool=config.rpc_pool_timeout_seconds,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+
+    def __str__(self) -> str:
+        return f"PooledHTTPProvider({self.url})"
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        body = self.encode_rpc_request(method, params)
+        headers = None
+        if 0 < config.rpc_compress_min_bytes <= len(body):
+            body = gzip.compress(body, compresslevel=1)
+            headers = {"Content-Encoding": "gzip"}
+        with self.pool.slot():
+            response = self._client.post(self.url, content=body, headers=headers)
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        try:
+            return super().is_connected(show_traceback)
+        except httpx.HTTPError as e:
+            if show_traceback:
+                raise ProviderConnectionError(f"Problem connecting to {self.url}: {e}")
+            return False
+
+    def close(self):
+        self._client.close()
+
+
+class Endpoint:
+    """A single RPC node with rolling latency and error statistics.
+
+    Its circuit opens after RPC_BREAKER_CONSECUTIVE_FAILURES requests in a
+    row that the node did not answer (connection errors and timeouts), or
+    once at least RPC_MIN_SAMPLES outcomes show an error rate above
+    RPC_BREAKER_ERROR_RATE or a p95 latency above RPC_BREAKER_LATENCY_MS,
+    so a burst of errors does not take a mostly working node out. Without
+    trips (the only node: there is nothing to fail over to) only a node
+    that stopped answering opens the circuit; errors and slow answers from
+    a live node are retried instead.
+    """
+
+    def __init__(self, url: str, weight: float = 1.0, trips: bool = True):
+        self.url = url
+        self.weight = weight
+        self.trips = trips
+        # Failover to another node instead of retrying this one
+        self.provider = PooledHTTPProvider(url)
+        self.latencies: deque = deque(maxlen=config.rpc_stats_window)
+        self.outcomes: deque = deque(maxlen=config.rpc_stats_window)
+        # Requests in a row the node did not answer
+        self.unanswered = 0
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.url!r}, weight={self.weight})"
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.available
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Latency percentile in seconds, or None without enough samples"""
+        with self._lock:
+            samples = sorted(self.latencies)
+        if len(samples) < config.rpc_min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self.outcomes:
+                return 0.0
+            return self.outcomes.count(False) / len(self.outcomes)
+
+    def record(self, latency: float, ok: bool, answered: bool = True):
+        state = self.breaker.state
+        if state == OPEN:
+            # Answers to requests sent before the circuit opened
+            return
+        if state == HALF_OPEN:
+            if not ok:
+                self.trip()
+            elif self.breaker.close():
+                logger.info("rpc circuit closed", extra={"url": self.url})
+            return
+
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.latencies.append(latency)
+            samples = len(self.outcomes)
+            self.unanswered = 0 if answered else self.unanswered + 1
+            unanswered = self.unanswered
+        if unanswered >= config.rpc_breaker_consecutive_failures:
+            self.trip()
+            return
+        if not self.trips or samples < config.rpc_min_samples:
+            return
+
+        p95 = self.percentile(0.95)
+        too_slow = p95 is not None and p95 * 1000 > config.rpc_breaker_latency_ms
+        if self.error_rate() > config.rpc_breaker_error_rate or too_slow:
+            self.trip()
+
+    def trip(self):
+        """Open the circuit: refuse requests to this node for the cool-down period"""
+        with self._lock:
+            # Start from a clean slate when it comes back
+            self.outcomes.clear()
+            self.latencies.clear()
+            self.unanswered = 0
+        self.breaker.trip()
+        logger.warning("rpc circuit opened", extra={"url": self.url, "seconds": config.rpc_breaker_open_seconds})
+
+    def request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        """Send one request, recording latency and outcome"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"{self.url} circuit is open", self.breaker.retry_after)
+        start = time.monotonic()
+        try:
+            response = self.provider.make_request(method, params)
+        except Exception as e:
+            self.record(time.monotonic() - start, False, answered=not unreachable(e))
+            raise
+        error = response.get("error")
+        if isinstance(error, dict) and error.get("code") in RATE_LIMIT_ERROR_CODES:
+            self.record(time.monotonic() - start, False)
+            raise RateLimitedError(f"{self.url} rate limited: {error.get('message')}")
+        self.record(time.monotonic() - start, True)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.percentile(0.5)
+        p95 = self.percentile(0.95)
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "error_rate": round(self.error_rate(), 4),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "pool": self.provider.pool.stats(),
+        }
+
+
+class MultiEndpointProvider(JSONBaseProvider):
+    """Spreads requests over several weighted RPC endpoints.
+
+    - Hedged reads: latency-sensitive calls go to one endpoint; if it has not
+      answered within its own p95 latency, the same call is sent to a second
+      endpoint and whichever answers first wins.
+    - Broadcasts: raw transactions are sent to several endpoints at once.
+    - Failover: a failed request is retried on another endpoint. Once
+      every endpoint has failed it, it is tried again after a backoff, up
+      to RPC_RETRIES times, unless the last one did not answer at all:
+      retrying a node that times out only multiplies the wait.
+    - Circuit breakers: endpoints that stop answering, or with a high
+      error rate or p95 latency, are refused for a cool-down period, then
+      probed. When every circuit is open, requests fail at once with
+      CircuitOpenError instead of waiting for timeouts. A single endpoint
+      only trips when it stops answering: refusing requests over a live
+      node's errors would turn them into an outage, so those are retried.
+      Broadcasts are only retried when every node rate-limited them.
+    """
+
+    def __init__(self, endpoints: List[Tuple[str, float]], **kwargs):
+        super().__init__(**kwargs)
+        if not endpoints:
+            raise ValueError("At least one RPC endpoint is required")
+        trips = len(endpoints) > 1
+        self.endpoints = [Endpoint(url, weight, trips) for url, weight in endpoints]
+        self.retries = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.rpc_max_concurrency,
+            thread_name_prefix="rpc"
+        )
+
+    def __str__(self) -> str:
+        return f"MultiEndpointProvider({', '.join(e.url for e in self.endpoints)})"
+
+    def _pick(self, exclude: Tuple[Endpoint, ...] = ()) -> Optional[Endpoint]:
+        """Weighted random choice among healthy endpoints, favouring fast ones"""
+        candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+        if not candidates:
+            return None
+
+        weights = []
+        for endpoint in candidates:
+            p50 = endpoint.percentile(0.5)
+            weights.append(endpoint.weight / max(p50 or 0.05, 0.001))
+        return random.choices(candidates, weights=weights)[0]
+
+    def _hedge_delay(self) -> float:
+        """p95 latency of the fastest healthy endpoint.
+
+        Once the primary has taken longer than the best node usually needs,
+        a second request is likely to win.
+        """
+        p95s = [e.percentile(0.95) for e in self.endpoints if e.healthy]
+        p95s = [p for p in p95s if p is not None]
+        delay = min(p95s) if p95s else config.rpc_hedge_default_ms / 1000
+        return max(delay, config.rpc_hedge_min_ms / 1000)
+
+    def retry_after(self) -> Optional[float]:
+        """None while any endpoint takes requests, else seconds until one is probed"""
+        if any(e.healthy for e in self.endpoints):
+            return None
+        return min(e.breaker.retry_after for e in self.endpoints)
+
+    def _unavailable(self) -> CircuitOpenError:
+        return CircuitOpenError("All RPC endpoints are unavailable (circuit open)", self.retry_after() or 0.0)
+
+    def make_request(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        if method in BROADCAST_METHODS:
+            return self._broadcast(method, params)
+        if method in HEDGED_METHODS and len(self.endpoints) > 1:
+            return self._hedged(method, params)
+        return self._with_failover(method, params)
+
+    def _with_failover(self, method: RPCEndpoint, params: Any, tried: Tuple[Endpoint, ...] = ()) -> RPCResponse:
+        last_error: Optional[Exception] = None
+        attempt = 0
+        while True:
+            endpoint = self._pick(exclude=tried)
+            if endpoint is None:
+                if last_error is None or attempt >= config.rpc_retries or unreachable(last_error):
+                    raise last_error or self._unavailable()
+                # Every endpoint failed it (a dropped connection, a rate limit): back off, then again
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                self.retries += 1
+                tried = ()
+                continue
+            tried += (endpoint,)
+            try:
+                return endpoint.request(method, params)
+            except Exception as e:
+                last_error = e
+
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with jitter, so retries of many callers spread out"""
+        return config.rpc_retry_backoff_ms / 1000 * 2 ** attempt * random.uniform(0.5, 1.0)
+
+    def _hedged(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        primary = self._pick()
+        if primary is None:
+            raise self._unavailable()
+        futures = {self._executor.submit(primary.request, method, params): primary}
+        done, _ = wait(futures, timeout=self._hedge_delay())
+
+        if not done or next(iter(done)).exception() is not None:
+            secondary = self._pick(exclude=(primary,))
+            if secondary is not None:
+                futures[self._executor.submit(secondary.request, method, params)] = secondary
+
+        pending = set(futures)
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+
+        # Both hedges failed: keep going through the remaining endpoints
+        try:
+            return self._with_failover(method, params, tried=tuple(futures.values()))
+        except Exception:
+            raise last_error
+
+    def _broadcast(self, method: RPCEndpoint, params: Any) -> RPCResponse:
+        attempt = 0
+        while True:
+            targets = [e for e in self.endpoints if e.healthy]
+            if not targets:
+                raise self._unavailable()
+            targets = sorted(targets, key=lambda e: e.weight, reverse=True)[:config.rpc_broadcast_fanout]
+            pending = {self._executor.submit(e.request, method, params) for e in targets}
+
+            # Prefer an accepted transaction; fall back to a node's error answer
+            error_response: Optional[RPCResponse] = None
+            errors: List[BaseException] = []
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is not None:
+                        errors.append(future.exception())
+                        continue
+                    response = future.result()
+                    if "error" not in response:
+                        return response
+                    error_response = error_response or response
+
+            if error_response is not None:
+                return error_response
+            # Only a transaction every node refused unseen is safe to send again
+            if attempt >= config.rpc_retries or not all(rate_limited(e) for e in errors):
+                raise errors[-1]
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+            self.retries += 1
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return any(e.provider.is_connected(show_traceback) for e in self.endpoints)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-endpoint health, latency and error statistics"""
+        return [e.stats() for e in self.endpoints]
+
+
+def make_provider() -> MultiEndpointProvider:
+    """Build the provider for config.rpc_urls, or config.rpc_url if unset"""
+    return MultiEndpointProvider(parse_rpc_urls(config.rpc_urls or config.rpc_url))
@@ -0,0 +1,147 @@
+"""Block-scoped cache for RPC responses"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from eth_utils.toolz import curry
+from web3.middleware.base import Web3MiddlewareBuilder
+from web3.types import RPCEndpoint, RPCResponse
+
+from .config import config
+
+
+# Never change for the life of the process
+CONSTANT_METHODS = {"eth_chainId", "net_version"}
+
+# Deterministic for a given block; cached until the next block arrives
+BLOCK_SCOPED_METHODS = {"eth_call", "eth_getBalance", "eth_getCode", "eth_gasPrice"}
+
+# Block tags whose result can change without a new block
+UNCACHEABLE_TAGS = {"pending"}
+
+
+class RPCResponseCache:
+    """Bounded LRU of RPC responses that is emptied on every new block"""
+
+    def __init__(self, max_entries: Optional[int] = None, max_age: Optional[float] = None):
+        self.max_entries = max_entries or config.rpc_cache_max_entries
+        self.max_age = max_age or config.rpc_cache_max_age_seconds
+        self.block_number: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._constants: Dict[str, RPCResponse] = {}
+        self._lock = threading.Lock()
+
+    def observe_block(self, block_number: int):
+        """Drop block-scoped entries once the chain has moved on"""
+        with self._lock:
+            if self.block_number is None or block_number > self.block_number:
+                self.block_number = block_number
+                self._entries.clear()
+
+    def get_constant(self, method: str) -> Optional[RPCResponse]:
+        with self._lock:
+            response = self._constants.get(method)
+            self._count(response is not None)
+            return response
+
+    def put_constant(self, method: str, response: RPCResponse):
+        with self._lock:
+            self._constants[method] = response
+
+    def get(self, key: str) -> Optional[RPCResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] > self.max_age:
+                del self._entries[key]
+                entry = None
+            self._count(entry is not None)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, response: RPCResponse):
+        with self._lock:
+            self._entries[key] = (response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _count(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "block_number": self.block_number,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+class BlockCacheMiddleware(Web3MiddlewareBuilder):
+    """Serves repeated reads within one block from an RPCResponseCache.
+
+    The current block is learned from eth_blockNumber responses passing
+    through the middleware (the status refresher polls it every block), so
+    the cache needs no subscription of its own. Inject it as the innermost
+    middleware (layer=0) so that it stores raw JSON-RPC responses.
+    """
+    cache: RPCResponseCache = None
+
+    @staticmethod
+    @curry
+    def build(cache: RPCResponseCache, w3) -> "BlockCacheMiddleware":
+        middleware = BlockCacheMiddleware(w3)
+        middleware.cache = cache
+        return middleware
+
+    def wrap_make_request(self, make_request):
+        cache = self.cache
+
+        def middleware(method: RPCEndpoint, params: Any) -> RPCResponse:
+            if method in CONSTANT_METHODS:
+                response = cache.get_constant(method)
+                if response is None:
+                    response = make_request(method, params)
+                    if "error" not in response:
+                        cache.put_constant(method, response)
+                return response
+
+            if method == "eth_blockNumber":
+                response = make_request(method, params)
+                if "error" not in response:
+                    cache.observe_block(int(response["result"], 16))
+                return response
+
+            if method not in BLOCK_SCOPED_METHODS or cache.block_number is None:
+                return make_request(method, params)
+            if any(param in UNCACHEABLE_TAGS for param in params[1:]):
+                return make_request(method, params)
+
+            key = json.dumps([method, params, cache.block_number], sort_keys=True, default=str)
+            response = cache.get(key)
+            if response is None:
+                response = make_request(method, params)
+                if "error" not in response:
+                    cache.put(key, response)
+            return response
+
+        return middleware
@@ -0,0 +1,117 @@
+"""Transaction signing off the event loop, and nonce-ordered submission"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+from eth_account import Account
+from eth_account.signers.local import LocalAccount
+
+from .config import config
+
+
+class Signer(ABC):
+    """Signs transactions for a fixed set of addresses.
+
+    sign_transaction returns the raw signed transaction for tx['from'].
+    Implementations can keep keys anywhere (in process, in a worker pool,
+    or behind an external signing service) as long as they answer for the
+    addresses they list.
+    """
+
+    addresses: List[str] = []
+
+    @abstractmethod
+    async def sign_transaction(self, tx: Dict[str, Any]) -> bytes:
+        """Raw signed transaction for tx['from']"""
+
+    def close(self):
+        pass
+
+
+# Keys of a process-pool worker, loaded once by its initializer
+_worker_accounts: Dict[str, LocalAccount] = {}
+
+
+def _load_worker_keys(private_keys: List[str]):
+    for key in private_keys:
+        account = Account.from_key(key)
+        _worker_accounts[account.address.lower()] = account
+
+
+def _sign_in_worker(tx: Dict[str, Any]) -> bytes:
+    return bytes(_worker_accounts[tx['from'].lower()].sign_transaction(tx).raw_transaction)
+
+
+class LocalSigner(Signer):
+    """Signs with keys held in this process, on a thread or process pool.
+
+    mode "thread" moves signing and RLP encoding off the event loop,
+    "process" also takes it off the GIL (each worker process loads the
+    keys once, at start) and "inline" signs on the calling thread.
+    """
+
+    def __init__(self, private_keys: Iterable[str], mode: Optional[str] = None, workers: Optional[int] = None):
+        keys = list(dict.fromkeys(private_keys))
+        self._accounts = {account.address.lower(): account for account in map(Account.from_key, keys)}
+        self.addresses = [account.address for account in self._accounts.values()]
+        self.mode = (mode or config.signer_mode).lower()
+        workers = workers or config.signer_workers
+
+        self._executor: Optional[Executor] = None
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tx-signer")
+        elif self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers, initializer=_load_worker_keys, initargs=(keys,)
+            )
+        elif self.mode != "inline":
+            raise ValueError(f"Unknown signer mode {self.mode!r}; use thread, process or inline")
+
+    def _sign(self, tx: Dict[str, Any]) -> bytes:
+        return bytes(self._accounts[tx['from'].lower()].sign_transaction(tx).raw_transaction)
+
+    async def sign_transaction(self, tx: Dict[str, Any]) -> bytes:
+        if tx['from'].lower() not in self._accounts:
+            raise ValueError(f"No signing key for {tx['from']}")
+        if self._executor is None:
+            return self._sign(tx)
+        sign = _sign_in_worker if self.mode == "process" else self._sign
+        return await asyncio.get_running_loop().run_in_executor(self._executor, sign, tx)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class NonceSequencer:
+    """Lets transactions reach the node in nonce order per sender.
+
+    Signing can finish out of order; a transaction waits until every lower
+    nonce this worker allocated for its sender has been sent or given up.
+    """
+
+    def __init__(self):
+        self._outstanding: Dict[str, List[int]] = {}
+        self._changed = asyncio.Condition()
+
+    def claim(self, address: str, nonce: int):
+        """Register an allocated nonce (call before anything can await)"""
+        self._outstanding.setdefault(address, []).append(nonce)
+
+    async def wait_turn(self, address: str, nonce: int):
+        async with self._changed:
+            await self._changed.wait_for(lambda: min(self._outstanding[address]) == nonce)
+
+    async def done(self, address: str, nonce: int):
+        """The nonce was sent or released; wake the next in line"""
+        outstanding = self._outstanding[address]
+        outstanding.remove(nonce)
+        if not outstanding:
+            del self._outstanding[address]
+        async with self._changed:
+            self._changed.notify_all()
+
+    def pending(self) -> int:
+        return sum(len(nonces) for nonces in self._outstanding.values())
@@ -0,0 +1,110 @@
+"""Background refresher that keeps relay status in memory"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from .config import config
+from .log import get_logger
+
+
+logger = get_logger("status")
+
+
+@dataclass
+class StatusSnapshot:
+    """Relay state as of a given block"""
+    chain_id: int
+    block_number: int
+    relay: Dict[str, Any]
+    balance: int
+    updated_at: float
+
+
+class StatusRefresher:
+    """Polls the chain once per block and caches relay state, stake and balance.
+
+    Health and status endpoints read from the cached snapshot so that probes
+    never trigger RPC calls of their own.
+    """
+
+    def __init__(self, relayer, poll_interval: Optional[float] = None, max_age: Optional[float] = None):
+        self.relayer = relayer
+        self.poll_interval = poll_interval or config.status_poll_interval_seconds
+        self.max_age = max_age or config.status_max_age_seconds
+
+        self.snapshot: Optional[StatusSnapshot] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self._stale = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background polling task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background polling task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def request_refresh(self):
+        """Force a full refresh on the next poll, e.g. after staking"""
+        self._stale = True
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the chain was last successfully polled"""
+        if self.last_checked is None:
+            return None
+        return time.monotonic() - self.last_checked
+
+    @property
+    def is_fresh(self) -> bool:
+        """Whether the cached state is recent enough to serve"""
+        age = self.age
+        return self.snapshot is not None and age is not None and age <= self.max_age
+
+    async def refresh(self):
+        """Poll the latest block and refresh the snapshot if it changed"""
+        if not self.relayer.is_connected:
+            await asyncio.to_thread(self.relayer.connect)
+        block_number = await asyncio.to_thread(lambda: self.relayer.w3.eth.block_number)
+        if self._stale or self.snapshot is None or self.snapshot.block_number != block_number:
+            self._stale = False
+            self.snapshot = await asyncio.to_thread(self._fetch, block_number)
+            await asyncio.to_thread(self.relayer.on_new_block, block_number)
+        self.last_checked = time.monotonic()
+        self.last_error = None
+
+    def _fetch(self, block_number: int) -> StatusSnapshot:
+        relay_info = self.relayer.relay_hub.functions.getRelay(self.relayer.address).call(
+            block_identifier=block_number
+        )
+        balance = self.relayer.w3.eth.get_balance(self.relayer.address, block_number)
+
+        return StatusSnapshot(
+            chain_id=self.relayer.chain_id,
+            block_number=block_number,
+            relay=self.relayer.format_relay_info(relay_info),
+            balance=balance,
+            updated_at=time.time()
+        )
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                if str(e) != self.last_error:
+                    logger.warning("status refresh failed", extra={"error": str(e)})
+                self.last_error = str(e)
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,390 @@
+"""SQLite-backed state shared by all relayer worker processes"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .config import config
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nonces (
+    address TEXT PRIMARY KEY,
+    next_nonce INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS released_nonces (
+    address TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    PRIMARY KEY (address, nonce)
+);
+CREATE TABLE IF NOT EXISTS allocated_nonces (
+    address TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    pid INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (address, nonce)
+);
+CREATE TABLE IF NOT EXISTS inflight (
+    relay_id TEXT PRIMARY KEY,
+    relayer TEXT NOT NULL,
+    nonce INTEGER NOT NULL,
+    user TEXT NOT NULL,
+    user_nonce INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS inflight_user ON inflight (user, user_nonce);
+CREATE TABLE IF NOT EXISTS deposit_reservations (
+    relay_id TEXT PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    amount TEXT NOT NULL,
+    mined_block INTEGER,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS deposit_reservations_recipient ON deposit_reservations (recipient);
+CREATE TABLE IF NOT EXISTS relay_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    relay_id TEXT NOT NULL,
+    event TEXT NOT NULL,
+    data TEXT NOT NULL,
+    origin INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS relay_events_relay ON relay_events (relay_id, id);
+"""
+
+
+def _alive(pid: int) -> bool:
+    """Whether a (worker) process with this pid is running on this host"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RelayStore:
+    """Cross-process nonce allocator and in-flight relay registry.
+
+    Every worker opens the same SQLite database; write transactions use
+    BEGIN IMMEDIATE, which takes the database write lock up front, so nonce
+    allocation is serialized across processes without a separate lock file.
+
+    The methods block (a writer may wait for another worker's transaction);
+    coroutines go through run(), which uses a thread of the store's own.
+    """
+
+    def __init__(self, path: Optional[str] = None, timeout: Optional[float] = None):
+        self.path = path or config.state_db_path
+        self.timeout = timeout or config.state_db_timeout_seconds
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+
+    async def run(self, method, *args):
+        """Call a store method off the event loop.
+
+        One thread per process is enough: calls are serialized by the
+        connection lock anyway, and a writer waiting on the database lock
+        holds neither the loop nor a default-executor thread.
+        """
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="relay-store")
+            self._executor_pid = os.getpid()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, method, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not be shared across fork()ed workers
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None,
+                check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _write(self, fn):
+        """Run fn(conn) inside an immediate (write-locked) transaction"""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            return result
+
+    def _read(self, sql: str, params=()) -> List[tuple]:
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def allocate_nonce(self, address: str, chain_nonce: int) -> int:
+        """Reserve the next transaction nonce for address.
+
+        chain_nonce is the node's pending transaction count; it wins if it is
+        ahead of the stored counter (e.g. after transactions sent elsewhere).
+        Nonces released after a failed send are reused first.
+
+        Each allocation is recorded until the node counts it or it is
+        released. Once none are left (a worker that died between allocating
+        and sending leaves its record to no one) and no in-flight relay
+        holds a nonce the node has not counted, the counter restarts from
+        chain_nonce, so a nonce that was never sent does not leave a gap
+        forever.
+        """
+        address = address.lower()
+
+        def allocate(conn):
+            nonce = self._next_nonce(conn, address, chain_nonce)
+            conn.execute(
+                "INSERT OR REPLACE INTO allocated_nonces (address, nonce, pid, created_at) VALUES (?, ?, ?, ?)",
+                (address, nonce, os.getpid(), time.time())
+            )
+            return nonce
+
+        return self._write(allocate)
+
+    def _next_nonce(self, conn: sqlite3.Connection, address: str, chain_nonce: int) -> int:
+        conn.execute(
+            "DELETE FROM released_nonces WHERE address = ? AND nonce < ?",
+            (address, chain_nonce)
+        )
+        conn.execute(
+            "DELETE FROM allocated_nonces WHERE address = ? AND (nonce < ? OR created_at < ?)",
+            (address, chain_nonce, time.time() - config.inflight_max_age_seconds)
+        )
+        outstanding = False
+        for nonce, pid in conn.execute(
+            "SELECT nonce, pid FROM allocated_nonces WHERE address = ?", (address,)
+        ).fetchall():
+            if _alive(pid):
+                outstanding = True
+            else:
+                conn.execute(
+                    "DELETE FROM allocated_nonces WHERE address = ? AND nonce = ?", (address, nonce)
+                )
+        unseen = conn.execute(
+            "SELECT 1 FROM inflight WHERE relayer = ? AND nonce >= ?", (address, chain_nonce)
+        ).fetchone()
+        if not outstanding and unseen is None:
+            # Nothing of ours the node does not know about: it is the truth
+            conn.execute("DELETE FROM released_nonces WHERE address = ?", (address,))
+            conn.execute(
+                "INSERT INTO nonces (address, next_nonce) VALUES (?, ?) "
+                "ON CONFLICT(address) DO UPDATE SET next_nonce = excluded.next_nonce",
+                (address, chain_nonce + 1)
+            )
+            return chain_nonce
+
+        row = conn.execute(
+            "SELECT MIN(nonce) FROM released_nonces WHERE address = ?", (address,)
+        ).fetchone()
+        if row[0] is not None:
+            conn.execute(
+                "DELETE FROM released_nonces WHERE address = ? AND nonce = ?",
+                (address, row[0])
+            )
+            return row[0]
+
+        row = conn.execute(
+            "SELECT next_nonce FROM nonces WHERE address = ?", (address,)
+        ).fetchone()
+        nonce = max(row[0] if row else 0, chain_nonce)
+        conn.execute(
+            "INSERT INTO nonces (address, next_nonce) VALUES (?, ?) "
+            "ON CONFLICT(address) DO UPDATE SET next_nonce = excluded.next_nonce",
+            (address, nonce + 1)
+        )
+        return nonce
+
+    def release_nonce(self, address: str, nonce: int):
+        """Return a nonce whose transaction was never broadcast"""
+        address = address.lower()
+
+        def release(conn):
+            conn.execute(
+                "DELETE FROM allocated_nonces WHERE address = ? AND nonce = ?", (address, nonce)
+            )
+            row = conn.execute(
+                "SELECT next_nonce FROM nonces WHERE address = ?", (address,)
+            ).fetchone()
+            if row and row[0] == nonce + 1:
+                conn.execute(
+                    "UPDATE nonces SET next_nonce = ? WHERE address = ?", (nonce, address)
+                )
+            else:
+                conn.execute(
+                    "INSERT OR IGNORE INTO released_nonces (address, nonce) VALUES (?, ?)",
+                    (address, nonce)
+                )
+
+        self._write(release)
+
+    def claim_user_nonce(self, relay_id: str, relayer: str, user: str, user_nonce: int) -> bool:
+        """Record user_nonce of user as being relayed, before the relay is sent.
+
+        Returns False if another relay already holds it. The record has
+        nonce -1 and no tx_hash until add_inflight completes it;
+        finish_inflight removes it if the relay is not sent.
+        """
+        def claim(conn):
+            row = conn.execute(
+                "SELECT 1 FROM inflight WHERE user = ? AND user_nonce = ? AND relay_id != ?",
+                (user.lower(), user_nonce, relay_id)
+            ).fetchone()
+            if row is not None:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO inflight "
+                "(relay_id, relayer, nonce, user, user_nonce, tx_hash, created_at) "
+                "VALUES (?, ?, -1, ?, ?, '', ?)",
+                (relay_id, relayer.lower(), user.lower(), user_nonce, time.time())
+            )
+            return True
+
+        return self._write(claim)
+
+    def add_inflight(self, relay_id: str, relayer: str, nonce: int, user: str, user_nonce: int, tx_hash: str):
+        """Record a broadcast relay transaction that has not been mined yet"""
+        self._write(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO inflight "
+            "(relay_id, relayer, nonce, user, user_nonce, tx_hash, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (relay_id, relayer.lower(), nonce, user.lower(), user_nonce, tx_hash, time.time())
+        ))
+
+    def finish_inflight(self, relay_id: str):
+        """Forget a relay once it has been mined or has failed"""
+        self._write(lambda conn: conn.execute(
+            "DELETE FROM inflight WHERE relay_id = ?", (relay_id,)
+        ))
+
+    def expire_inflight(self, max_age: Optional[float] = None) -> int:
+        """Drop in-flight records left behind by crashed workers"""
+        cutoff = time.time() - (max_age or config.inflight_max_age_seconds)
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM inflight WHERE created_at < ?", (cutoff,)
+        ).rowcount)
+
+    @staticmethod
+    def _reserved(conn: sqlite3.Connection, recipient: str, balance_block: int) -> int:
+        # Amounts are wei and may not fit SQLite's 64-bit integers
+        return sum(int(amount) for amount, in conn.execute(
+            "SELECT amount FROM deposit_reservations "
+            "WHERE recipient = ? AND (mined_block IS NULL OR mined_block > ?)",
+            (recipient, balance_block)
+        ))
+
+    def reserved_deposit(self, recipient: str, balance_block: int) -> int:
+        """What relays of all workers may still charge recipient beyond a balance read at balance_block"""
+        with self._lock:
+            return self._reserved(self._connection(), recipient.lower(), balance_block)
+
+    def reserve_deposit(self, relay_id: str, recipient: str, amount: int, balance: int, balance_block: int) -> bool:
+        """Reserve amount of recipient's deposit (balance, read at balance_block) for relay_id.
+
+        Returns False if the reservations of all workers would exceed it.
+        """
+        recipient = recipient.lower()
+
+        def reserve(conn):
+            if balance - self._reserved(conn, recipient, balance_block) < amount:
+                return False
+            conn.execute(
+                "INSERT OR REPLACE INTO deposit_reservations (relay_id, recipient, amount, mined_block, created_at) "
+                "VALUES (?, ?, ?, NULL, ?)",
+                (relay_id, recipient, str(amount), time.time())
+            )
+            return True
+
+        return self._write(reserve)
+
+    def settle_deposit(self, relay_id: str, block_number: int):
+        """Mark a reservation as charged in block_number"""
+        self._write(lambda conn: conn.execute(
+            "UPDATE deposit_reservations SET mined_block = ? WHERE relay_id = ?", (block_number, relay_id)
+        ))
+
+    def release_deposit(self, relay_id: str):
+        """Drop the reservation of a relay that was never sent or never mined"""
+        self._write(lambda conn: conn.execute(
+            "DELETE FROM deposit_reservations WHERE relay_id = ?", (relay_id,)
+        ))
+
+    def expire_deposits(self, settled_before: int, max_age: Optional[float] = None) -> int:
+        """Drop reservations settled before a block, and those left behind by crashed workers"""
+        cutoff = time.time() - (max_age or config.inflight_max_age_seconds)
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM deposit_reservations WHERE mined_block < ? OR created_at < ?", (settled_before, cutoff)
+        ).rowcount)
+
+    def deposit_reservations(self) -> int:
+        return self._read("SELECT COUNT(*) FROM deposit_reservations")[0][0]
+
+    def add_events(self, events: List[tuple]) -> List[int]:
+        """Append (relay_id, event, data) lifecycle events in one transaction.
+
+        Returns their ids, which increase across workers.
+        """
+        origin, now = os.getpid(), time.time()
+
+        def add(conn):
+            return [
+                conn.execute(
+                    "INSERT INTO relay_events (relay_id, event, data, origin, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (relay_id, event, data, origin, now)
+                ).lastrowid
+                for relay_id, event, data in events
+            ]
+
+        return self._write(add)
+
+    def events_since(self, last_id: int, limit: int = 1000) -> List[tuple]:
+        """(id, relay_id, event, data, origin) rows after last_id, oldest first"""
+        return self._read(
+            "SELECT id, relay_id, event, data, origin FROM relay_events WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, limit)
+        )
+
+    def relay_events(self, relay_id: str) -> List[tuple]:
+        """All stored events of one relay, oldest first"""
+        return self._read(
+            "SELECT id, relay_id, event, data, origin FROM relay_events WHERE relay_id = ? ORDER BY id",
+            (relay_id,)
+        )
+
+    def last_event_id(self) -> int:
+        return self._read("SELECT COALESCE(MAX(id), 0) FROM relay_events")[0][0]
+
+    def expire_events(self, max_age: Optional[float] = None) -> int:
+        """Drop events of relays that finished long ago"""
+        cutoff = time.time() - (max_age or config.events_max_age_seconds)
+        return self._write(lambda conn: conn.execute(
+            "DELETE FROM relay_events WHERE created_at < ?", (cutoff,)
+        ).rowcount)
+
+    def inflight(self, user: Optional[str] = None) -> List[Dict[str, Any]]:
+        """List in-flight relays, optionally only those for one user"""
+        columns = ["relay_id", "relayer", "nonce", "user", "user_nonce", "tx_hash", "created_at"]
+        sql = f"SELECT {', '.join(columns)} FROM inflight"
+        params: tuple = ()
+        if user is not None:
+            sql += " WHERE user = ?"
+            params = (user.lower(),)
+        return [dict(zip(columns, row)) for row in self._read(sql + " ORDER BY nonce", params)]
@@ -0,0 +1,132 @@
+"""In-memory checks run on relay requests before any RPC call"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from .config import config
+
+
+UINT256_MAX = 2 ** 256 - 1
+SIGNATURE_LENGTH = 65
+
+
+class RelayRequestError(ValueError):
+    """A relay request was rejected; code is a stable machine-readable reason"""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _check_address(relay_request: Dict[str, Any], field: str):
+    value = relay_request.get(field)
+    if not isinstance(value, str) or not Web3.is_address(value):
+        raise RelayRequestError("INVALID_ADDRESS", f"{field} is not a valid address: {value!r}")
+    digits = value[2:]
+    if digits != digits.lower() and digits != digits.upper() and not Web3.is_checksum_address(value):
+        raise RelayRequestError("INVALID_ADDRESS", f"{field} has an invalid checksum: {value!r}")
+    # Contract calls only accept checksummed addresses
+    relay_request[field] = Web3.to_checksum_address(value)
+
+
+def _check_hex(relay_request: Dict[str, Any], field: str, length: Optional[int] = None) -> bytes:
+    value = relay_request.get(field)
+    try:
+        if not isinstance(value, (str, bytes)):
+            raise ValueError
+        data = HexBytes(value)
+    except ValueError:
+        raise RelayRequestError("INVALID_HEX", f"{field} is not valid hex data")
+    if length is not None and len(data) != length:
+        raise RelayRequestError("INVALID_HEX", f"{field} must be {length} bytes, got {len(data)}")
+    return data
+
+
+def _check_uint(relay_request: Dict[str, Any], field: str) -> int:
+    value = relay_request.get(field)
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= UINT256_MAX:
+        raise RelayRequestError("INVALID_INTEGER", f"{field} must be a uint256, got {value!r}")
+    return value
+
+
+def check_format(relay_request: Dict[str, Any]):
+    """Addresses, hex fields and integers are well formed; addresses are checksummed in place"""
+    _check_address(relay_request, 'from')
+    _check_address(relay_request, 'to')
+    _check_hex(relay_request, 'encodedFunction')
+    _check_hex(relay_request, 'signature', SIGNATURE_LENGTH)
+    _check_hex(relay_request, 'approvalData')
+    for field in ('transactionFee', 'gasPrice', 'gasLimit', 'nonce'):
+        _check_uint(relay_request, field)
+
+
+def check_limits(relay_request: Dict[str, Any], network_gas_price: Optional[int] = None):
+    """gasLimit, gasPrice and transactionFee are within what we relay"""
+    gas_limit = relay_request['gasLimit']
+    if gas_limit == 0:
+        raise RelayRequestError("GAS_LIMIT_TOO_LOW", "gasLimit must be greater than zero")
+    if gas_limit > config.max_relay_gas_limit:
+        raise RelayRequestError(
+            "GAS_LIMIT_TOO_HIGH", f"gasLimit {gas_limit} exceeds the maximum of {config.max_relay_gas_limit}"
+        )
+
+    gas_price = relay_request['gasPrice']
+    max_gas_price = Web3.to_wei(config.max_gas_price_gwei, 'gwei')
+    if gas_price > max_gas_price:
+        raise RelayRequestError(
+            "GAS_PRICE_TOO_HIGH", f"gasPrice {gas_price} exceeds the maximum of {max_gas_price}"
+        )
+    if network_gas_price is not None:
+        # A price far below the network's would not be mined. The network price
+        # is cached per block and may have risen since the client read it.
+        min_gas_price = int(network_gas_price * (100 - config.gas_price_tolerance_percent) // 100)
+        if gas_price < min_gas_price:
+            raise RelayRequestError(
+                "GAS_PRICE_TOO_LOW",
+                f"gasPrice {gas_price} is below the minimum of {min_gas_price} "
+                f"(network gas price {network_gas_price})"
+            )
+
+    if relay_request['transactionFee'] < config.relay_fee_percentage:
+        raise RelayRequestError(
+            "FEE_TOO_LOW",
+            f"transactionFee {relay_request['transactionFee']} is below the relay fee of {config.relay_fee_percentage}"
+        )
+
+
+def check_nonce(relay_request: Dict[str, Any], known_nonce: Optional[int] = None):
+    """The RelayHub nonce has not already been used"""
+    if known_nonce is not None and relay_request['nonce'] < known_nonce:
+        raise RelayRequestError(
+            "NONCE_TOO_LOW", f"nonce {relay_request['nonce']} has been used; the next nonce is {known_nonce}"
+        )
+
+
+class NonceCache:
+    """Highest RelayHub nonce seen per user.
+
+    RelayHub nonces only ever increase, so a cached value never becomes
+    wrong, only behind; it is safe to reject anything below it.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries or config.nonce_cache_size
+        self._nonces: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, address: str) -> Optional[int]:
+        with self._lock:
+            return self._nonces.get(address.lower())
+
+    def observe(self, address: str, nonce: int):
+        """Record that address's next RelayHub nonce is at least nonce"""
+        address = address.lower()
+        with self._lock:
+            self._nonces[address] = max(nonce, self._nonces.get(address, 0))
+            self._nonces.move_to_end(address)
+            while len(self._nonces) > self.max_entries:
+                self._nonces.popitem(last=False)
@@ -0,0 +1,97 @@
+"""Test configuration: src.config reads the environment once, at import"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+STATE_DIR = tempfile.mkdtemp(prefix="gsn-relayer-tests-")
+
+os.environ.setdefault("RPC_URL", "http://127.0.0.1:1")
+os.environ.setdefault("RELAYER_PRIVATE_KEY", "0x" + "11" * 32)
+os.environ.setdefault("STATE_DB_PATH", os.path.join(STATE_DIR, "state.db"))
+
+import asyncio  # noqa: E402
+import json  # noqa: E402
+
+import pytest  # noqa: E402
+from web3.providers import JSONBaseProvider  # noqa: E402
+
+from benchmarks.rpc_faults import GAS_PRICE, RECIPIENT, Faults, FakeChain  # noqa: E402
+from src.client import sign_relay_request  # noqa: E402
+from src.config import config  # noqa: E402
+
+
+class FakeChainProvider(JSONBaseProvider):
+    """Answers JSON-RPC from the benchmark's FakeChain, in process"""
+
+    def __init__(self, chain: FakeChain):
+        super().__init__()
+        self.chain = chain
+        # Methods that fail as if the node were unreachable
+        self.failing = set()
+
+    def make_request(self, method, params):
+        if method in self.failing:
+            raise ConnectionError(f"{method}: node unreachable")
+        # Round-trip through JSON so the chain sees what a node would
+        request = json.loads(self.encode_rpc_request(method, params))
+        return {"jsonrpc": "2.0", "id": request["id"], **self.chain.handle(method, request["params"])}
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+@pytest.fixture
+def chain():
+    return FakeChain(Faults(mine_delay_s=0.2))
+
+
+@pytest.fixture
+def relayer(chain, tmp_path, monkeypatch):
+    """A connected relayer with its own state database, relaying to the fake chain"""
+    from src.relayer import GSNRelayer
+
+    monkeypatch.setattr(config, "state_db_path", str(tmp_path / "relayer.db"))
+    monkeypatch.setattr(config, "receipt_poll_interval_seconds", 0.05)
+    relayer = GSNRelayer()
+    relayer.w3.provider = FakeChainProvider(chain)
+    relayer.connect()
+    relayer.on_new_block(chain.block_number())
+    yield relayer
+    relayer.signer.close()
+
+
+@pytest.fixture
+def signed_request(relayer):
+    """Factory of relay requests to the fake recipient, signed by account"""
+
+    def sign(account, nonce: int, gas_limit: int = 100000):
+        relay_request = {
+            'from': account.address, 'to': RECIPIENT, 'encodedFunction': b"\x12\x34\x56\x78",
+            'transactionFee': config.relay_fee_percentage, 'gasPrice': GAS_PRICE, 'gasLimit': gas_limit,
+            'nonce': nonce, 'approvalData': b"",
+        }
+        relay_request['signature'] = sign_relay_request(
+            account, relay_request, config.relay_hub_address, relayer.address
+        )
+        return relay_request
+
+    return sign
+
+
+@pytest.fixture
+def settle(relayer):
+    """Coroutine waiting for the relayer's background receipt waits; returns their exceptions"""
+
+    async def wait():
+        errors = []
+        while relayer._background:
+            results = await asyncio.gather(*list(relayer._background), return_exceptions=True)
+            errors += [result for result in results if isinstance(result, Exception)]
+        return errors
+
+    return wait
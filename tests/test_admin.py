@@ -0,0 +1,25 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from src.api import server
+from src.config import config
+
+
+@pytest.mark.parametrize("path", ["/stats", "/debug/profile"])
+def test_admin_endpoints_need_the_token(monkeypatch, path):
+    # No lifespan: the relayer is never started, so only the dependency runs
+    client = TestClient(server.app)
+
+    monkeypatch.setattr(config, "admin_token", "")
+    assert client.get(path, headers={"Authorization": "Bearer anything"}).status_code == 404
+
+    monkeypatch.setattr(config, "admin_token", "secret")
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": "Basic secret"}).status_code == 401
+
+
+def test_admin_token_is_accepted(monkeypatch):
+    monkeypatch.setattr(config, "admin_token", "secret")
+    server.require_admin("Bearer secret")
+    server.require_admin("bearer secret")
@@ -0,0 +1,57 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from eth_account import Account
+from eth_account.messages import encode_defunct
+
+from src.client import PROXY_WALLET_FACTORY_ADDRESS, RELAY_HUB_ADDRESS, RelayClient
+from src.encoders import PROXY_SELECTOR, encode_proxy_calls, erc20_approve_calls, relay_request_digest
+
+
+RELAY_ADDRESS = "0x" + "33" * 20
+GAS_PRICE = 30 * 10 ** 9
+
+
+def test_importing_the_client_does_not_load_server_settings():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    check = "import sys, src.client; print('src.config' in sys.modules, 'dotenv' in sys.modules)"
+    output = subprocess.run([sys.executable, "-c", check], cwd=root, capture_output=True, text=True, check=True)
+    assert output.stdout.split() == ["False", "False"]
+
+
+def test_prepare_proxy_wallet_signs_the_proxy_call(monkeypatch):
+    account = Account.create()
+    calls = erc20_approve_calls([("0x" + "44" * 20, "0x" + "55" * 20, 2 ** 256 - 1)])
+    client = RelayClient("http://relayer")
+
+    async def quote(*args, **kwargs):
+        return {'gas_price': GAS_PRICE, 'transaction_fee': 10}
+
+    async def nonce(address):
+        return 7
+
+    async def relay_address():
+        return RELAY_ADDRESS
+
+    monkeypatch.setattr(client, "quote", quote)
+    monkeypatch.setattr(client, "nonce", nonce)
+    monkeypatch.setattr(client, "relay_address", relay_address)
+
+    async def prepare():
+        try:
+            return await client.prepare_proxy_wallet(account, calls)
+        finally:
+            await client.close()
+
+    relay_request = asyncio.run(prepare())
+    assert relay_request['to'] == PROXY_WALLET_FACTORY_ADDRESS
+    assert relay_request['encodedFunction'] == PROXY_SELECTOR + encode_proxy_calls(calls)
+    assert (relay_request['gasLimit'], relay_request['gasPrice']) == (800000, GAS_PRICE)
+    assert (relay_request['transactionFee'], relay_request['nonce']) == (10, 7)
+
+    # The signature is what RelayHub (and the relayer) recover the user from
+    digest = relay_request_digest(relay_request, RELAY_HUB_ADDRESS, RELAY_ADDRESS)
+    signer = Account.recover_message(encode_defunct(digest), signature=relay_request['signature'])
+    assert signer == account.address
@@ -0,0 +1,204 @@
+import asyncio
+
+import pytest
+from eth_account import Account
+
+from benchmarks.rpc_faults import RECIPIENT
+from src.config import config
+from src.deposits import SETTLED_KEEP_BLOCKS, DepositCache, max_possible_charge
+from src.receipts import TransactionDropped
+from src.store import RelayStore
+from src.validation import RelayRequestError
+
+
+OTHER = "0x" + "44" * 20
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RelayStore(str(tmp_path / "state.db"))
+
+
+def test_reservations_cannot_overcommit_a_deposit(store):
+    deposits = DepositCache(store)
+    # Unknown deposits are never reserved against
+    assert not deposits.reserve(RECIPIENT, "a", 1)
+
+    deposits.load(RECIPIENT, 100, block_number=10)
+    assert deposits.reserve(RECIPIENT.upper().replace("0X", "0x"), "a", 60)
+    assert not deposits.reserve(RECIPIENT, "b", 50)
+    assert deposits.reserve(RECIPIENT, "b", 40)
+    assert deposits.available(RECIPIENT) == 0
+    assert deposits.available(OTHER) is None
+    assert deposits.stats() == {"recipients": 1, "reservations": 2, "rejections": 1}
+
+    deposits.release("a")
+    deposits.release("a")
+    assert deposits.available(RECIPIENT) == 60
+
+
+def test_settled_charge_is_kept_until_a_later_balance_read(store):
+    deposits = DepositCache(store)
+    deposits.load(RECIPIENT, 100, block_number=10)
+    deposits.reserve(RECIPIENT, "a", 30)
+    deposits.settle("a", block_number=12)
+
+    # Read before the relay was mined: the charge is not in the balance yet
+    deposits.refresh(11, lambda recipient: 100)
+    assert deposits.available(RECIPIENT) == 70
+    # Read at the block it was mined in: the balance has paid for it
+    deposits.refresh(12, lambda recipient: 80)
+    assert deposits.available(RECIPIENT) == 80
+    # Kept a while for workers whose balances were read before block 12
+    deposits.refresh(12 + SETTLED_KEEP_BLOCKS, lambda recipient: 80)
+    assert deposits.stats()["reservations"] == 1
+    deposits.refresh(13 + SETTLED_KEEP_BLOCKS, lambda recipient: 80)
+    assert deposits.stats()["reservations"] == 0
+
+
+def test_workers_share_the_reservations(store):
+    # Two worker processes, each with its own cached balance
+    first, second = DepositCache(store), DepositCache(RelayStore(store.path))
+    first.load(RECIPIENT, 100, block_number=10)
+    second.load(RECIPIENT, 100, block_number=11)
+
+    assert first.reserve(RECIPIENT, "a", 60)
+    assert not second.reserve(RECIPIENT, "b", 60)
+    assert second.available(RECIPIENT) == 40
+    first.settle("a", block_number=11)
+    # Mined at 11: already paid out of the second worker's balance, not of the first's
+    assert first.available(RECIPIENT) == 40
+    assert second.available(RECIPIENT) == 100
+
+    second.release("a")
+    assert first.available(RECIPIENT) == 100
+
+
+def test_large_amounts_are_summed_exactly(store):
+    deposits = DepositCache(store)
+    deposits.load(RECIPIENT, 3 * 10 ** 24 + 1, block_number=10)
+    assert deposits.reserve(RECIPIENT, "a", 10 ** 24)
+    assert deposits.reserve(RECIPIENT, "b", 2 * 10 ** 24)
+    assert deposits.available(RECIPIENT) == 1
+
+
+def test_failed_refresh_keeps_the_balance_and_older_loads_are_ignored(store):
+    deposits = DepositCache(store)
+    deposits.load(RECIPIENT, 100, block_number=10)
+    deposits.load(RECIPIENT, 500, block_number=9)
+    assert deposits.available(RECIPIENT) == 100
+
+    def fetch(recipient):
+        raise ConnectionError("node unreachable")
+
+    deposits.refresh(11, fetch)
+    assert deposits.available(RECIPIENT) == 100
+
+
+def test_unsettled_reservations_expire_with_the_inflight_records(store, monkeypatch):
+    deposits = DepositCache(store)
+    deposits.load(RECIPIENT, 100, block_number=10)
+    deposits.reserve(RECIPIENT, "a", 30)
+    monkeypatch.setattr(config, "inflight_max_age_seconds", -1)
+    deposits.refresh(11, lambda recipient: 100)
+    assert deposits.available(RECIPIENT) == 100
+
+
+def test_relay_beyond_the_deposit_is_rejected(relayer, signed_request):
+    first, second = Account.create(), Account.create()
+    relay_request = signed_request(first, 0)
+    charge = max_possible_charge(
+        relay_request['gasLimit'], relay_request['gasPrice'], relay_request['transactionFee']
+    )
+    relayer.deposits.load(RECIPIENT, charge * 3 // 2, relayer.rpc_cache.block_number)
+
+    async def scenario():
+        await relayer.relay_call(relay_request, wait=False)
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(signed_request(second, 0), wait=False)
+        assert error.value.code == "RECIPIENT_BALANCE_TOO_LOW"
+        assert relayer.deposits.available(RECIPIENT) == charge // 2
+
+    asyncio.run(scenario())
+
+
+class Reject:
+    """Ways a relay fails after its deposit was reserved; each returns how many relays still hold some"""
+
+    @staticmethod
+    async def replayed(relayer, chain, relay_request):
+        # Both pass validation while the first reads the deposit; the claim rejects one
+        results = await asyncio.gather(
+            relayer.relay_call(relay_request, wait=False), relayer.relay_call(dict(relay_request), wait=False),
+            return_exceptions=True
+        )
+        assert [getattr(result, 'code', None) for result in results].count("REPLAYED") == 1
+        return 1
+
+    @staticmethod
+    async def nonce_pending(relayer, chain, relay_request):
+        await relayer.store.run(
+            relayer.store.claim_user_nonce, "other", relayer.address, relay_request['from'], relay_request['nonce']
+        )
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(relay_request, wait=False)
+        assert error.value.code == "NONCE_PENDING"
+        return 0
+
+    @staticmethod
+    async def recipient_refuses(relayer, chain, relay_request):
+        chain.accept_status = 11
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(relay_request, wait=False)
+        assert error.value.code == "CANNOT_RELAY"
+        return 0
+
+    @staticmethod
+    async def node_refuses(relayer, chain, relay_request):
+        chain.send_raw_transaction = lambda raw: {"error": {"code": -32000, "message": "insufficient funds"}}
+        with pytest.raises(Exception, match="insufficient funds"):
+            await relayer.relay_call(relay_request, wait=False)
+        return 0
+
+    @staticmethod
+    async def send_times_out(relayer, chain, relay_request):
+        # The node may have it, so the reservation is kept until it is found dropped
+        relayer.receipts.dropped_after = 0
+        relayer.receipts.confirm = 0
+        relayer.w3.provider.failing.add("eth_sendRawTransaction")
+        await relayer.relay_call(relay_request, wait=False)
+        assert relayer.deposits.stats()["reservations"] == 1
+        results = await asyncio.gather(*list(relayer._background), return_exceptions=True)
+        assert [type(result) for result in results] == [TransactionDropped]
+        return 0
+
+    @staticmethod
+    async def dropped(relayer, chain, relay_request):
+        relayer.receipts.dropped_after = 0
+        relayer.receipts.confirm = 0
+        sender = relayer.address.lower()
+        task = asyncio.create_task(relayer.relay_call(relay_request, wait=True))
+        while not chain.mempool.get(sender):
+            await asyncio.sleep(0.01)
+        with chain.lock:
+            chain.mempool[sender].clear()
+        with pytest.raises(TransactionDropped):
+            await asyncio.wait_for(task, 5)
+        return 0
+
+
+@pytest.mark.parametrize("fail", [
+    Reject.replayed, Reject.nonce_pending, Reject.recipient_refuses, Reject.node_refuses, Reject.send_times_out,
+    Reject.dropped
+], ids=lambda fail: fail.__name__)
+def test_failed_relays_release_their_reservation(relayer, chain, signed_request, settle, fail):
+    relay_request = signed_request(Account.create(), 0)
+    charge = max_possible_charge(relay_request['gasLimit'], relay_request['gasPrice'], relay_request['transactionFee'])
+
+    async def scenario():
+        held = await fail(relayer, chain, relay_request)
+        assert relayer.deposits.stats()["reservations"] == held
+        assert relayer.deposits.available(RECIPIENT) == 10 ** 24 - held * charge
+        await asyncio.wait_for(settle(), 5)
+
+    asyncio.run(scenario())
@@ -0,0 +1,95 @@
+import pytest
+from eth_abi import encode
+from web3 import Web3
+
+from src.abis import PROXY_WALLET_FACTORY_ABI
+from src.encoders import (
+    PROXY_SELECTOR, ProxyCallEncoder, encode_erc20_approve_batch, encode_erc1155_set_approval_for_all_batch,
+    encode_proxy_calls
+)
+
+
+ADDRESS = "0x" + "ab" * 20
+UINT256_MAX = 2 ** 256 - 1
+
+
+def call(data: bytes, value: int = 0, type_code: int = 2, to: str = ADDRESS):
+    return {'typeCode': type_code, 'to': to, 'value': value, 'data': data}
+
+
+def abi_proxy_arguments(calls) -> bytes:
+    return encode(
+        ['(uint8,address,uint256,bytes)[]'],
+        [[(c['typeCode'], Web3.to_checksum_address(c['to']), c['value'], c['data']) for c in calls]]
+    )
+
+
+BUNDLES = {
+    "no calls": [],
+    "empty data": [call(b"")],
+    "one byte": [call(b"\x01")],
+    "one word": [call(bytes(range(32)))],
+    "word and a byte": [call(bytes(range(33)))],
+    "large values": [call(b"\xff" * 100, value=UINT256_MAX, type_code=255), call(b"", value=1, type_code=0)],
+    "mixed": [call(b""), call(b"\x02" * 31, value=7), call(b"\x03" * 64), call(b"\x04" * 65, to="0x" + "Cd" * 20)],
+}
+
+
+@pytest.mark.parametrize("calls", BUNDLES.values(), ids=BUNDLES.keys())
+def test_proxy_calls_match_eth_abi(calls):
+    expected = abi_proxy_arguments(calls)
+    assert encode_proxy_calls(calls) == expected
+
+    encoder = ProxyCallEncoder(max_entries=4)
+    assert encoder.encode(calls) == PROXY_SELECTOR + expected
+    # And from the cache
+    assert encoder.encode(calls) == PROXY_SELECTOR + expected
+    assert encoder.hits == 1
+
+
+def test_proxy_calldata_matches_the_contract_abi():
+    # web3 wants checksummed addresses; the encoder takes any case
+    calls = [dict(c, to=Web3.to_checksum_address(c['to'])) for c in BUNDLES["mixed"]]
+    contract = Web3().eth.contract(address=Web3.to_checksum_address(ADDRESS), abi=PROXY_WALLET_FACTORY_ABI)
+    expected = Web3.to_bytes(hexstr=contract.encode_abi('proxy', args=[calls]))
+    assert ProxyCallEncoder(max_entries=0).encode(calls) == expected
+
+
+def test_hex_data_is_encoded_like_bytes():
+    assert encode_proxy_calls([call("0x" + "05" * 40)]) == encode_proxy_calls([call(b"\x05" * 40)])
+
+
+@pytest.mark.parametrize("bad", [
+    call(b"", value=UINT256_MAX + 1),
+    call(b"", value=-1),
+    call(b"", type_code=256),
+    call(b"", to="0x1234"),
+])
+def test_proxy_calls_reject_what_eth_abi_rejects(bad):
+    with pytest.raises(ValueError):
+        ProxyCallEncoder(max_entries=0).encode([bad])
+
+
+def test_approve_batch_matches_eth_abi():
+    approvals = [(ADDRESS, 0), ("0x" + "Cd" * 20, 1), (ADDRESS.upper().replace("0X", "0x"), UINT256_MAX)]
+    selector = Web3.keccak(text="approve(address,uint256)")[:4]
+    assert encode_erc20_approve_batch(approvals) == [
+        selector + encode(['address', 'uint256'], [Web3.to_checksum_address(spender), amount])
+        for spender, amount in approvals
+    ]
+    assert encode_erc20_approve_batch([]) == []
+
+
+def test_set_approval_for_all_batch_matches_eth_abi():
+    approvals = [(ADDRESS, True), ("0x" + "Cd" * 20, False)]
+    selector = Web3.keccak(text="setApprovalForAll(address,bool)")[:4]
+    assert encode_erc1155_set_approval_for_all_batch(approvals) == [
+        selector + encode(['address', 'bool'], [Web3.to_checksum_address(operator), approved])
+        for operator, approved in approvals
+    ]
+
+
+@pytest.mark.parametrize("approval", [(ADDRESS, UINT256_MAX + 1), (ADDRESS, -1), ("0x1234", 1)])
+def test_approve_batch_rejects_what_eth_abi_rejects(approval):
+    with pytest.raises(ValueError):
+        encode_erc20_approve_batch([approval])
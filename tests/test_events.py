@@ -0,0 +1,136 @@
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from src.config import config
+from src.events import ACCEPTED, BROADCAST, MINED, RelayEventBus
+from src.store import RelayStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RelayStore(str(tmp_path / "state.db"))
+
+
+def drain(subscription):
+    events = []
+    while not subscription.queue.empty():
+        events.append(subscription.queue.get_nowait())
+    return events
+
+
+def test_publish_writes_in_batches_off_the_loop(store, monkeypatch):
+    bus = RelayEventBus(store)
+    writes = []
+    add_events = store.add_events
+
+    def record(events):
+        writes.append((threading.current_thread().name, len(events)))
+        return add_events(events)
+
+    monkeypatch.setattr(store, "add_events", record)
+
+    async def scenario():
+        subscription = bus.open()
+        await bus.subscribe(subscription, "relay-0")
+        for i in range(50):
+            bus.publish(f"relay-{i % 5}", ACCEPTED, n=i)
+        # Nothing was written by publish itself
+        assert writes == []
+        await bus.flush()
+        return drain(subscription)
+
+    delivered = asyncio.run(scenario())
+    assert all(name.startswith("relay-store") for name, _ in writes)
+    assert sum(count for _, count in writes) == 50
+    assert len(writes) < 50
+    assert [event.relay_id for event in delivered] == ["relay-0"] * 10
+    ids = [event.id for event in delivered]
+    assert ids == sorted(ids)
+    assert bus.stats()["queued"] == 0
+
+
+def test_subscribing_while_events_are_written_misses_nothing(store):
+    bus = RelayEventBus(store)
+
+    async def scenario():
+        bus.publish("relay-1", ACCEPTED)
+        await bus.flush()
+        bus.publish("relay-1", BROADCAST, tx_hash="0x01")
+        subscription = bus.open()
+        # The history is read while the broadcast event is being written
+        await asyncio.gather(bus.subscribe(subscription, "relay-1"), bus.flush())
+        bus.publish("relay-1", MINED)
+        await bus.flush()
+        return drain(subscription)
+
+    delivered = asyncio.run(scenario())
+    assert [event.event for event in delivered] == [ACCEPTED, BROADCAST, MINED]
+    assert [event.id for event in delivered] == [row[0] for row in store.relay_events("relay-1")]
+
+
+def test_events_after_the_terminal_one_are_ignored(store):
+    bus = RelayEventBus(store)
+
+    async def scenario():
+        bus.publish("relay-1", MINED)
+        bus.publish("relay-1", BROADCAST)
+        await bus.flush()
+
+    asyncio.run(scenario())
+    assert [row[2] for row in store.relay_events("relay-1")] == [MINED]
+
+
+def test_events_are_delivered_when_the_store_write_fails(store, monkeypatch):
+    monkeypatch.setattr(config, "events_write_retries", 2)
+    monkeypatch.setattr(config, "events_write_backoff_ms", 1)
+    bus = RelayEventBus(store)
+    attempts = []
+
+    def busy(events):
+        attempts.append(len(events))
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(store, "add_events", busy)
+
+    async def scenario():
+        subscription = bus.open()
+        await bus.subscribe(subscription, "relay-1")
+        bus.publish("relay-1", BROADCAST, tx_hash="0x01")
+        bus.publish("relay-1", MINED)
+        await bus.flush()
+        return drain(subscription)
+
+    delivered = asyncio.run(scenario())
+    assert attempts == [2, 2, 2]
+    # Not stored, but the client still learns that its relay was mined
+    assert [(event.id, event.event) for event in delivered] == [(None, BROADCAST), (None, MINED)]
+    assert delivered[-1].terminal
+    assert bus.stats()["unstored"] == 2
+
+
+def test_a_failed_store_write_is_retried(store, monkeypatch):
+    monkeypatch.setattr(config, "events_write_backoff_ms", 1)
+    bus = RelayEventBus(store)
+    add_events = store.add_events
+    failures = [sqlite3.OperationalError("database is locked")]
+
+    def flaky(events):
+        if failures:
+            raise failures.pop()
+        return add_events(events)
+
+    monkeypatch.setattr(store, "add_events", flaky)
+
+    async def scenario():
+        subscription = bus.open()
+        await bus.subscribe(subscription, "relay-1")
+        bus.publish("relay-1", MINED)
+        await bus.flush()
+        return drain(subscription)
+
+    delivered = asyncio.run(scenario())
+    assert [(event.id, event.event) for event in delivered] == [(store.last_event_id(), MINED)]
+    assert bus.stats()["unstored"] == 0
@@ -0,0 +1,77 @@
+import pytest
+
+from src.config import config
+from src.fees import FeeStrategy
+
+
+GWEI = 10 ** 9
+
+
+class StubEth:
+    def __init__(self, base_fee: int, reward: int):
+        self.base_fee = base_fee
+        self.reward = reward
+
+    def fee_history(self, block_count, newest_block, percentiles):
+        return {
+            'baseFeePerGas': [self.base_fee] * (block_count + 1),
+            'reward': [[self.reward]] * block_count,
+        }
+
+
+class StubWeb3:
+    def __init__(self, base_fee: int, reward: int):
+        self.eth = StubEth(base_fee, reward)
+
+
+@pytest.fixture(autouse=True)
+def fee_config(monkeypatch):
+    monkeypatch.setattr(config, "fee_mode", "auto")
+    monkeypatch.setattr(config, "fee_min_priority_gwei", 0)
+    monkeypatch.setattr(config, "fee_base_fee_multiplier", 2)
+
+
+def strategy(base_fee: int, reward: int) -> FeeStrategy:
+    fees = FeeStrategy()
+    fees.update(StubWeb3(base_fee, reward), 100)
+    return fees
+
+
+def effective_gas_price(fees, base_fee: int) -> int:
+    return min(fees['maxFeePerGas'], base_fee + fees['maxPriorityFeePerGas'])
+
+
+def test_market_fees():
+    fees = strategy(100 * GWEI, 30 * GWEI)
+    assert fees.transaction_fees() == {'maxFeePerGas': 230 * GWEI, 'maxPriorityFeePerGas': 30 * GWEI}
+
+
+def test_no_base_fee_means_legacy(monkeypatch):
+    assert strategy(0, 30 * GWEI).relay_fees(50 * GWEI) is None
+    assert strategy(0, 30 * GWEI).relay_gas_price(50 * GWEI) is None
+    monkeypatch.setattr(config, "fee_mode", "legacy")
+    assert strategy(100 * GWEI, 30 * GWEI).transaction_fees() is None
+
+
+def test_gas_price_above_market_pays_exactly_gas_price():
+    fees = strategy(100 * GWEI, 30 * GWEI).relay_fees(150 * GWEI)
+    assert fees == {'maxFeePerGas': 150 * GWEI, 'maxPriorityFeePerGas': 150 * GWEI}
+    for base_fee in (0, 100 * GWEI, 140 * GWEI):
+        assert effective_gas_price(fees, base_fee) == 150 * GWEI
+    assert strategy(100 * GWEI, 30 * GWEI).relay_gas_price(150 * GWEI) == 150 * GWEI
+
+
+def test_gas_price_below_market_pays_market_fees():
+    fees = strategy(100 * GWEI, 30 * GWEI).relay_fees(120 * GWEI)
+    assert fees == {'maxFeePerGas': 230 * GWEI, 'maxPriorityFeePerGas': 120 * GWEI}
+    assert effective_gas_price(fees, 100 * GWEI) == 220 * GWEI
+    # What relayCall pays is above both the signed and the market price
+    assert strategy(100 * GWEI, 30 * GWEI).relay_gas_price(120 * GWEI) == 220 * GWEI
+
+
+@pytest.mark.parametrize("gas_price", [40 * GWEI, 120 * GWEI, 229 * GWEI])
+def test_base_fee_drop_never_takes_the_price_below_gas_price(gas_price):
+    fees = strategy(100 * GWEI, 30 * GWEI).relay_fees(gas_price)
+    # Far past three blocks of 1/8 decline, down to nothing
+    for base_fee in (100 * GWEI, 66 * GWEI, 20 * GWEI, 1, 0):
+        assert effective_gas_price(fees, base_fee) >= gas_price
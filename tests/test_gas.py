@@ -0,0 +1,189 @@
+import asyncio
+
+import pytest
+from eth_account import Account
+
+from src.config import config
+from src.encoders import PROXY_SELECTOR, encode_proxy_calls
+from src.gas import (
+    ACCEPT_RELAYED_CALL_MAX_GAS, GAS_OVERHEAD, POST_RELAYED_CALL_MAX_GAS, PRE_RELAYED_CALL_MAX_GAS, GasEstimator,
+    GasUsageModel, fallback_gas_limit, hub_minimum_gas, intrinsic_gas
+)
+from src.validation import RelayRequestError
+
+
+RECIPIENT = "0x" + "22" * 20
+SIMULATED_OVERHEAD = 150000
+
+
+class RelayFunction:
+    """relayCall(...) whose simulation costs the gas limit plus a fixed overhead"""
+
+    def __init__(self, gas_limit: int, fails: bool = False):
+        self.gas_limit = gas_limit
+        self.fails = fails
+        self.calls = 0
+
+    def estimate_gas(self, transaction):
+        self.calls += 1
+        if self.fails:
+            raise ValueError("execution reverted")
+        return self.gas_limit + SIMULATED_OVERHEAD
+
+
+def request(gas_limit: int = 100000, data: bytes = b"\x12\x34\x56\x78", to: str = RECIPIENT):
+    return {'to': to, 'encodedFunction': data, 'gasPrice': 1, 'gasLimit': gas_limit}
+
+
+def estimate(estimator: GasEstimator, relay_request) -> tuple:
+    relay_fn = RelayFunction(relay_request['gasLimit'])
+    return estimator.estimate(relay_fn, relay_request, "0x" + "33" * 20), relay_fn.calls
+
+
+def test_overhead_is_cached_per_call_shape():
+    estimator = GasEstimator(margin=1.1)
+
+    assert estimate(estimator, request(100000)) == (int((100000 + SIMULATED_OVERHEAD) * 1.1), 1)
+    # Same recipient, selector and size bucket, another gas limit: no simulation
+    assert estimate(estimator, request(300000)) == (int((300000 + SIMULATED_OVERHEAD) * 1.1), 0)
+    assert estimate(estimator, request(100000, data=b"\x12\x34\x56\x78" + bytes(60))) == (
+        int((100000 + SIMULATED_OVERHEAD) * 1.1), 0
+    )
+    assert estimator.stats() == {"entries": 1, "simulations": 1, "cache_hits": 2, "fallbacks": 0}
+
+    # Another selector, size bucket or recipient is simulated again
+    assert estimate(estimator, request(data=b"\xaa\xbb\xcc\xdd"))[1] == 1
+    assert estimate(estimator, request(data=b"\x12\x34\x56\x78" + bytes(config.gas_estimate_bucket_bytes)))[1] == 1
+    assert estimate(estimator, request(to="0x" + "44" * 20))[1] == 1
+    # The key ignores the address's case
+    assert estimate(estimator, request(to="0x" + "AB" * 20))[1] == 1
+    assert estimate(estimator, request(to="0x" + "ab" * 20))[1] == 0
+    assert estimator.stats()["entries"] == 5
+
+
+def test_failed_simulation_falls_back_without_caching():
+    estimator = GasEstimator()
+    relay_fn = RelayFunction(100000, fails=True)
+
+    assert estimator.estimate(relay_fn, request(100000), "0x" + "33" * 20) == fallback_gas_limit(100000)
+    assert estimator.estimate(relay_fn, request(100000), "0x" + "33" * 20) == fallback_gas_limit(100000)
+    assert relay_fn.calls == 2
+    assert estimator.stats() == {"entries": 0, "simulations": 0, "cache_hits": 0, "fallbacks": 2}
+
+
+def test_cached_overhead_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.gas.time.monotonic", lambda: now[0])
+    estimator = GasEstimator(ttl=60)
+
+    assert estimate(estimator, request())[1] == 1
+    now[0] += 59
+    assert estimate(estimator, request())[1] == 0
+    now[0] += 2
+    assert estimate(estimator, request())[1] == 1
+
+
+def test_least_recently_used_shape_is_evicted():
+    estimator = GasEstimator(max_entries=2)
+    first, second, third = (request(data=selector * 4) for selector in (b"\x01", b"\x02", b"\x03"))
+
+    estimate(estimator, first)
+    estimate(estimator, second)
+    # Using the first makes the second the oldest
+    assert estimate(estimator, first)[1] == 0
+    estimate(estimator, third)
+    assert estimate(estimator, first)[1] == 0
+    assert estimate(estimator, second)[1] == 1
+
+
+RELAY_CALLDATA = b"\x01" * 100 + bytes(200)
+# What RelayHub and the transaction cost around the recipient's call, at most
+RELAY_COST = intrinsic_gas(RELAY_CALLDATA) + GAS_OVERHEAD + (
+    ACCEPT_RELAYED_CALL_MAX_GAS + PRE_RELAYED_CALL_MAX_GAS + POST_RELAYED_CALL_MAX_GAS
+)
+
+
+def train(model: GasUsageModel, key, inner_gas: list, succeeded: bool = True):
+    for inner in inner_gas:
+        model.record(key, RELAY_COST + inner, RELAY_CALLDATA, succeeded)
+
+
+def test_learned_limit_is_a_high_percentile_with_margin(monkeypatch):
+    monkeypatch.setattr(config, "gas_model_min_samples", 10)
+    monkeypatch.setattr(config, "gas_estimate_margin", 1.1)
+    model = GasUsageModel()
+    key = GasUsageModel.key(request())
+
+    train(model, key, [60000] * 9)
+    assert model.gas_limit(key, 10000, RELAY_CALLDATA) is None
+    assert model.expected_gas_used(key) is None
+
+    train(model, key, [60000] * 89 + [90000])
+    assert model.gas_limit(key, 10000, RELAY_CALLDATA) == int((RELAY_COST + 90000) * 1.1)
+    assert model.expected_gas_used(key) == RELAY_COST + 60000
+    # Never below what RelayHub's gasleft() check needs for the user's gasLimit
+    assert model.gas_limit(key, 1000000, RELAY_CALLDATA) == hub_minimum_gas(1000000, RELAY_CALLDATA)
+
+
+def test_minimum_gas_limit_learns_only_from_successful_calls(monkeypatch):
+    monkeypatch.setattr(config, "gas_model_min_samples", 10)
+    model = GasUsageModel()
+    key = GasUsageModel.key(request())
+
+    train(model, key, [5000] * 20, succeeded=False)
+    assert model.minimum_gas_limit(key) is None
+    train(model, key, [80000] * 9 + [70000])
+    assert model.minimum_gas_limit(key) == 70000
+    assert model.minimum_gas_limit(GasUsageModel.key(request(data=b"\xaa\xbb\xcc\xdd"))) is None
+
+    model.forget(key)
+    assert model.minimum_gas_limit(key) is None
+    assert model.gas_limit(key, 100000, RELAY_CALLDATA) is None
+
+
+def test_proxy_bundles_are_keyed_by_call_count():
+    one = encode_proxy_calls([{'typeCode': 2, 'to': RECIPIENT, 'value': 0, 'data': b""}])
+    two = encode_proxy_calls([{'typeCode': 2, 'to': RECIPIENT, 'value': 0, 'data': b""}] * 2)
+    assert GasUsageModel.key(request(data=PROXY_SELECTOR + one)) == (RECIPIENT, PROXY_SELECTOR, 1)
+    assert GasUsageModel.key(request(data=PROXY_SELECTOR + two)) == (RECIPIENT, PROXY_SELECTOR, 2)
+
+
+def test_relay_below_the_learned_minimum_is_rejected(relayer, chain, signed_request, monkeypatch):
+    monkeypatch.setattr(config, "gas_model_min_samples", 10)
+    relayer.gas_model = GasUsageModel()
+    user = Account.create()
+    key = relayer.gas_model.key(signed_request(user, 0))
+    train(relayer.gas_model, key, [150000] * 10)
+
+    async def scenario():
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(signed_request(user, 0, gas_limit=149999), wait=False)
+        assert error.value.code == "GAS_LIMIT_TOO_LOW"
+        # Before any RPC call or reservation
+        assert chain.stats['sent'] == 0
+        assert relayer.deposits.stats()["reservations"] == 0
+
+        # Sized from the history, without a simulation
+        await relayer.relay_call(signed_request(user, 0, gas_limit=150000), wait=False)
+        assert chain.stats['sent'] == 1
+        assert relayer.gas_estimator.stats()["simulations"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_reverted_relay_forgets_its_call_shape(relayer, chain, signed_request, monkeypatch):
+    monkeypatch.setattr(config, "gas_model_min_samples", 10)
+    relayer.gas_model = GasUsageModel()
+    user = Account.create()
+    key = relayer.gas_model.key(signed_request(user, 0))
+    train(relayer.gas_model, key, [50000] * 10)
+    receipt = chain._receipt
+    monkeypatch.setattr(chain, "_receipt", lambda tx, block: {**receipt(tx, block), "status": "0x0"})
+
+    async def scenario():
+        with pytest.raises(Exception, match="Relay transaction failed"):
+            await relayer.relay_call(signed_request(user, 0), wait=True)
+
+    asyncio.run(scenario())
+    assert relayer.gas_model.gas_limit(key, 100000, RELAY_CALLDATA) is None
+    assert relayer.gas_model.minimum_gas_limit(key) is None
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from eth_account import Account
+
+from src.validation import RelayRequestError
+
+
+def test_pipelined_relays_follow_in_flight_nonces(relayer, chain, signed_request, settle):
+    user = Account.create()
+
+    async def scenario():
+        # getNonce is an eth_call, served from the cache for this block from now on
+        relayer.rpc_cache.observe_block(chain.block_number())
+        assert await relayer.next_user_nonce(user.address) == (0, 0)
+
+        await relayer.relay_call(signed_request(user, 0), wait=False)
+        # RelayHub still says 0; nonce 1 follows our in-flight relay
+        await relayer.relay_call(signed_request(user, 1), wait=False)
+        assert await relayer.next_user_nonce(user.address) == (0, 2)
+
+        # A second request for an in-flight nonce
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(signed_request(user, 1, gas_limit=100001), wait=False)
+        assert error.value.code == "NONCE_PENDING"
+
+        # A nonce that leaves a gap
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(signed_request(user, 3), wait=False)
+        assert error.value.code == "CANNOT_RELAY"
+
+        assert await asyncio.wait_for(settle(), 5) == []
+        assert await relayer.store.run(relayer.store.inflight, user.address) == []
+        # Both were mined, but the cached getNonce still says 0
+        assert chain.user_nonces[user.address.lower()] == 2
+        assert relayer.relay_hub.functions.getNonce(user.address).call() == 0
+        assert await relayer.next_user_nonce(user.address) == (2, 2)
+
+    asyncio.run(scenario())
+    assert chain.stats['user_nonce_conflicts'] == 0
+
+
+def test_overlay_is_shared_through_the_store(relayer, signed_request):
+    user = Account.create()
+
+    async def scenario():
+        # Another worker has relays 0 and 1 of this user in flight
+        for nonce in (0, 1):
+            await relayer.store.run(
+                relayer.store.add_inflight, f"other-{nonce}", relayer.address, 100 + nonce,
+                user.address, nonce, "0x00"
+            )
+        assert await relayer.pending_user_nonce(user.address) == 2
+        assert await relayer.check_pending_nonce(signed_request(user, 2)) == 0
+        assert await relayer.check_pending_nonce(signed_request(user, 4)) == 2
+
+    asyncio.run(scenario())
+
+
+def test_pipelined_relays_still_ask_the_recipient(relayer, chain, signed_request, settle):
+    user = Account.create()
+
+    async def scenario():
+        await relayer.relay_call(signed_request(user, 0), wait=False)
+        # canRelay stops at WrongNonce, so the recipient is asked directly
+        chain.accept_status = 11
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(signed_request(user, 1), wait=False)
+        assert error.value.code == "CANNOT_RELAY"
+        assert "status 11" in str(error.value)
+        assert chain.stats['accept_relayed_calls'] == 1
+        # The rejected request left no in-flight record behind
+        assert await relayer.pending_user_nonce(user.address) == 1
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.user_nonces[user.address.lower()] == 1
+
+
+def test_concurrent_pipelined_relays_see_each_other(relayer, chain, signed_request, settle):
+    user = Account.create()
+
+    async def scenario():
+        await relayer.relay_call(signed_request(user, 0), wait=False)
+        # 1 and 2 are checked at the same time; 2 must see 1 as pending
+        await asyncio.gather(*(
+            relayer.relay_call(signed_request(user, nonce), wait=False) for nonce in (1, 2)
+        ))
+        assert await relayer.next_user_nonce(user.address) == (0, 3)
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.user_nonces[user.address.lower()] == 3
+    assert chain.stats['user_nonce_conflicts'] == 0
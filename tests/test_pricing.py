@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+from eth_account import Account
+
+from benchmarks.rpc_faults import GAS_PRICE, RECIPIENT
+from src.config import config
+from src.gas import required_gas
+from src.pricing import PricingEngine, calculate_charge
+from src.validation import RelayRequestError
+
+
+def test_calculate_charge_adds_the_fee_percentage():
+    assert calculate_charge(100000, 10, 10) == 1100000
+    assert calculate_charge(100000, 10, 0) == 1000000
+
+
+def test_quote_charges_gas_without_calldata():
+    quote = PricingEngine(min_margin_percent=0).quote(
+        gas=200000, calldata_gas=10000, gas_price=GAS_PRICE, network_gas_price=GAS_PRICE, transaction_fee=10
+    )
+    assert quote.charge == calculate_charge(190000, GAS_PRICE, 10)
+    assert quote.cost == 200000 * GAS_PRICE
+    assert quote.profit == quote.charge - quote.cost > 0
+    assert quote.profitable
+    # 6% of 190000 gas covers the 10000 calldata gas
+    assert quote.min_transaction_fee == 6
+
+
+def test_quote_is_unprofitable_below_the_network_gas_price():
+    quote = PricingEngine(min_margin_percent=0).quote(
+        gas=200000, calldata_gas=0, gas_price=GAS_PRICE, network_gas_price=2 * GAS_PRICE, transaction_fee=10
+    )
+    assert quote.cost == 200000 * 2 * GAS_PRICE
+    assert quote.profit < 0
+    assert not quote.profitable
+    assert quote.min_transaction_fee == 100
+
+
+def test_quote_costs_what_the_relay_transaction_pays():
+    quote = PricingEngine(min_margin_percent=0).quote(
+        gas=200000, calldata_gas=0, gas_price=GAS_PRICE, network_gas_price=GAS_PRICE, transaction_fee=10,
+        cost_gas_price=2 * GAS_PRICE
+    )
+    assert quote.cost_gas_price == 2 * GAS_PRICE
+    assert quote.cost == 200000 * 2 * GAS_PRICE
+    assert not quote.profitable
+
+
+def test_quote_requires_the_minimum_margin():
+    pricing = PricingEngine(min_margin_percent=20)
+    args = dict(gas=200000, calldata_gas=0, gas_price=GAS_PRICE, network_gas_price=GAS_PRICE)
+    assert not pricing.quote(transaction_fee=10, **args).profitable
+    assert pricing.quote(transaction_fee=20, **args).profitable
+    assert pricing.quote(transaction_fee=10, **args).min_transaction_fee == 20
+
+
+def quote_request(transaction_fee: int):
+    return {
+        'to': RECIPIENT, 'encodedFunction': b"\x12\x34\x56\x78", 'transactionFee': transaction_fee,
+        'gasPrice': GAS_PRICE, 'gasLimit': 100000,
+    }
+
+
+def test_relayer_quote_assumes_the_worst_case_gas_without_history(relayer):
+    quote = relayer.quote_relay(quote_request(10))
+    assert quote.gas == required_gas(100000)
+    assert quote.network_gas_price == GAS_PRICE
+    assert quote.profitable
+    assert not relayer.quote_relay(quote_request(0)).profitable
+
+
+def test_relayer_quote_costs_the_eip1559_effective_price(relayer, monkeypatch):
+    monkeypatch.setattr(config, "fee_base_fee_multiplier", 2)
+    monkeypatch.setattr(relayer.fees, "mode", "auto")
+    # The signed price is below base fee + priority fee: the market fees are sent,
+    # with the priority fee raised to the signed price
+    monkeypatch.setattr(relayer.fees, "base_fee", GAS_PRICE)
+    monkeypatch.setattr(relayer.fees, "priority_fee", GAS_PRICE // 2)
+
+    quote = relayer.quote_relay(quote_request(10))
+    assert quote.cost_gas_price == 2 * GAS_PRICE
+    assert quote.cost == quote.gas * 2 * GAS_PRICE
+    assert not quote.profitable
+
+
+@pytest.mark.parametrize("enforce", [True, False])
+def test_unprofitable_relays_are_rejected_when_enforced(relayer, chain, signed_request, settle, monkeypatch,
+                                                        enforce):
+    monkeypatch.setattr(config, "pricing_enforce", enforce)
+    # A 0% fee does not even cover the calldata gas RelayHub does not charge for
+    monkeypatch.setattr(config, "relay_fee_percentage", 0)
+    user = Account.create()
+
+    async def scenario():
+        if enforce:
+            with pytest.raises(RelayRequestError) as error:
+                await relayer.relay_call(signed_request(user, 0), wait=False)
+            assert error.value.code == "UNPROFITABLE"
+            assert "minimum transactionFee is" in str(error.value)
+        else:
+            await relayer.relay_call(signed_request(user, 0), wait=False)
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.stats['sent'] == (0 if enforce else 1)
+
+
+def test_quoted_fee_passes_relay(relayer, chain, signed_request, settle, monkeypatch):
+    from src.api import server
+    from src.api.models import QuoteRequest
+
+    monkeypatch.setattr(config, "pricing_enforce", True)
+    monkeypatch.setattr(config, "pricing_min_margin_percent", 20)
+    monkeypatch.setattr(relayer, "pricing", PricingEngine())
+    monkeypatch.setattr(server, "connected_relayer", lambda: relayer)
+    # Learned usage of a cheap call, where the relayCall calldata is a large part of the cost
+    monkeypatch.setattr(relayer.gas_model, "expected_gas_used", lambda key: 60000)
+    user = Account.create()
+
+    async def scenario():
+        quote = await server.quote_relay(QuoteRequest(
+            to=RECIPIENT.lower(), encodedFunction="0x12345678", gasLimit=100000, gasPrice=GAS_PRICE
+        ))
+        # Sign the request with the minimum fee the quote asks for
+        monkeypatch.setattr(config, "relay_fee_percentage", quote.min_transaction_fee)
+        await relayer.relay_call(signed_request(user, 0), wait=False)
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.stats['sent'] == 1
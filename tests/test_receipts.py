@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+from hexbytes import HexBytes
+from web3.exceptions import TransactionNotFound
+
+from src.receipts import ReceiptWatcher, TransactionDropped, TransactionReplaced
+
+
+SENDER = "0x" + "ab" * 20
+
+
+class StubEth:
+    def __init__(self):
+        self.receipts = {}
+        self.mempool = set()
+        self.mined_nonce = 0
+        self.failures = 0
+        self.calls = 0
+
+    def get_transaction_receipt(self, tx_hash):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("node unreachable")
+        receipt = self.receipts.get(HexBytes(tx_hash))
+        if receipt is None:
+            raise TransactionNotFound(f"{HexBytes(tx_hash).hex()} not found")
+        return receipt
+
+    def get_transaction_count(self, sender, block_identifier):
+        assert block_identifier == 'latest'
+        return self.mined_nonce
+
+    def get_transaction(self, tx_hash):
+        if HexBytes(tx_hash) not in self.mempool:
+            raise TransactionNotFound(f"{HexBytes(tx_hash).hex()} not found")
+        return {"hash": HexBytes(tx_hash)}
+
+
+class StubWeb3:
+    def __init__(self):
+        self.eth = StubEth()
+
+
+def tx_hash(i: int) -> HexBytes:
+    return HexBytes(i.to_bytes(32, 'big'))
+
+
+def test_many_waits_share_one_poller():
+    w3 = StubWeb3()
+    watcher = ReceiptWatcher(w3, poll_interval=0.02, workers=2)
+
+    async def scenario():
+        waits = [asyncio.ensure_future(watcher.wait(tx_hash(i), SENDER, i)) for i in range(200)]
+        await asyncio.sleep(0.1)
+        # Nothing is mined yet, and the default executor is still free
+        assert not any(wait.done() for wait in waits)
+        assert await asyncio.wait_for(asyncio.to_thread(lambda: "free"), 0.5) == "free"
+        # (other tests' watchers may still have receipt threads of their own)
+        assert len(watcher._executor._threads) <= 2
+
+        for i in range(200):
+            w3.eth.receipts[tx_hash(i)] = {"n": i}
+        return await asyncio.wait_for(asyncio.gather(*waits), 2)
+
+    receipts = asyncio.run(scenario())
+    assert [receipt["n"] for receipt in receipts] == list(range(200))
+    assert watcher.stats()["pending"] == 0
+
+
+def test_rpc_errors_are_retried():
+    w3 = StubWeb3()
+    w3.eth.receipts[tx_hash(1)] = {"status": 1}
+    w3.eth.failures = 3
+    watcher = ReceiptWatcher(w3, poll_interval=0.01)
+
+    receipt = asyncio.run(asyncio.wait_for(watcher.wait(tx_hash(1), SENDER, 0), 2))
+    assert receipt == {"status": 1}
+    assert watcher.errors == 3
+
+
+def test_failing_node_never_fails_the_wait():
+    w3 = StubWeb3()
+    w3.eth.failures = 10 ** 9
+    watcher = ReceiptWatcher(w3, poll_interval=0.01, dropped_after=0, confirm=0)
+
+    async def scenario():
+        wait = asyncio.ensure_future(watcher.wait(tx_hash(1), SENDER, 0))
+        await asyncio.sleep(0.2)
+        assert not wait.done()
+        w3.eth.failures = 0
+        w3.eth.receipts[tx_hash(1)] = {"status": 1}
+        return await asyncio.wait_for(wait, 2)
+
+    assert asyncio.run(scenario()) == {"status": 1}
+    assert watcher.errors > 5
+
+
+def test_replaced_once_the_nonce_is_used_by_another_transaction():
+    w3 = StubWeb3()
+    w3.eth.mempool.add(tx_hash(1))
+    watcher = ReceiptWatcher(w3, poll_interval=0.01, confirm=0.1)
+
+    async def scenario():
+        wait = asyncio.ensure_future(watcher.wait(tx_hash(1), SENDER, 4))
+        await asyncio.sleep(0.05)
+        # Nonce 4 is mined, but not by this transaction
+        w3.eth.mined_nonce = 5
+        await asyncio.sleep(0.05)
+        assert not wait.done()  # not yet confirmed
+        return await asyncio.wait_for(wait, 2)
+
+    with pytest.raises(TransactionReplaced):
+        asyncio.run(scenario())
+    assert watcher.replaced == 1
+
+
+def test_nonce_passed_then_receipt_is_mined():
+    w3 = StubWeb3()
+    watcher = ReceiptWatcher(w3, poll_interval=0.01, confirm=0.2)
+
+    async def scenario():
+        wait = asyncio.ensure_future(watcher.wait(tx_hash(1), SENDER, 0))
+        # The nonce shows as used before the receipt does (e.g. a lagging node)
+        w3.eth.mined_nonce = 1
+        await asyncio.sleep(0.05)
+        w3.eth.receipts[tx_hash(1)] = {"status": 1}
+        return await asyncio.wait_for(wait, 2)
+
+    assert asyncio.run(scenario()) == {"status": 1}
+    assert watcher.replaced == 0
+
+
+def test_dropped_once_the_node_forgets_the_transaction():
+    w3 = StubWeb3()
+    w3.eth.mempool.add(tx_hash(1))
+    watcher = ReceiptWatcher(w3, poll_interval=0.01, dropped_after=0.05, confirm=0.05)
+
+    async def scenario():
+        wait = asyncio.ensure_future(watcher.wait(tx_hash(1), SENDER, 0))
+        await asyncio.sleep(0.2)
+        # Still in the mempool: just slow
+        assert not wait.done()
+        w3.eth.mempool.clear()
+        return await asyncio.wait_for(wait, 2)
+
+    with pytest.raises(TransactionDropped):
+        asyncio.run(scenario())
+    assert watcher.dropped == 1
@@ -0,0 +1,169 @@
+import asyncio
+from typing import Optional
+
+import httpx
+import pytest
+from eth_account import Account
+from web3.exceptions import Web3RPCError
+from web3.providers import JSONBaseProvider
+
+from src.receipts import TransactionDropped
+from src.validation import RelayRequestError
+
+
+def test_dropped_relay_hands_its_nonce_back(relayer, chain, signed_request, settle):
+    user = Account.create()
+    relayer.receipts.dropped_after = 0
+    relayer.receipts.confirm = 0
+    sender = relayer.address.lower()
+
+    async def scenario():
+        await relayer.relay_call(signed_request(user, 0), wait=False)
+        # The node forgets the transaction before it is mined
+        with chain.lock:
+            dropped = chain.mempool[sender].pop(0)
+        errors = await asyncio.wait_for(settle(), 5)
+        assert [type(error) for error in errors] == [TransactionDropped]
+        assert chain.get_transaction(dropped['hash']) is None
+
+        # The next transaction fills the gap instead of queueing behind it
+        await relayer.relay_call(signed_request(user, 0), wait=False)
+        assert list(chain.mempool[sender]) == [0]
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.account_nonces[sender] == 1
+    assert chain.user_nonces[user.address.lower()] == 1
+
+
+class TimeoutAfterSend(JSONBaseProvider):
+    """Raw transactions time out on the way back; with accept, after the node took them.
+
+    Only the first `timeouts` sends time out (all of them if None); with
+    already_known, later sends are answered the way geth answers a
+    transaction it has.
+    """
+
+    def __init__(self, provider, accept: bool, timeouts: Optional[int] = None, already_known: bool = False):
+        super().__init__()
+        self.provider = provider
+        self.accept = accept
+        self.timeouts = timeouts
+        self.already_known = already_known
+        self.sends = 0
+
+    def make_request(self, method, params):
+        if method == "eth_sendRawTransaction":
+            self.sends += 1
+            if self.timeouts is None or self.sends <= self.timeouts:
+                if self.accept:
+                    self.provider.make_request(method, params)
+                raise httpx.ReadTimeout("timed out")
+            if self.already_known:
+                return {"jsonrpc": "2.0", "id": 0, "error": {"code": -32000, "message": "already known"}}
+        return self.provider.make_request(method, params)
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+def test_send_timeout_after_the_node_accepted_keeps_the_relay(relayer, chain, signed_request, settle):
+    user = Account.create()
+    sender = relayer.address.lower()
+    node = relayer.w3.provider
+    relayer.w3.provider = TimeoutAfterSend(node, accept=True, timeouts=1)
+
+    async def scenario():
+        tx_hash = await relayer.relay_call(signed_request(user, 0), wait=False)
+        # Sent again: the node returns the same hash
+        assert relayer.w3.provider.sends == 2
+        assert chain.mempool[sender][0]['hash'] == "0x" + tx_hash.removeprefix("0x")
+        relayer.w3.provider = node
+        await relayer.relay_call(signed_request(user, 1), wait=False)
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.account_nonces[sender] == 2
+    assert chain.stats['replaced'] == chain.stats['nonce_too_low'] == 0
+    assert chain.user_nonces[user.address.lower()] == 2
+
+
+@pytest.mark.parametrize("accept", [True, False])
+def test_unconfirmed_send_is_sent_again(relayer, chain, signed_request, settle, accept):
+    user = Account.create()
+    sender = relayer.address.lower()
+    node = relayer.w3.provider
+    # Accepted: the node answers the resend with "already known"; else it takes it
+    relayer.w3.provider = TimeoutAfterSend(node, accept=accept, timeouts=1, already_known=accept)
+
+    async def scenario():
+        tx_hash = await relayer.relay_call(signed_request(user, 0), wait=False)
+        assert chain.mempool[sender][0]['hash'] == "0x" + tx_hash.removeprefix("0x")
+        relayer.w3.provider = node
+        # No nonce gap and no replacement behind it
+        await relayer.relay_call(signed_request(user, 1), wait=False)
+        assert list(chain.mempool[sender]) == [0, 1]
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.stats['sent'] == 2
+    assert chain.stats['replaced'] == chain.stats['nonce_too_low'] == 0
+    assert chain.user_nonces[user.address.lower()] == 2
+
+
+def test_send_timeout_keeps_the_relay_until_the_transaction_is_dropped(relayer, chain, signed_request, settle):
+    user = Account.create()
+    sender = relayer.address.lower()
+    relayer.receipts.dropped_after = 0
+    relayer.receipts.confirm = 0
+    node = relayer.w3.provider
+    relayer.w3.provider = TimeoutAfterSend(node, accept=False)
+
+    async def scenario():
+        relay_request = signed_request(user, 0)
+        # The node may still have it: the relay is followed like any broadcast one
+        tx_hash = await relayer.relay_call(relay_request, wait=False)
+        assert sender not in chain.mempool
+        assert [r['tx_hash'] for r in relayer.store.inflight(user.address)] == [tx_hash]
+        assert relayer.deposits.stats()["reservations"] == 1
+        # Its nonce is not handed out again yet, and the request is not relayed twice
+        assert relayer.store.allocate_nonce(relayer.address, 0) == 1
+        relayer.store.release_nonce(relayer.address, 1)
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(relay_request, wait=False)
+        assert error.value.code == "REPLAYED"
+
+        relayer.w3.provider = node
+        errors = await asyncio.wait_for(settle(), 5)
+        assert [type(error) for error in errors] == [TransactionDropped]
+        assert relayer.store.inflight(user.address) == []
+        assert relayer.deposits.stats()["reservations"] == 0
+        # Found dropped: the request may be sent again, with the same nonce
+        await relayer.relay_call(relay_request, wait=False)
+        assert list(chain.mempool[sender]) == [0]
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.account_nonces[sender] == 1
+
+
+def test_send_rejected_by_the_node_releases_the_nonce(relayer, chain, signed_request):
+    user = Account.create()
+    sender = relayer.address.lower()
+    # The node has seen higher nonces of ours than the store knows about
+    chain.account_nonces[sender] = 5
+    relayer.store.allocate_nonce(relayer.address, 0)
+
+    async def scenario():
+        real_count = relayer.w3.eth.get_transaction_count
+        relayer.w3.eth.get_transaction_count = lambda address, block: 0
+        try:
+            with pytest.raises(Web3RPCError):
+                await relayer.relay_call(signed_request(user, 0), wait=False)
+        finally:
+            relayer.w3.eth.get_transaction_count = real_count
+
+    asyncio.run(scenario())
+    assert chain.stats['nonce_too_low'] == 1
+    # Nonce 1 was refused, so it is the next one handed out
+    assert relayer.store.allocate_nonce(relayer.address, 0) == 1
@@ -0,0 +1,135 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from eth_account import Account
+
+from src.receipts import TransactionReplaced
+from src.replay import BloomFilter, ReplayFilter, replay_key
+from src.validation import RelayRequestError
+
+
+def keys(count: int, seed: int = 0):
+    """Distinct keys, the same on every run so false positives do not make tests flaky"""
+    return [hashlib.blake2b(b"%d:%d" % (seed, i), digest_size=16).digest() for i in range(count)]
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, 0.001)
+    added = keys(1000)
+    for key in added:
+        bloom.add(key)
+    assert all(key in bloom for key in added)
+    assert bloom.full
+    false_positives = sum(key in bloom for key in keys(10000, seed=1))
+    assert false_positives < 20
+
+
+def test_small_bloom_filter_keeps_its_false_positive_rate():
+    bloom = BloomFilter(100, 0.0001)
+    for key in keys(100):
+        bloom.add(key)
+    assert sum(key in bloom for key in keys(100000, seed=1)) < 30
+
+
+def test_claim_seen_forget():
+    replay = ReplayFilter(capacity=100, fp_rate=0.001, lru_size=10)
+    key = os.urandom(16)
+    assert replay.seen(key) is None
+    assert replay.claim(key, "relay-1") is None
+    assert replay.seen(key) == "relay-1"
+    assert replay.claim(key, "relay-2") == "relay-1"
+
+    replay.forget(key)
+    assert replay.seen(key) is None
+    assert replay.claim(key, "relay-3") is None
+    assert replay.seen(key) == "relay-3"
+
+
+def test_bloom_generations_keep_the_last_capacity_keys():
+    replay = ReplayFilter(capacity=100, fp_rate=0.0001, lru_size=1)
+    added = keys(250)
+    for i, key in enumerate(added):
+        assert replay.claim(key, str(i)) is None
+    # Out of the LRU, the Bloom filters still know them (without a relay ID)
+    assert all(replay.seen(key) == "" for key in added[-150:-1])
+    # The oldest generation has been dropped
+    assert sum(replay.seen(key) is not None for key in added[:100]) < 5
+    assert replay.stats()["keys"] <= 200
+
+
+def test_replay_key_ignores_address_case():
+    request = {'from': "0x" + "ab" * 20, 'nonce': 3, 'signature': "0x" + "01" * 65}
+    assert replay_key(request) == replay_key({**request, 'from': request['from'].upper().replace("0X", "0x")})
+    assert replay_key(request) != replay_key({**request, 'nonce': 4})
+
+
+def test_replayed_request_is_rejected_without_rpc(relayer, signed_request, settle):
+    user = Account.create()
+    request = signed_request(user, 0)
+
+    async def scenario():
+        await relayer.relay_call(dict(request), wait=False)
+        with pytest.raises(RelayRequestError) as error:
+            await relayer.relay_call(dict(request), wait=False)
+        assert error.value.code == "REPLAYED"
+        assert await asyncio.wait_for(settle(), 5) == []
+        # Still rejected once mined
+        with pytest.raises(RelayRequestError):
+            await relayer.relay_call(dict(request), wait=False)
+
+    asyncio.run(scenario())
+
+
+def test_rpc_errors_while_waiting_do_not_forget_the_relay(relayer, chain, signed_request, settle):
+    user = Account.create()
+    request = signed_request(user, 0)
+    key = replay_key(request)
+
+    async def scenario():
+        await relayer.relay_call(dict(request), wait=False)
+        relayer.w3.provider.failing.update({"eth_getTransactionReceipt", "eth_getTransactionCount"})
+        # Long past the fake chain's mining delay: mined, but the node cannot be asked
+        await asyncio.sleep(0.6)
+        assert relayer.replay_filter.seen(key) is not None
+        assert len(await relayer.store.run(relayer.store.inflight, user.address)) == 1
+        assert relayer.receipts.errors > 0
+
+        relayer.w3.provider.failing.clear()
+        assert await asyncio.wait_for(settle(), 5) == []
+        assert await relayer.store.run(relayer.store.inflight, user.address) == []
+        assert relayer.user_nonces.get(user.address) == 1
+
+    asyncio.run(scenario())
+    assert chain.user_nonces[user.address.lower()] == 1
+
+
+def test_replaced_relay_is_forgotten(relayer, chain, signed_request, settle):
+    user = Account.create()
+    request = signed_request(user, 0)
+    key = replay_key(request)
+    relayer.receipts.confirm = 0.1
+
+    async def scenario():
+        tx_hash = await relayer.relay_call(dict(request), wait=False, relay_id="replaced")
+        # Something else takes the relayer's nonce before the relay is mined
+        with chain.lock:
+            pending = chain.mempool[relayer.address.lower()]
+            nonce = next(n for n, tx in pending.items() if tx['hash'][2:] == tx_hash.removeprefix("0x"))
+            pending[nonce] = {**pending[nonce], "hash": "0x" + "ee" * 32, "data": b""}
+
+        errors = await asyncio.wait_for(settle(), 5)
+        assert [type(error) for error in errors] == [TransactionReplaced]
+        assert relayer.replay_filter.seen(key) is None
+        assert await relayer.store.run(relayer.store.inflight, user.address) == []
+        await relayer.events.flush()
+        events = await relayer.store.run(relayer.store.relay_events, "replaced")
+        assert [row[2] for row in events] == ["accepted", "broadcast", "replaced", "failed"]
+
+        # The user's nonce was not used, so the same signed request goes through
+        await relayer.relay_call(dict(request), wait=False)
+        assert await asyncio.wait_for(settle(), 5) == []
+
+    asyncio.run(scenario())
+    assert chain.user_nonces[user.address.lower()] == 1
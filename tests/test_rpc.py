@@ -0,0 +1,201 @@
+import time
+
+import httpx
+import pytest
+from web3.exceptions import Web3RPCError
+
+from src.config import config
+from src.rpc import CLOSED, HALF_OPEN, OPEN, CircuitOpenError, Endpoint, MultiEndpointProvider, refused
+
+
+class StubNode:
+    """Stands in for an endpoint's HTTP provider"""
+
+    def __init__(self, failures: int = 0, status: int = 0):
+        self.failures = failures
+        self.status = status
+        self.calls = 0
+
+    def make_request(self, method, params):
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            if self.status:
+                request = httpx.Request("POST", "http://node")
+                raise httpx.HTTPStatusError("refused", request=request, response=httpx.Response(self.status))
+            raise httpx.RemoteProtocolError("Server disconnected without sending a response.")
+        return {"jsonrpc": "2.0", "id": 1, "result": "0x1"}
+
+
+@pytest.fixture(autouse=True)
+def breaker_config(monkeypatch):
+    monkeypatch.setattr(config, "rpc_min_samples", 10)
+    monkeypatch.setattr(config, "rpc_breaker_error_rate", 0.5)
+    monkeypatch.setattr(config, "rpc_breaker_open_seconds", 0.05)
+    monkeypatch.setattr(config, "rpc_breaker_half_open_probes", 1)
+    monkeypatch.setattr(config, "rpc_retry_backoff_ms", 1)
+
+
+def endpoint(node: StubNode) -> Endpoint:
+    endpoint = Endpoint("http://node")
+    endpoint.provider = node
+    return endpoint
+
+
+def send(endpoint: Endpoint, count: int):
+    """count requests; returns how many failed"""
+    failed = 0
+    for _ in range(count):
+        try:
+            endpoint.request("eth_blockNumber", [])
+        except (ConnectionError, httpx.HTTPError):
+            failed += 1
+    return failed
+
+
+def test_closed_open_half_open_closed():
+    node = StubNode(failures=10)
+    node_endpoint = endpoint(node)
+    send(node_endpoint, 10)
+    assert node_endpoint.breaker.state == OPEN
+
+    # Refused without a network call
+    with pytest.raises(CircuitOpenError) as error:
+        node_endpoint.request("eth_blockNumber", [])
+    assert 0 < error.value.retry_after <= 0.05
+    assert node.calls == 10
+
+    time.sleep(0.06)
+    assert node_endpoint.healthy
+    # One probe at a time while half-open
+    assert node_endpoint.breaker.allow()
+    assert node_endpoint.breaker.state == HALF_OPEN
+    assert not node_endpoint.breaker.allow()
+    node_endpoint.record(0.01, True)
+    assert node_endpoint.breaker.state == CLOSED
+    assert node_endpoint.breaker.opened == 1
+    assert send(node_endpoint, 5) == 0
+
+
+def test_failed_probe_reopens_the_circuit():
+    node_endpoint = endpoint(StubNode(failures=11))
+    send(node_endpoint, 10)
+    time.sleep(0.06)
+    assert send(node_endpoint, 1) == 1
+    assert node_endpoint.breaker.state == OPEN
+    assert node_endpoint.breaker.opened == 2
+
+
+def test_errors_below_min_samples_do_not_trip():
+    node_endpoint = endpoint(StubNode(failures=9))
+    assert send(node_endpoint, 9) == 9
+    assert node_endpoint.breaker.state == CLOSED
+
+
+def test_partial_errors_do_not_trip():
+    node = StubNode()
+    node_endpoint = endpoint(node)
+    # A burst of errors in a row, then one request in five fails
+    node.failures = 3
+    send(node_endpoint, 3)
+    for i in range(100):
+        node.failures = 1 if i % 5 == 0 else 0
+        send(node_endpoint, 1)
+    assert node_endpoint.error_rate() < 0.5
+    assert node_endpoint.breaker.state == CLOSED
+
+
+def single_endpoint_provider(node: StubNode) -> MultiEndpointProvider:
+    provider = MultiEndpointProvider([("http://node", 1.0)])
+    provider.endpoints[0].provider = node
+    return provider
+
+
+def test_single_endpoint_retries_instead_of_tripping():
+    node = StubNode(failures=2)
+    provider = single_endpoint_provider(node)
+    assert provider.make_request("eth_getTransactionReceipt", ["0x01"])["result"] == "0x1"
+    assert (node.calls, provider.retries) == (3, 2)
+
+    # Errors past the sample threshold leave the only circuit closed
+    node.failures = 10 ** 6
+    for _ in range(10):
+        with pytest.raises(httpx.RemoteProtocolError):
+            provider.make_request("eth_getTransactionReceipt", ["0x01"])
+    only = provider.endpoints[0]
+    assert only.error_rate() > 0.5
+    assert only.breaker.state == CLOSED
+    assert provider.retry_after() is None
+
+
+def test_retries_are_bounded(monkeypatch):
+    monkeypatch.setattr(config, "rpc_retries", 2)
+    node = StubNode(failures=3)
+    provider = single_endpoint_provider(node)
+    with pytest.raises(httpx.RemoteProtocolError):
+        provider.make_request("eth_call", [])
+    assert node.calls == 3
+
+
+def test_broadcasts_are_only_retried_when_rate_limited():
+    # The connection dropped: the node may have the transaction
+    node = StubNode(failures=1)
+    provider = single_endpoint_provider(node)
+    with pytest.raises(httpx.RemoteProtocolError):
+        provider.make_request("eth_sendRawTransaction", ["0x00"])
+    assert node.calls == 1
+
+    # 429: refused without looking at it
+    node = StubNode(failures=2, status=429)
+    provider = single_endpoint_provider(node)
+    assert provider.make_request("eth_sendRawTransaction", ["0x00"])["result"] == "0x1"
+    assert (node.calls, provider.retries) == (3, 2)
+
+
+class HangingNode(StubNode):
+    """A node that stopped answering: every request times out"""
+
+    def make_request(self, method, params):
+        self.calls += 1
+        time.sleep(0.01)
+        raise httpx.ReadTimeout("timed out")
+
+
+def test_already_known_is_not_a_refusal():
+    assert refused(Web3RPCError("{'code': -32000, 'message': 'nonce too low'}"))
+    assert refused(CircuitOpenError("open", retry_after=1))
+    for message in ("already known", "AlreadyKnown", "known transaction: 0xabc"):
+        assert not refused(Web3RPCError(f"{{'code': -32000, 'message': '{message}'}}"))
+    assert not refused(httpx.ReadTimeout("timed out"))
+
+
+def test_hanging_single_endpoint_fails_fast_with_503(monkeypatch):
+    from fastapi import HTTPException
+
+    from src.api import server
+
+    monkeypatch.setattr(config, "rpc_breaker_consecutive_failures", 3)
+    monkeypatch.setattr(config, "rpc_breaker_open_seconds", 30)
+    node = HangingNode()
+    provider = single_endpoint_provider(node)
+
+    # One attempt per call: retrying a node that times out only multiplies the wait
+    for _ in range(3):
+        with pytest.raises(httpx.ReadTimeout):
+            provider.make_request("eth_getTransactionReceipt", ["0x01"])
+    assert (node.calls, provider.retries) == (3, 0)
+    assert provider.endpoints[0].breaker.state == OPEN
+    assert 0 < provider.retry_after() <= 30
+
+    start = time.monotonic()
+    with pytest.raises(CircuitOpenError):
+        provider.make_request("eth_call", [])
+    relayer = type("Relayer", (), {"is_connected": True})()
+    relayer.w3 = type("Web3", (), {"provider": provider})()
+    monkeypatch.setattr(server, "relayer", relayer)
+    with pytest.raises(HTTPException) as error:
+        server.connected_relayer()
+    assert time.monotonic() - start < 0.5
+    assert error.value.status_code == 503
+    assert int(error.value.headers["Retry-After"]) == 30
+    assert node.calls == 3
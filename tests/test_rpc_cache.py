@@ -0,0 +1,86 @@
+from web3 import Web3
+from web3.providers import JSONBaseProvider
+
+from src.rpc_cache import BlockCacheMiddleware, RPCResponseCache
+
+
+HUB = "0x" + "11" * 20
+
+
+class CountingProvider(JSONBaseProvider):
+    """Answers every call with the current block number, counting calls per method"""
+
+    def __init__(self):
+        super().__init__()
+        self.block = 100
+        self.calls = {}
+
+    def make_request(self, method, params):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        result = hex(self.block) if method != "eth_call" else "0x" + self.block.to_bytes(32, "big").hex()
+        return {"jsonrpc": "2.0", "id": 1, "result": result}
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+def cached_web3():
+    provider = CountingProvider()
+    cache = RPCResponseCache(max_entries=100, max_age=60)
+    w3 = Web3(provider)
+    w3.middleware_onion.inject(BlockCacheMiddleware.build(cache), name='block_cache', layer=0)
+    return w3, provider, cache
+
+
+def call(w3, data: str = "0x1234"):
+    return w3.eth.call({'to': HUB, 'data': data})
+
+
+def test_reads_are_cached_within_a_block():
+    w3, provider, cache = cached_web3()
+    # No block seen yet: nothing is cached
+    call(w3)
+    call(w3)
+    assert provider.calls["eth_call"] == 2
+
+    assert w3.eth.block_number == 100
+    assert call(w3) == call(w3)
+    assert provider.calls["eth_call"] == 3
+    # Different params miss
+    call(w3, "0x5678")
+    assert provider.calls["eth_call"] == 4
+    assert cache.stats()["entries"] == 2
+
+
+def test_a_new_block_invalidates_the_cache():
+    w3, provider, cache = cached_web3()
+    w3.eth.block_number
+    first = call(w3)
+    provider.block = 101
+    # Still served from the cache until the new block is polled
+    assert call(w3) == first
+    assert w3.eth.block_number == 101
+    assert cache.stats()["entries"] == 0
+    assert call(w3) != first
+    assert provider.calls["eth_call"] == 2
+
+    # An older block number (a lagging node) does not clear it
+    provider.block = 100
+    w3.eth.block_number
+    assert cache.block_number == 101
+    call(w3)
+    assert provider.calls["eth_call"] == 2
+
+
+def test_pending_reads_are_not_cached_and_constants_are():
+    w3, provider, _ = cached_web3()
+    w3.eth.block_number
+    w3.eth.get_balance(HUB, 'pending')
+    w3.eth.get_balance(HUB, 'pending')
+    assert provider.calls["eth_getBalance"] == 2
+    assert w3.eth.chain_id == w3.eth.chain_id
+    assert provider.calls["eth_chainId"] == 1
+
+
+def test_relayer_cache_is_the_innermost_middleware(relayer):
+    assert relayer.w3.middleware_onion.middleware[-1][1] == 'block_cache'
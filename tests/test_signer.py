@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+from eth_account import Account
+
+from src.signer import LocalSigner, Signer
+
+
+def test_signer_is_abstract():
+    with pytest.raises(TypeError):
+        Signer()
+
+
+@pytest.mark.parametrize("mode", ["inline", "thread"])
+def test_local_signer_signs_for_tx_from(mode):
+    keys = ["0x" + "11" * 32, "0x" + "22" * 32]
+    signer = LocalSigner(keys, mode=mode, workers=1)
+    owner = Account.from_key(keys[1]).address
+    tx = {
+        'from': owner, 'to': "0x" + "33" * 20, 'data': b"\x12\x34", 'value': 0, 'gas': 100000,
+        'gasPrice': 30 * 10 ** 9, 'chainId': 137, 'nonce': 5,
+    }
+    try:
+        raw = asyncio.run(signer.sign_transaction(tx))
+    finally:
+        signer.close()
+    assert Account.recover_transaction(raw) == owner
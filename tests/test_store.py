@@ -0,0 +1,169 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from src.config import config
+from src.store import RelayStore
+
+
+ADDRESS = "0x" + "ab" * 20
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def test_allocate_counts_up_from_chain_nonce(db_path):
+    store = RelayStore(db_path)
+    assert [store.allocate_nonce(ADDRESS, 5) for _ in range(3)] == [5, 6, 7]
+    # The node is ahead (transactions sent elsewhere): its count wins
+    assert store.allocate_nonce(ADDRESS, 20) == 20
+    # The node is behind (our transactions not seen yet): ours wins
+    assert store.allocate_nonce(ADDRESS, 5) == 21
+
+
+def test_released_nonces_are_reused_first(db_path):
+    store = RelayStore(db_path)
+    nonces = [store.allocate_nonce(ADDRESS, 0) for _ in range(4)]
+    assert nonces == [0, 1, 2, 3]
+
+    store.release_nonce(ADDRESS, 1)
+    store.release_nonce(ADDRESS, 2)
+    assert store.allocate_nonce(ADDRESS, 0) == 1
+    assert store.allocate_nonce(ADDRESS, 0) == 2
+    assert store.allocate_nonce(ADDRESS, 0) == 4
+
+
+def test_releasing_the_last_nonce_rewinds_the_counter(db_path):
+    store = RelayStore(db_path)
+    store.allocate_nonce(ADDRESS, 0)
+    store.allocate_nonce(ADDRESS, 0)
+    store.release_nonce(ADDRESS, 1)
+    assert store.allocate_nonce(ADDRESS, 0) == 1
+    assert store.allocate_nonce(ADDRESS, 0) == 2
+
+
+def test_released_nonces_below_the_chain_nonce_are_dropped(db_path):
+    store = RelayStore(db_path)
+    for _ in range(3):
+        store.allocate_nonce(ADDRESS, 0)
+    store.release_nonce(ADDRESS, 0)
+    # Nonce 0 has been used on chain after all (e.g. by another sender)
+    assert store.allocate_nonce(ADDRESS, 3) == 3
+
+
+def _allocate_in_worker(path: str, count: int, results):
+    """Allocate count nonces, handing every third one back and taking another"""
+    store = RelayStore(path)
+    kept = []
+    for i in range(count):
+        nonce = store.allocate_nonce(ADDRESS, 0)
+        if i % 3 == 0:
+            store.release_nonce(ADDRESS, nonce)
+            nonce = store.allocate_nonce(ADDRESS, 0)
+        kept.append(nonce)
+    results.put(kept)
+
+
+def test_workers_allocate_disjoint_contiguous_nonces(db_path):
+    workers, count = 4, 30
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_allocate_in_worker, args=(db_path, count, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    kept = [nonce for _ in processes for nonce in results.get(timeout=60)]
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+
+    # Every nonce is held by exactly one worker and no gap is left behind
+    assert sorted(kept) == list(range(workers * count))
+
+
+def _allocate_and_crash(path: str):
+    RelayStore(path).allocate_nonce(ADDRESS, 1)
+
+
+def test_nonce_of_a_dead_worker_is_allocated_again(db_path):
+    store = RelayStore(db_path)
+    assert store.allocate_nonce(ADDRESS, 0) == 0
+    # A worker takes nonce 1 and dies before sending it
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=_allocate_and_crash, args=(db_path,))
+    process.start()
+    process.join(timeout=60)
+    assert process.exitcode == 0
+
+    # Nonce 0 was sent; nothing else the node has not seen is outstanding
+    assert store.allocate_nonce(ADDRESS, 1) == 1
+    # This worker's own allocation is outstanding until the node counts it
+    assert store.allocate_nonce(ADDRESS, 1) == 2
+    assert store.allocate_nonce(ADDRESS, 3) == 3
+
+
+def test_counter_is_kept_while_a_sent_relay_is_unseen(db_path, monkeypatch):
+    store = RelayStore(db_path)
+    for _ in range(3):
+        store.allocate_nonce(ADDRESS, 0)
+    # Nonce 2 was sent, but the node does not count it (yet)
+    store.add_inflight("a", ADDRESS, 2, "0xuser", 0, "0x01")
+    monkeypatch.setattr(config, "inflight_max_age_seconds", -1)
+    assert store.allocate_nonce(ADDRESS, 2) == 3
+
+    store.finish_inflight("a")
+    assert store.allocate_nonce(ADDRESS, 2) == 2
+
+
+def test_inflight_records(db_path):
+    store = RelayStore(db_path)
+    store.add_inflight("a", ADDRESS, 7, "0xUser", 3, "0x01")
+    store.add_inflight("b", ADDRESS, 8, "0xuser", 4, "0x02")
+    store.add_inflight("c", ADDRESS, 9, "0xother", 0, "0x03")
+
+    assert [r["user_nonce"] for r in store.inflight("0xUSER")] == [3, 4]
+    store.finish_inflight("a")
+    assert [r["relay_id"] for r in store.inflight()] == ["b", "c"]
+    assert store.expire_inflight(max_age=-1) == 2
+    assert store.inflight() == []
+
+
+def test_run_waits_for_the_database_lock_off_the_loop(db_path):
+    store = RelayStore(db_path)
+    store.allocate_nonce(ADDRESS, 0)
+
+    # Another worker holds the write lock for a while
+    holder = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, holder.execute, ("COMMIT",)).start()
+
+    async def allocate_with_heartbeat():
+        ticks = 0
+
+        async def heartbeat():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        beat = asyncio.create_task(heartbeat())
+        started = time.monotonic()
+        nonce = await store.run(store.allocate_nonce, ADDRESS, 0)
+        elapsed = time.monotonic() - started
+        beat.cancel()
+        return nonce, elapsed, ticks
+
+    nonce, elapsed, ticks = asyncio.run(allocate_with_heartbeat())
+    holder.close()
+    assert nonce == 1
+    assert elapsed >= 0.25
+    # The loop kept running while the allocation waited for the lock
+    assert ticks >= 10
@@ -0,0 +1,63 @@
+import pytest
+from web3 import Web3
+
+from src.abis import RELAY_HUB_ABI
+from src.config import config
+from src.validation import RelayRequestError, check_format, check_limits
+
+
+def relay_request(**fields):
+    request = {
+        'from': "0x" + "ab" * 20,
+        'to': "0x" + "cd" * 20,
+        'encodedFunction': "0x1234",
+        'transactionFee': 10,
+        'gasPrice': 30 * 10 ** 9,
+        'gasLimit': 100_000,
+        'nonce': 0,
+        'signature': "0x" + "00" * 65,
+        'approvalData': "0x",
+    }
+    request.update(fields)
+    return request
+
+
+def test_lowercase_addresses_are_checksummed():
+    request = relay_request()
+    check_format(request)
+    assert request['from'] == Web3.to_checksum_address("0x" + "ab" * 20)
+    assert request['to'] == Web3.to_checksum_address("0x" + "cd" * 20)
+
+    # ...so encoding relayCall no longer raises InvalidAddress
+    hub = Web3().eth.contract(address="0x" + "00" * 19 + "01", abi=RELAY_HUB_ABI)
+    hub.encode_abi('relayCall', args=[
+        request['from'], request['to'], b"\x12\x34", 10, request['gasPrice'],
+        request['gasLimit'], 0, b"\x00" * 65, b""
+    ])
+
+
+@pytest.mark.parametrize("address", [
+    "0x" + "ab" * 19,  # too short
+    Web3.to_checksum_address("0x" + "ab" * 20).swapcase().replace("0X", "0x"),  # wrong checksum
+    None,
+])
+def test_invalid_addresses_are_rejected(address):
+    with pytest.raises(RelayRequestError) as error:
+        check_format(relay_request(to=address))
+    assert error.value.code == "INVALID_ADDRESS"
+
+
+def test_gas_price_just_below_the_network_price_is_accepted(monkeypatch):
+    monkeypatch.setattr(config, "gas_price_tolerance_percent", 10)
+    network_gas_price = 30 * 10 ** 9
+    # The network price rose by a block's worth since the client read it
+    check_limits(relay_request(gasPrice=network_gas_price - 1), network_gas_price)
+    check_limits(relay_request(gasPrice=27 * 10 ** 9), network_gas_price)
+
+    with pytest.raises(RelayRequestError) as error:
+        check_limits(relay_request(gasPrice=27 * 10 ** 9 - 1), network_gas_price)
+    assert error.value.code == "GAS_PRICE_TOO_LOW"
+
+    monkeypatch.setattr(config, "gas_price_tolerance_percent", 0)
+    with pytest.raises(RelayRequestError):
+        check_limits(relay_request(gasPrice=network_gas_price - 1), network_gas_price)
@@ -12,6 +12,7 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from src.config import config
 from src.abis import RELAY_HUB_ABI
+from src.rpc import make_provider
 
 load_dotenv()
 
@@ -113,10 +114,10 @@ def format_wei_to_ether(wei_value: int) -> str:
 def main():
     """Main function to view registered relays"""
     
-    # Initialize Web3
-    w3 = Web3(Web3.HTTPProvider(config.rpc_url))
+    # Initialize Web3 (same pooled RPC transport as the relayer)
+    w3 = Web3(make_provider())
     if not w3.is_connected():
-        print(f"Failed to connect to {config.rpc_url}")
+        print(f"Failed to connect to {config.rpc_urls or config.rpc_url}")
         return
     
     print(f"Connected to network: Chain ID {w3.eth.chain_id}")